@@ -1,3 +1,7 @@
+import hashlib
+import time
+
+import six
 from widgetastic.exceptions import NoSuchElementException
 from widgetastic.widget import View
 from widgetastic_manageiq import SettingsNavDropdown
@@ -5,6 +9,62 @@ from widgetastic_patternfly import NavDropdown, VerticalNavigation, FlashMessage
 
 from cfme.exceptions import CFMEException
 
+#: Name of the cookie holding the UI session id
+SESSION_COOKIE = '_vmdb_session'
+
+
+class LoginSessions(object):
+    """Cookies of the authenticated UI sessions, per appliance URL and user credential.
+
+    Injecting them into the browser logs it in without filling the login form, see
+    :py:func:`cfme.base.ui.login`. A session is forgotten when it is logged out of, or when it
+    wasn't used for ``ttl`` seconds, as the appliance expires idle sessions. The sessions are
+    keyed by a hash of the secret too, so a credential with a wrong secret doesn't get logged in.
+
+    Args:
+        ttl: Seconds an unused session is kept for
+    """
+    def __init__(self, ttl=1800):
+        self.ttl = ttl
+        self._sessions = {}  # (url, username, secret hash): (last use, cookies)
+
+    @staticmethod
+    def _key(url, credential):
+        secret = six.text_type(credential.secret).encode('utf-8')
+        return url, credential.principal, hashlib.sha256(secret).hexdigest()
+
+    def get(self, url, credential):
+        """Returns the cookies of the session of the user with the credential or ``None``"""
+        entry = self._sessions.get(self._key(url, credential))
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def store(self, url, credential, cookies):
+        """Stores the cookies (as returned by selenium's ``get_cookies``) of the user's session"""
+        cookies = [
+            {key: cookie[key] for key in ('name', 'value', 'path', 'secure') if key in cookie}
+            for cookie in cookies]
+        if any(cookie['name'] == SESSION_COOKIE for cookie in cookies):
+            self._sessions[self._key(url, credential)] = (time.time(), cookies)
+
+    def discard(self, url, credential):
+        """Forgets the sessions of the user, whatever secret they were created with"""
+        for key in list(self._sessions):
+            if key[:2] == (url, credential.principal):
+                del self._sessions[key]
+
+    def discard_session(self, session_id):
+        """Forgets the sessions using the session id, e.g. when logging out of it"""
+        for key, (_, cookies) in list(self._sessions.items()):
+            if any(cookie['name'] == SESSION_COOKIE and cookie['value'] == session_id
+                   for cookie in cookies):
+                del self._sessions[key]
+
+
+#: The sessions used by :py:func:`cfme.base.ui.login`
+login_sessions = LoginSessions()
+
 
 class BaseLoggedInPage(View):
     """This page should be subclassed by any page that models any other page that is available as
@@ -106,6 +166,9 @@ class BaseLoggedInPage(View):
         return not self.logged_in
 
     def logout(self):
+        session = self.browser.selenium.get_cookie(SESSION_COOKIE)
+        if session is not None:
+            login_sessions.discard_session(session['value'])
         self.settings.select_item('Logout')
         self.browser.handle_alert(wait=None)
         self.extra.appliance.user = None
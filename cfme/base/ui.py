@@ -3,6 +3,7 @@ from __future__ import absolute_import
 import time
 
 import re
+import requests
 from navmazing import NavigateToSibling, NavigateToAttribute
 from selenium.webdriver.common.keys import Keys
 from widgetastic.utils import Version, VersionPick
@@ -13,7 +14,7 @@ from widgetastic_patternfly import (Accordion, Input, Button, Dropdown, DatePick
                                     FlashMessages, BootstrapSelect, CheckableBootstrapTreeview)
 
 from cfme.base.credential import Credential
-from cfme.base.login import BaseLoggedInPage
+from cfme.base.login import BaseLoggedInPage, login_sessions
 from cfme.configure.about import AboutView
 from cfme.configure.configuration.server_settings import (
     ServerInformationView,
@@ -159,6 +160,84 @@ def logged_in(self):
 LOGIN_METHODS = ['click_on_login', 'press_enter_after_password', '_js_auth_fn']
 
 
+def request_login_session(appliance, user):
+    """Logs the user in with plain HTTP requests, like the login form does.
+
+    Returns:
+        The cookies of the authenticated session or ``None`` if the login failed
+    """
+    session = requests.Session()
+    session.verify = False
+    base_url = appliance.url.rstrip('/')
+    try:
+        page = session.get(base_url, timeout=30)
+        page.raise_for_status()
+        token = re.search(r'<meta[^>]*name="csrf-token"[^>]*content="([^"]+)"', page.text)
+        if token is None:
+            logger.warning('No CSRF token on the login page of %s', base_url)
+            return None
+        response = session.post(
+            '{}/dashboard/authenticate'.format(base_url),
+            data={'user_name': user.credential.principal,
+                  'user_password': user.credential.secret},
+            headers={'X-CSRF-Token': token.group(1), 'X-Requested-With': 'XMLHttpRequest'},
+            timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.warning('Could not log in as %s with HTTP requests: %s',
+                       user.credential.principal, e)
+        return None
+    return [{'name': cookie.name, 'value': cookie.value, 'path': cookie.path or '/',
+             'secure': cookie.secure} for cookie in session.cookies]
+
+
+def use_login_session(appliance, user, cookies):
+    """Loads the appliance in the browser with the session cookies and checks it is logged in"""
+    selenium = appliance.browser.widgetastic.selenium
+    if not selenium.current_url.startswith(appliance.url):
+        # cookies can be added only for the domain of the current page
+        selenium.get(appliance.url)
+    selenium.delete_all_cookies()
+    for cookie in cookies:
+        selenium.add_cookie(dict(cookie))
+    selenium.get(appliance.url)
+    logged_in_view = appliance.browser.create_view(BaseLoggedInPage)
+    if not logged_in_view.logged_in:
+        login_sessions.discard(appliance.url, user.credential)
+        return False
+    if user.name is None:
+        user.name = logged_in_view.current_fullname
+    appliance.user = user
+    login_sessions.store(appliance.url, user.credential, cookies)
+    return True
+
+
+def fast_login(appliance, user):
+    """Logs the browser in as the user without filling the login form.
+
+    A cached session of the user is used if there is one, otherwise a new one is created with
+    :py:func:`request_login_session`. Disabled by ``fast_login: false`` in env.yaml.
+
+    Returns:
+        ``True`` if the browser got logged in
+    """
+    if not conf.env.get('fast_login', True):
+        return False
+    principal = user.credential.principal
+    cookies = login_sessions.get(appliance.url, user.credential)
+    if cookies is not None:
+        logger.debug('Logging in as user %s with a cached session', principal)
+        if use_login_session(appliance, user, cookies):
+            return True
+    cookies = request_login_session(appliance, user)
+    if cookies is not None:
+        logger.debug('Logging in as user %s with a new session', principal)
+        if use_login_session(appliance, user, cookies):
+            return True
+    logger.info('Could not log in as user %s with a session, using the login form', principal)
+    return False
+
+
 @MiqImplementationContext.external_for(Server.update_password, ViaUI)
 def update_password(self, new_password, verify_password=None, user=None, method=LOGIN_METHODS[1]):
     if not user:
@@ -178,6 +257,7 @@ def update_password(self, new_password, verify_password=None, user=None, method=
 
         logger.debug('Changing password for user %s', user.credential.principal)
 
+        login_sessions.discard(self.appliance.url, user.credential)
         login_view.update_password(user=user,
                                    new_password=new_password,
                                    verify_password=verify_password,
@@ -193,11 +273,13 @@ def update_password(self, new_password, verify_password=None, user=None, method=
 
 @MiqImplementationContext.external_for(Server.login, ViaUI)
 # for selenim3 v_js_auth_fn doesn't sent info to the server
-def login(self, user=None, method=LOGIN_METHODS[1]):
+def login(self, user=None, method=None):
     """
     Login to CFME with the given username and password.
     Optionally, submit_method can be press_enter_after_password
     to use the enter key to login, rather than clicking the button.
+    Without a method, a session of the user is injected into the browser instead if possible,
+    see :py:func:`fast_login`.
     Args:
         user: The username to fill in the username field.
         password: The password to fill in the password field.
@@ -218,6 +300,10 @@ def login(self, user=None, method=LOGIN_METHODS[1]):
         if logged_in_view.logged_in:
             logged_in_view.logout()
 
+        if method is None and fast_login(self.appliance, user):
+            logged_in_view.flush_widget_cache()
+            return logged_in_view
+
         from cfme.utils.appliance.implementations.ui import navigate_to
         login_view = navigate_to(self.appliance.server, 'LoginScreen')
 
@@ -226,13 +312,15 @@ def login(self, user=None, method=LOGIN_METHODS[1]):
         logger.debug('Logging in as user %s', user.credential.principal)
         login_view.flush_widget_cache()
 
-        login_view.log_in(user, method=method)
+        login_view.log_in(user, method=method or LOGIN_METHODS[1])
         logged_in_view.flush_widget_cache()
         try:
             assert logged_in_view.is_displayed
             assert logged_in_view.logged_in_as_user
             user.name = logged_in_view.current_fullname
             self.appliance.user = user
+            login_sessions.store(self.appliance.url, user.credential,
+                                 login_view.browser.selenium.get_cookies())
         except AssertionError:
             login_view.flash.assert_no_error()
     return logged_in_view
@@ -329,7 +417,8 @@ class LoggedIn(CFMENavigateStep):
 
     def step(self):
         user = self.obj.appliance.user
-        self.prerequisite_view.log_in(user)
+        if not fast_login(self.obj.appliance, user):
+            self.prerequisite_view.log_in(user)
 
 
 class ConfigurationView(BaseLoggedInPage):
@@ -238,6 +238,7 @@ class Details(CFMENavigateStep):
     """Nav class for summary details view"""
     VIEW = CloudProviderDetailsView
     prerequisite = NavigateToSibling('All')
+    URL = 'ems_cloud/{obj.id}'
 
     def step(self, *args, **kwargs):
         self.prerequisite_view.entities.get_entity(name=self.obj.name, surf_pages=True).click()
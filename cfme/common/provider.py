@@ -3,6 +3,7 @@ from collections import Iterable, defaultdict
 
 import attr
 from manageiq_client.api import APIException
+from manageiq_client.filters import Q
 from widgetastic.widget import View, Text
 from widgetastic_patternfly import Button, Input
 
@@ -998,10 +999,17 @@ class BaseProvider(Taggable, Updateable, Navigatable, BaseEntity):
         Returns a dictionary mapping template ids to their name, type, and guid
         """
         # TODO: Move to TemplateCollection.all
-        all_details = {}
-        for id in self.get_all_template_ids():
-            all_details[id] = self.get_template_details(id)
-        return all_details
+        try:
+            templates = self.appliance.rest_api.bulk_query(
+                'templates', attributes=['name', 'type', 'guid'])
+        except APIException:
+            return None
+        return {
+            template['id']: {
+                'name': template['name'],
+                'type': template['type'],
+                'guid': template['guid']}
+            for template in templates}
 
     def get_vm_id(self, vm_name):
         """
@@ -1009,26 +1017,23 @@ class BaseProvider(Taggable, Updateable, Navigatable, BaseEntity):
         """
         # TODO: Get Provider object from VMCollection.find, then use VM.id to get the id
         logger.debug('Retrieving the ID for VM: {}'.format(vm_name))
-        for vm_id in self.get_all_vm_ids():
-            details = self.get_vm_details(vm_id)
-            if details['name'] == vm_name:
-                return vm_id
+        vms = self.appliance.rest_api.bulk_query(
+            'vms', filters=Q('name', '=', vm_name), attributes=['name'])
+        if vms:
+            return vms[0]['id']
 
     def get_vm_ids(self, vm_names):
         """
         Returns a dictionary mapping each VM name to it's id
         """
         # TODO: Move to VMCollection.find or VMCollection.all
-        name_list = vm_names[:]
+        name_list = set(vm_names)
         logger.debug('Retrieving the IDs for {} VM(s)'.format(len(name_list)))
         id_map = {}
-        for vm_id in self.get_all_vm_ids():
-            if not name_list:
-                break
-            vm_name = self.get_vm_details(vm_id)['name']
-            if vm_name in name_list:
-                id_map[vm_name] = vm_id
-                name_list.remove(vm_name)
+        # Names are matched locally, one filter per name would not fit in the URL
+        for vm in self.appliance.rest_api.bulk_query('vms', attributes=['name']):
+            if vm['name'] in name_list and vm['name'] not in id_map:
+                id_map[vm['name']] = vm['id']
         return id_map
 
     def get_template_guids(self, template_dict):
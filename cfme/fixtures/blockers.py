@@ -9,11 +9,16 @@ it accepts number argument and spits out the BUGZILLA BUG!
 The :py:func:`blockers` retrieves list of all blockers
 as specified in the meta marker.
 All of them are converted to the :py:class:`utils.blockers.Blocker` instances
+
+The blockers of all the collected tests are fetched in batches at collection time into the
+on-disk :py:mod:`cfme.utils.blocker_cache`, shared by the master and the slaves.
 """
 import pytest
 
 from cfme.fixtures.pytest_store import store
+from cfme.utils.blocker_cache import blocker_cache
 from cfme.utils.blockers import Blocker, BZ, GH
+from cfme.utils.log import logger
 
 
 @pytest.fixture(scope="function")
@@ -61,10 +66,43 @@ def pytest_addoption(parser):
                     default=False,
                     dest='list_blockers',
                     help='Specify to list the blockers (takes some time though).')
+    group.addoption('--blocker-cache-ttl',
+                    action='store',
+                    type=int,
+                    default=None,
+                    dest='blocker_cache_ttl',
+                    help='Seconds the fetched blocker data are cached on disk for, 0 disables '
+                         'the cache (default: {})'.format(blocker_cache.ttl))
+    group.addoption('--no-blocker-prefetch',
+                    action='store_false',
+                    default=True,
+                    dest='blocker_prefetch',
+                    help='Do not fetch the blockers of the collected tests at collection time.')
+
+
+def pytest_configure(config):
+    if config.getvalue('blocker_cache_ttl') is not None:
+        blocker_cache.ttl = config.getvalue('blocker_cache_ttl')
+
+
+def prefetch_blockers(items):
+    blockers = [blocker
+                for item in items
+                for blocker in getattr(item, '_metadata', {}).get('blockers', [])]
+    if not blockers:
+        return
+    logger.info('Prefetching %d blockers', len(blockers))
+    try:
+        Blocker.prefetch(blockers)
+    except Exception:
+        # the blockers get fetched one by one when evaluated then
+        logger.exception('Prefetching the blockers failed')
 
 
 @pytest.mark.trylast
 def pytest_collection_modifyitems(session, config, items):
+    if config.getvalue("blocker_prefetch") and blocker_cache.ttl:
+        prefetch_blockers(items)
     if not config.getvalue("list_blockers"):
         return
     store.terminalreporter.write("Loading blockers ...\n", bold=True)
@@ -0,0 +1,142 @@
+"""Fixture profiler, measuring the setup and teardown time of every fixture
+
+Usage
+-----
+
+``py.test --profile-fixtures``
+
+Every time a fixture is actually set up (and not just taken from its scope's cache), the time
+its setup and teardown took is recorded, along with its scope and the test that triggered the
+setup. In parallel runs, slaves send their timings to the master, which aggregates them.
+
+At the end of the session:
+
+- the most expensive fixtures are summarized in the terminal
+- all timings are written to ``log/fixture_profile.folded``, in the folded stack format
+  (``slave;scope;fixture;phase milliseconds``) understood by flame graph tools like
+  ``flamegraph.pl`` or speedscope
+- if the run history is being recorded, the timings are added to it, so
+  ``miq history slowest-fixtures`` covers them
+
+"""
+from collections import defaultdict
+from time import time
+
+import pytest
+
+from cfme.fixtures.pytest_store import store
+from cfme.utils.log import logger
+from cfme.utils.path import log_path
+
+#: Number of fixtures shown in the terminal summary
+SUMMARY_LENGTH = 15
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--profile-fixtures', dest='profile_fixtures', action='store_true',
+                    default=False, help='Measure fixture setup and teardown times and report '
+                                        'the most expensive fixtures')
+
+
+class FixtureProfilerHooks(object):
+    def pytest_miq_fixture_timings(self, config, timings):
+        """called on the parallelizer master with fixture timings sent by a slave"""
+
+
+def pytest_addhooks(pluginmanager):
+    pluginmanager.add_hookspecs(FixtureProfilerHooks)
+
+
+def pytest_configure(config):
+    if config.getoption('profile_fixtures'):
+        config.pluginmanager.register(FixtureProfiler(config), 'fixture_profiler')
+
+
+class FixtureProfiler(object):
+    def __init__(self, config):
+        self.config = config
+        #: finished timings, dicts with fixture, scope, setup, teardown, nodeid and slaveid keys
+        self.timings = []
+        # timings of fixtures set up and not torn down yet, and their teardown start times
+        self._active = {}
+        self._teardown_starts = {}
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        start = time()
+        yield
+        item = getattr(request, '_pyfuncitem', None)
+        self._active[fixturedef] = {
+            'fixture': fixturedef.argname,
+            'scope': fixturedef.scope,
+            'setup': time() - start,
+            'teardown': 0.0,
+            'nodeid': getattr(item, 'nodeid', None),
+            'slaveid': store.slaveid,
+        }
+        # finalizers run last in, first out, so this one runs before the fixture's own teardown
+        fixturedef.addfinalizer(lambda: self._teardown_starts.__setitem__(fixturedef, time()))
+
+    def pytest_fixture_post_finalizer(self, fixturedef, request):
+        timing = self._active.pop(fixturedef, None)
+        if timing is None:
+            # the fixture was never set up, or its finalization was already recorded
+            return
+        start = self._teardown_starts.pop(fixturedef, None)
+        if start is not None:
+            timing['teardown'] = time() - start
+        if store.parallelizer_role == 'slave':
+            store.slave_manager.post_event('fixture_timings', timings=[timing])
+        else:
+            self.timings.append(timing)
+
+    def pytest_miq_fixture_timings(self, config, timings):
+        self.timings.extend(timings)
+
+    def totals(self):
+        """Total time and number of setups per ``(fixture, scope)``, the most expensive first"""
+        totals = defaultdict(lambda: [0.0, 0])
+        for timing in self.timings:
+            total = totals[timing['fixture'], timing['scope']]
+            total[0] += timing['setup'] + timing['teardown']
+            total[1] += 1
+        return sorted(
+            ((fixture, scope, total, count) for (fixture, scope), (total, count) in totals.items()),
+            key=lambda row: row[2], reverse=True)
+
+    def write_folded(self, path):
+        """Write the timings in the folded stack format used by flame graph tools"""
+        stacks = defaultdict(float)
+        for timing in self.timings:
+            for phase in ('setup', 'teardown'):
+                stack = ';'.join([timing['slaveid'] or 'master', timing['scope'],
+                                  timing['fixture'], phase])
+                stacks[stack] += timing[phase]
+        with path.open('w') as f:
+            for stack, duration in sorted(stacks.items()):
+                f.write('{} {}\n'.format(stack, int(duration * 1000)))
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionfinish(self):
+        if store.parallelizer_role == 'slave' or not self.timings:
+            return
+        profile_path = log_path.join('fixture_profile.folded')
+        self.write_folded(profile_path)
+        logger.info('Wrote %d fixture timings to %s', len(self.timings), profile_path)
+
+        # record before the run history plugin closes its database
+        recorder = self.config.pluginmanager.get_plugin('run_history')
+        if recorder is not None and recorder.history is not None:
+            for timing in self.timings:
+                recorder.history.record_fixture(recorder.run_id, **timing)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.timings:
+            return
+        terminalreporter.write_sep('=', 'slowest fixtures')
+        for fixture, scope, total, count in self.totals()[:SUMMARY_LENGTH]:
+            terminalreporter.write_line('{:10.2f}s {:>8} {} ({} setups)'.format(
+                total, scope, fixture, count))
+        terminalreporter.write_line(
+            'full profile in {}'.format(log_path.join('fixture_profile.folded')))
@@ -10,18 +10,30 @@ The Workflow
 - Master runs collection, blocks until slaves report their collections
 - Slaves each run collection and submit them to the master, then block inside their runtest loop,
   waiting for tests to run
+
+  - With ``--parallel-lazy-collection``, the master writes its collection to a manifest instead,
+    and slaves report that manifest right away, collecting each test module only when they are
+    first sent tests from it
+
 - Master diffs slave collections against its own; the test ids are verified to match
   across all nodes
 - Master enters main runtest loop, uses a generator to build lists of test groups which are then
-  sent to slaves, one group at a time
+  sent to slaves, one group at a time, in the order chosen by the ``--parallel-scheduler``
+  (see :py:mod:`cfme.fixtures.parallelizer.scheduler`)
 - For each phase of each test, the slave serializes test reports, which are then unserialized on
   the master and handed to the normal pytest reporting hooks, which is able to deal with test
   reports arriving out of order
+- Slaves don't wait for the master to handle their reports, they are pipelined in msgpack
+  encoded batches (see :py:mod:`cfme.fixtures.parallelizer.transport`)
 - Before running the last test in a group, the slave will request more tests from the master
 
   - If more tests are received, they are run
   - If no tests are received, the slave will shut down after running its final test
 
+- With ``--parallel-batch-size``, the master keeps each slave's group and sends it in batches;
+  a slave asking for tests when no groups are left steals half of the unsent tests of the
+  busiest slave, so all slaves stay busy until the end of the session
+
 - After all slaves are shut down, the master will do its end-of-session reporting as usual, and
   shut down
 
@@ -44,11 +56,12 @@ from threading import Thread
 from time import sleep, time
 
 import pytest
-import zmq
 from _pytest import runner
 
 from cfme.fixtures import terminalreporter
 from cfme.fixtures.parallelizer import remote
+from cfme.fixtures.parallelizer.scheduler import DurationStore, SCHEDULERS, get_scheduler
+from cfme.fixtures.parallelizer.transport import MasterChannel
 from cfme.fixtures.pytest_store import store
 from cfme.utils import at_exit, conf
 from cfme.utils.log import create_sublogger
@@ -63,6 +76,25 @@ if not conf.runtime['env'].get('ts'):
     conf.runtime['env']['ts'] = ts
 
 
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--parallel-scheduler', dest='parallel_scheduler', default='collection',
+                    choices=sorted(SCHEDULERS),
+                    help='Order in which the parallelizer master hands test groups to slaves')
+    group.addoption('--parallel-durations', dest='parallel_durations', default=None,
+                    help='JSON file holding historical test durations for the scheduler, '
+                         'updated at the end of each parallel run')
+    group.addoption('--parallel-batch-size', dest='parallel_batch_size', type=int, default=0,
+                    help='Hand tests to slaves in batches of this size and let idle slaves steal '
+                         'not yet sent tests from busy ones; 0 sends whole test groups')
+    group.addoption('--parallel-lazy-collection', dest='parallel_lazy_collection',
+                    action='store_true', default=False,
+                    help='Ship the master collection to the slaves instead of having each slave '
+                         'collect everything; slaves only collect the modules they are sent. '
+                         'The whole collections are not compared then, slaves report the '
+                         'differences per module and the tests they did not collect as errors')
+
+
 def pytest_addhooks(pluginmanager):
     from . import hooks
     pluginmanager.add_hookspecs(hooks)
@@ -110,6 +142,8 @@ class SlaveDetail(object):
         lambda: next(SlaveDetail.slaveid_generator)))
     forbid_restart = attr.ib(default=False, init=False)
     tests = attr.ib(default=attr.Factory(set), repr=False)
+    # tests assigned to the slave but not sent yet, only used when sending batches
+    pending = attr.ib(default=attr.Factory(deque), repr=False)
     process = attr.ib(default=None, repr=False)
 
     provider_allocation = attr.ib(default=attr.Factory(list), repr=False)
@@ -135,6 +169,9 @@ class SlaveDetail(object):
 
 
 class ParallelSession(object):
+    #: Number of providers a slave's appliance may be allocated
+    appliance_num_limit = 1
+
     def __init__(self, config, appliances):
         self.config = config
         self.session = None
@@ -156,6 +193,11 @@ class ParallelSession(object):
                             key=len, reverse=True)
         self.used_prov = set()
 
+        self.durations = DurationStore(config.getoption('parallel_durations')).load()
+        self.scheduler = get_scheduler(config.getoption('parallel_scheduler'), self.durations)
+        self.measured_durations = defaultdict(float)
+        self.start_time = None
+
         self.failed_slave_test_groups = deque()
         self.slave_spawn_count = 0
         self.appliances = appliances
@@ -164,9 +206,7 @@ class ParallelSession(object):
 
         zmq_endpoint = 'ipc://{}'.format(
             config.cache.makedir('parallelize').join(str(os.getpid())))
-        ctx = zmq.Context.instance()
-        self.sock = ctx.socket(zmq.ROUTER)
-        self.sock.bind(zmq_endpoint)
+        self.channel = MasterChannel(zmq_endpoint)
 
         # clean out old slave config if it exists
 
@@ -188,6 +228,15 @@ class ParallelSession(object):
             self.print_message("using appliance {}".format(self.slaves[slave].appliance.url),
                 slave, green=True)
 
+    def _write_collection_manifest(self):
+        """Dump the master collection for the slaves to load instead of collecting themselves"""
+        manifest_path = self.config.cache.makedir('parallelize').join(
+            'collection-{}.json'.format(os.getpid()))
+        manifest_path.write(json.dumps({'node_ids': self.collection}))
+        self.log.info('wrote collection manifest of %d tests to %s',
+                      len(self.collection), manifest_path)
+        return str(manifest_path)
+
     def _slave_audit(self):
         # XXX: There is currently no mechanism to add or remove slave_urls, short of
         #      firing up the debugger and doing it manually. This is making room for
@@ -218,6 +267,7 @@ class ParallelSession(object):
                 if slave.process is None:
                     self.config.hook.pytest_miq_node_shutdown(
                         config=self.config, nodeinfo=slave.appliance.url)
+                    self._release_pending(slave)
                     del self.slaves[slave.id]
                 else:
                     # no hook call here, a future audit will handle the fallout
@@ -232,28 +282,26 @@ class ParallelSession(object):
     def send(self, slave, event_data):
         """Send data to slave.
 
-        ``event_data`` will be serialized as JSON, and so must be JSON serializable
+        ``event_data`` will be serialized with msgpack, and so must be msgpack serializable
 
         """
-        event_json = json.dumps(event_data)
-        if not isinstance(event_json, bytes):
-            event_json = event_json.encode('utf-8')
-        self.sock.send_multipart([slave.id, b'', event_json])
+        self.channel.send(slave.id, event_data)
 
     def recv(self):
-        # poll the zmq socket, populate the recv queue deque with responses
-
-        events = zmq.zmq_poll([(self.sock, zmq.POLLIN)], 50)
-        if not events:
-            return None, None, None
-        slaveid, _, event_json = self.sock.recv_multipart(flags=zmq.NOBLOCK)
-        event_data = json.loads(event_json)
-        event_name = event_data.pop('_event_name')
-        if slaveid not in self.slaves:
-            self.log.error("message from terminated worker %s %s %s",
-                           slaveid, event_name, event_data)
-            return None, None, None
-        return self.slaves[slaveid], event_data, event_name
+        """Receive all events the slaves have sent since the last call
+
+        Returns:
+            list of ``(slave, event_data, event_name)`` tuples
+        """
+        events = []
+        for slaveid, event_data in self.channel.recv():
+            event_name = event_data.pop('_event_name')
+            if slaveid not in self.slaves:
+                self.log.error("message from terminated worker %s %s %s",
+                               slaveid, event_name, event_data)
+                continue
+            events.append((self.slaves[slaveid], event_data, event_name))
+        return events
 
     def print_message(self, message, prefix='master', **markup):
         """Print a message from a node to the py.test console
@@ -344,14 +392,21 @@ class ParallelSession(object):
             slave.process.kill()
             self.monitor_shutdown(slave, **kwargs)
 
-    def send_tests(self, slave):
-        """Send a slave a group of tests"""
-        try:
-            tests = list(self.failed_slave_test_groups.popleft())
-        except IndexError:
-            tests = self.get(slave)
+    def send_tests(self, slave, batch_size=None):
+        """Send a slave a group of tests, or a batch of at most ``batch_size`` tests"""
+        if batch_size:
+            tests = self._next_batch(slave, batch_size)
+        else:
+            try:
+                tests = list(self.failed_slave_test_groups.popleft())
+            except IndexError:
+                tests = self.get(slave)
         self.send(slave, tests)
         slave.tests.update(tests)
+        for test in tests:
+            # a test handed out again after a slave crash starts a new run, its duration is only
+            # the sum of the reports of the last run
+            self.measured_durations.pop(test, None)
         collect_len = len(self.collection)
         tests_len = len(tests)
         self.sent_tests += tests_len
@@ -362,6 +417,60 @@ class ParallelSession(object):
             ))
         return tests
 
+    def _next_batch(self, slave, batch_size):
+        # refill the slave's pending queue with a whole group, or with tests stolen from
+        # the busiest slave when there are no groups left
+        if not slave.pending:
+            try:
+                tests = list(self.failed_slave_test_groups.popleft())
+            except IndexError:
+                tests = self.get(slave) or self.steal_tests(slave)
+            slave.pending.extend(tests)
+        return [slave.pending.popleft() for _ in range(min(batch_size, len(slave.pending)))]
+
+    def steal_tests(self, thief):
+        """Reclaim the not yet sent half of the busiest slave's pending tests for ``thief``
+
+        Like in :py:meth:`get`, only the tests of the providers allocated to the thief already,
+        or of the providers it can still be allocated, are stolen.
+        """
+        victims = sorted((slave for slave in self.slaves.values()
+                          if slave is not thief and slave.pending),
+                         key=lambda slave: len(slave.pending), reverse=True)
+        for victim in victims:
+            allocation = list(thief.provider_allocation)
+            stealable = []
+            # steal from the back, the victim keeps working through the front of its queue
+            for test in reversed(victim.pending):
+                provs = self._provs_of_tests([test])
+                if provs and provs[0] not in allocation:
+                    if len(allocation) >= self.appliance_num_limit:
+                        continue
+                    allocation.append(provs[0])
+                stealable.append(test)
+            if not stealable:
+                continue
+            stolen = stealable[:(len(stealable) + 1) // 2]
+            for test in stolen:
+                provs = self._provs_of_tests([test])
+                if provs and provs[0] not in thief.provider_allocation:
+                    thief.provider_allocation.append(provs[0])
+            stolen_set = set(stolen)
+            remaining = [test for test in victim.pending if test not in stolen_set]
+            victim.pending.clear()
+            victim.pending.extend(remaining)
+            stolen.reverse()
+            self.print_message('{} stole {} tests from {}'.format(
+                thief.id.decode('ascii'), len(stolen), victim.id.decode('ascii')))
+            return stolen
+        return []
+
+    def _release_pending(self, slave):
+        # give tests that were never sent to a departing slave back to the others
+        if slave.pending:
+            self.failed_slave_test_groups.append(list(slave.pending))
+            slave.pending.clear()
+
     def pytest_sessionstart(self, session):
         """pytest sessionstart hook
 
@@ -392,10 +501,13 @@ class ParallelSession(object):
         """
         # Build master collection for slave diffing and distribution
         self.collection = [item.nodeid for item in self.session.items]
+        if self.config.getoption('parallel_lazy_collection'):
+            self.worker_config['collection_manifest'] = self._write_collection_manifest()
 
         # Fire up the workers after master collection is complete
         # master and the first slave share an appliance, this is a workaround to prevent a slave
         # from altering an appliance while master collection is still taking place
+        self.start_time = time()
         for slave in self.slaves.values():
             slave.start()
 
@@ -418,54 +530,8 @@ class ParallelSession(object):
                 if self.session_finished:
                     break
 
-                slave, event_data, event_name = self.recv()
-                if event_name == 'message':
-                    message = event_data.pop('message')
-                    markup = event_data.pop('markup')
-                    # messages are special, handle them immediately
-                    self.print_message(message, slave, **markup)
-                    self.ack(slave, event_name)
-                elif event_name == 'collectionfinish':
-                    slave_collection = event_data['node_ids']
-                    # compare slave collection to the master, all test ids must be the same
-                    self.log.debug('diffing {} collection'.format(slave.id))
-                    diff_err = report_collection_diff(
-                        slave.id, self.collection, slave_collection)
-                    if diff_err:
-                        self.print_message(
-                            'collection differs, respawning', slave.id,
-                            purple=True)
-                        self.print_message(diff_err, purple=True)
-                        self.log.error('{}'.format(diff_err))
-                        self.kill(slave)
-                        slave.start()
-                    else:
-                        self.ack(slave, event_name)
-                elif event_name == 'need_tests':
-                    self.send_tests(slave)
-                    self.log.info('starting master test distribution')
-                elif event_name == 'runtest_logstart':
-                    self.ack(slave, event_name)
-                    self.trdist.runtest_logstart(
-                        slave.id,
-                        event_data['nodeid'],
-                        event_data['location'])
-                elif event_name == 'runtest_logreport':
-                    self.ack(slave, event_name)
-                    report = unserialize_report(event_data['report'])
-                    if report.when in ('call', 'teardown'):
-                        slave.tests.discard(report.nodeid)
-                    self.trdist.runtest_logreport(slave.id, report)
-                elif event_name == 'internalerror':
-                    self.ack(slave, event_name)
-                    self.print_message(event_data['message'], slave, purple=True)
-                    self.kill(slave)
-                elif event_name == 'shutdown':
-                    self.config.hook.pytest_miq_node_shutdown(
-                        config=self.config, nodeinfo=slave.appliance.url)
-                    self.ack(slave, event_name)
-                    del self.slaves[slave.id]
-                    self.monitor_shutdown(slave)
+                for slave, event_data, event_name in self.recv():
+                    self.handle_event(slave, event_data, event_name)
 
                 # total slave spawn count * 3, to allow for each slave's initial spawn
                 # and then each slave (on average) can fail two times
@@ -482,9 +548,87 @@ class ParallelSession(object):
         finally:
             terminalreporter.enable()
 
+        self._record_durations()
+
         # Suppress other runtestloop calls
         return True
 
+    def _record_durations(self):
+        """Report the actual makespan and feed the measured durations back to the store"""
+        if self.start_time is not None:
+            self.print_message('actual makespan {:.0f}s'.format(time() - self.start_time))
+        if not self.measured_durations:
+            return
+        self.durations.update(self.measured_durations)
+        try:
+            self.durations.save()
+        except (IOError, OSError) as e:
+            self.log.warning('Could not save test durations to %s: %s', self.durations.path, e)
+        else:
+            self.log.info('Saved %d test durations to %s',
+                          len(self.measured_durations), self.durations.path)
+
+    def handle_event(self, slave, event_data, event_name):
+        """Handle a single event received from a slave
+
+        Only the events a slave waits on (``collectionfinish``, ``need_tests`` and ``shutdown``)
+        get a reply, all the others are pipelined by the slaves and must not be acknowledged.
+
+        """
+        if event_name == 'message':
+            message = event_data.pop('message')
+            markup = event_data.pop('markup')
+            # messages are special, handle them immediately
+            self.print_message(message, slave, **markup)
+        elif event_name == 'collectionfinish':
+            slave_collection = event_data['node_ids']
+            # compare slave collection to the master, all test ids must be the same
+            self.log.debug('diffing {} collection'.format(slave.id))
+            diff_err = report_collection_diff(
+                slave.id, self.collection, slave_collection)
+            if diff_err:
+                self.print_message(
+                    'collection differs, respawning', slave.id,
+                    purple=True)
+                self.print_message(diff_err, purple=True)
+                self.log.error('{}'.format(diff_err))
+                self.kill(slave)
+                slave.start()
+            else:
+                self.ack(slave, event_name)
+        elif event_name == 'need_tests':
+            self.send_tests(slave, event_data.get('batch_size'))
+            self.log.info('starting master test distribution')
+        elif event_name == 'runtest_logstart':
+            self.trdist.runtest_logstart(
+                slave.id,
+                event_data['nodeid'],
+                event_data['location'])
+        elif event_name == 'runtest_logreport':
+            report = unserialize_report(event_data['report'])
+            # lets plugins like the run history tell which slave ran the test
+            report.slaveid = slave.id.decode('ascii')
+            if report.when in ('call', 'teardown'):
+                slave.tests.discard(report.nodeid)
+            self.measured_durations[report.nodeid] += report.duration
+            self.trdist.runtest_logreport(slave.id, report)
+        elif event_name == 'fixture_timings':
+            self.config.hook.pytest_miq_fixture_timings(
+                config=self.config, timings=event_data['timings'])
+        elif event_name == 'navigation_timings':
+            self.config.hook.pytest_miq_navigation_timings(
+                config=self.config, timings=event_data['timings'])
+        elif event_name == 'internalerror':
+            self.print_message(event_data['message'], slave, purple=True)
+            self.kill(slave)
+        elif event_name == 'shutdown':
+            self.config.hook.pytest_miq_node_shutdown(
+                config=self.config, nodeinfo=slave.appliance.url)
+            self.ack(slave, event_name)
+            self._release_pending(slave)
+            del self.slaves[slave.id]
+            self.monitor_shutdown(slave)
+
     def _test_item_generator(self):
         for tests in self._modscope_item_generator():
             yield tests
@@ -523,15 +667,15 @@ class ParallelSession(object):
                 self.log.info('sent tests with param {} {!r}'.format(id, tests))
                 yield tests
 
-    def get(self, slave):
-
-        def provs_of_tests(test_group):
-            found = set()
-            for test in test_group:
-                found.update(pv for pv in self.provs
-                             if '[' in test and pv in test)
-            return sorted(found)
+    def _provs_of_tests(self, test_group):
+        found = set()
+        for test in test_group:
+            found.update(pv for pv in self.provs
+                         if '[' in test and pv in test)
+        return sorted(found)
 
+    def get(self, slave):
+        provs_of_tests = self._provs_of_tests
         if not self._pool:
             for test_group in self.test_groups:
                 self._pool.append(test_group)
@@ -540,9 +684,16 @@ class ParallelSession(object):
                 self.ratio = float(len(self.slaves)) / len(self.used_prov)
             else:
                 self.ratio = 0.0
+            self._pool = self.scheduler.order(self._pool)
+            if self._pool:
+                self.print_message(
+                    '{} scheduler: {} test groups, {} known durations, '
+                    'predicted makespan {:.0f}s'.format(
+                        self.scheduler.name, len(self._pool), len(self.durations),
+                        self.scheduler.predicted_makespan(self._pool, len(self.slaves))))
         if not self._pool:
             return []
-        appliance_num_limit = 1
+        appliance_num_limit = self.appliance_num_limit
         for idx, test_group in enumerate(self._pool):
             provs = provs_of_tests(test_group)
             if provs:
@@ -1,43 +1,58 @@
 import json
 import signal
+from collections import defaultdict
 
-import zmq
+import pytest
+from _pytest import runner
 from py.path import local
 
 import cfme.utils
 from cfme.utils import log
 from cfme.utils.appliance import find_appliance
 from cfme.fixtures.log import _test_status, _format_nodeid
+from cfme.fixtures.parallelizer.transport import SlaveChannel
 
 SLAVEID = None
 
 
 class SlaveManager(object):
     """SlaveManager which coordinates with the master process for parallel testing"""
-    def __init__(self, config, slaveid, zmq_endpoint):
+    def __init__(self, config, slaveid, zmq_endpoint, collection_manifest=None):
         self.config = config
         self.session = None
         self.collection = None
+        # when set, the master's collection is loaded from this file and test modules
+        # are only collected when tests from them are first received
+        self.collection_manifest = collection_manifest
+        # manifest node ids by module, and the modules collected so far
+        self.manifest_modules = defaultdict(set)
+        self.collected_modules = set()
         self.slaveid = conf.runtime['env']['slaveid'] = slaveid
         self.log = cfme.utils.log.logger
         conf.clear()
         # Override the logger in utils.log
 
-        ctx = zmq.Context.instance()
-        self.sock = ctx.socket(zmq.REQ)
-        self.sock.set_hwm(1)
-        self.sock.setsockopt_string(zmq.IDENTITY, u'{}'.format(self.slaveid))
-        self.sock.connect(zmq_endpoint)
+        self.channel = SlaveChannel(self.slaveid, zmq_endpoint)
 
         self.messages = {}
 
         self.quit_signaled = False
 
+    def post_event(self, name, flush=False, **kwargs):
+        """Queue an event for the master, without waiting for it to be handled
+
+        Queued events are sent in batches, ``flush`` sends them right away.
+
+        """
+        kwargs['_event_name'] = name
+        self.log.debug("posting {} {!r}".format(name, kwargs))
+        self.channel.post(kwargs, flush=flush)
+
     def send_event(self, name, **kwargs):
+        """Send an event to the master, after any queued ones, and wait for its reply"""
         kwargs['_event_name'] = name
         self.log.debug("sending {} {!r}".format(name, kwargs))
-        self.sock.send_json(kwargs)
-        recv = self.sock.recv_json()
+        recv = self.channel.request(kwargs)
         if recv == 'die':
             self.log.info('Slave instructed to die by master; shutting down')
             raise SystemExit()
@@ -48,7 +63,30 @@ class SlaveManager(object):
 
     def message(self, message, **kwargs):
         """Send a message to the master, which should get printed to the console"""
-        self.send_event('message', message=message, markup=kwargs)  # message!
+        self.post_event('message', flush=True, message=message, markup=kwargs)  # message!
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection(self, session):
+        """pytest collection hook
+
+        - Skips the full collection if the master shipped its collection manifest,
+          reporting the manifest to the master instead. The collection of each module is
+          compared with the manifest once it's collected, see :py:meth:`_collect_module`.
+
+        """
+        if not self.collection_manifest:
+            return None
+        with open(self.collection_manifest) as f:
+            node_ids = json.load(f)['node_ids']
+        self.log.info('loaded {} tests from the master collection manifest'.format(len(node_ids)))
+        for nodeid in node_ids:
+            self.manifest_modules[nodeid.split('::')[0]].add(nodeid)
+        self.session = session
+        self.collection = {}
+        session.items = []
+        terminalreporter.disable()
+        self.send_event("collectionfinish", node_ids=node_ids)
+        return True
 
     def pytest_collection_finish(self, session):
         """pytest collection hook
@@ -56,6 +94,9 @@ class SlaveManager(object):
         - Sends collected tests to the master for comparison
 
         """
+        if self.collection_manifest:
+            # lazy module collection, the master already has the manifest
+            return
         self.log.debug('collection finished')
         self.session = session
         self.collection = {item.nodeid: item for item in session.items}
@@ -68,15 +109,17 @@ class SlaveManager(object):
         - sends logstart notice to the master
 
         """
-        self.send_event("runtest_logstart", nodeid=nodeid, location=location)
+        self.post_event("runtest_logstart", flush=True, nodeid=nodeid, location=location)
 
     def pytest_runtest_logreport(self, report):
         """pytest runtest logreport hook
 
-        - sends serialized log reports to the master
+        - sends serialized log reports to the master, batching the reports of a test
+          until its teardown
 
         """
-        self.send_event("runtest_logreport", report=serialize_report(report))
+        self.post_event("runtest_logreport", flush=report.when == 'teardown',
+                        report=serialize_report(report))
         if report.when == 'teardown':
             path, lineno, domaininfo = report.location
             test_status = _test_status(_format_nodeid(report.nodeid, False))
@@ -111,7 +154,7 @@ class SlaveManager(object):
         self.log.error(msg)
         # Only send the last line (exc type/message) to keep the pytest log clean
         short_tb = 'INTERNALERROR> {}'.format(msg.strip().splitlines()[-1])
-        self.send_event("internalerror", message=short_tb)
+        self.post_event("internalerror", flush=True, message=short_tb)
 
     def pytest_runtestloop(self, session):
         """pytest runtest loop
@@ -152,14 +195,62 @@ class SlaveManager(object):
         yield run_node, None
 
     def _iter_nodes(self):
+        # with a batch size set, the master hands out small batches and can move the rest
+        # of this slave's tests to idle slaves
+        batch_size = getattr(self.config.option, 'parallel_batch_size', 0)
         while True:
-            node_ids = self.send_event('need_tests')
+            node_ids = self.send_event('need_tests', batch_size=batch_size)
             if not node_ids:
                 break
             for nodeid in node_ids:
                 # TODO: take non-unique node ids into account
+                if self.collection_manifest:
+                    fspath = nodeid.split('::')[0]
+                    if fspath not in self.collected_modules:
+                        self._collect_module(fspath)
+                    if nodeid not in self.collection:
+                        self._report_not_collected(nodeid)
+                        continue
                 yield self.collection[nodeid]
 
+    def _collect_module(self, fspath):
+        """Collect a single test module, adding its items to the slave collection"""
+        self.log.info('collecting {}'.format(fspath))
+        # perform_collect replaces session.items with the items of this module only, keep the
+        # items of the modules collected before. It also fires pytest_collection_modifyitems and
+        # pytest_collection_finish again, for this module's items, so the plugins implementing
+        # them (e.g. the blocker prefetch) do their work module by module.
+        collected = self.session.items
+        items = self.session.perform_collect([str(self.config.rootdir.join(fspath))])
+        self.session.items = collected + items
+        self.collection.update((item.nodeid, item) for item in items)
+        self.collected_modules.add(fspath)
+
+        # the master's collection diff can't see this, compare with its manifest here
+        expected = self.manifest_modules[fspath]
+        node_ids = {item.nodeid for item in items}
+        missing, extra = sorted(expected - node_ids), sorted(node_ids - expected)
+        if missing or extra:
+            self.message('collection of {} differs from the master: {} tests missing, '
+                          '{} extra'.format(fspath, len(missing), len(extra)), purple=True)
+            self.log.warning('tests of {} missing in the slave collection: {}'.format(
+                fspath, missing))
+            self.log.warning('tests of {} missing in the master collection: {}'.format(
+                fspath, extra))
+
+    def _report_not_collected(self, nodeid):
+        """Report a test of the manifest the slave didn't collect as an error to the master"""
+        fspath, _, domain = nodeid.partition('::')
+        location = (fspath, None, domain)
+        self.post_event("runtest_logstart", nodeid=nodeid, location=location)
+        longrepr = '{} was not collected by {}, its collection differs from the master'.format(
+            nodeid, self.slaveid)
+        for when, outcome in [('setup', 'failed'), ('teardown', 'passed')]:
+            report = runner.TestReport(nodeid, location, {}, outcome,
+                                       longrepr if outcome == 'failed' else None, when)
+            self.post_event("runtest_logreport", flush=when == 'teardown',
+                            report=serialize_report(report))
+
 
 def serialize_report(rep):
     """
@@ -249,7 +340,8 @@ if __name__ == '__main__':
         conf.runtime["cfme_data"]["basic_info"]["appliance_template"] = template_name
         conf.runtime["cfme_data"]["basic_info"]["appliances_provider"] = provider_name
     pytest_config = _init_config(slave_options, slave_args)
-    slave_manager = SlaveManager(pytest_config, args.worker, config['zmq_endpoint'])
+    slave_manager = SlaveManager(pytest_config, args.worker, config['zmq_endpoint'],
+                                 config.get('collection_manifest'))
     pytest_config.pluginmanager.register(slave_manager, 'slave_manager')
     pytest_config.hook.pytest_cmdline_main(config=pytest_config)
     signal.signal(signal.SIGQUIT, slave_manager.handle_quit)
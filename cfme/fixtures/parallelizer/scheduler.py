@@ -0,0 +1,132 @@
+"""Test group schedulers for the parallelizer master
+
+The master builds a pool of test groups (one per module/parameter combination) and hands them
+out to slaves as they ask for tests. A scheduler decides the order of that pool; provider
+affinity is still applied on top of it by :py:meth:`ParallelSession.get`.
+
+Two schedulers are available:
+
+- ``collection``: groups are handed out in collection order (the historical behavior)
+- ``duration``: groups are handed out longest-first, based on the durations recorded in
+  previous runs, which is the classic LPT (longest processing time) bin-packing heuristic
+
+Per-test durations are kept in a small JSON file, ``log/test_durations.json`` by default,
+which the master updates at the end of each parallel run.
+
+"""
+import heapq
+import json
+
+from cfme.utils.path import log_path
+
+#: Default location of the durations store
+DEFAULT_DURATIONS_PATH = log_path.join('test_durations.json')
+
+#: Duration assumed for a test with no history when there is no history at all
+DEFAULT_TEST_DURATION = 60.0
+
+
+class DurationStore(object):
+    """Historical per-test durations, keyed by node id
+
+    New measurements are blended into the stored ones with an exponential moving average,
+    so one unusually slow or fast run doesn't throw the schedule off.
+
+    Args:
+        path: path of the JSON file backing the store
+        smoothing: weight given to a new measurement, between 0 and 1
+    """
+    def __init__(self, path=None, smoothing=0.5):
+        self.path = str(path or DEFAULT_DURATIONS_PATH)
+        self.smoothing = smoothing
+        self.durations = {}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.durations = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.durations = {}
+        return self
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.durations, f, indent=1, sort_keys=True)
+
+    def update(self, measured):
+        """Blend a ``{nodeid: seconds}`` dict of measured durations into the store"""
+        for nodeid, duration in measured.items():
+            previous = self.durations.get(nodeid)
+            if previous is None:
+                self.durations[nodeid] = duration
+            else:
+                self.durations[nodeid] = (
+                    self.smoothing * duration + (1 - self.smoothing) * previous)
+
+    @property
+    def default(self):
+        """Duration assumed for tests with no history: the mean of the known durations"""
+        if not self.durations:
+            return DEFAULT_TEST_DURATION
+        return sum(self.durations.values()) / len(self.durations)
+
+    def get(self, nodeid):
+        return self.durations.get(nodeid, self.default)
+
+    def __len__(self):
+        return len(self.durations)
+
+
+class CollectionOrderScheduler(object):
+    """Hands test groups out in collection order"""
+    name = 'collection'
+
+    def __init__(self, durations):
+        self.durations = durations
+
+    def group_duration(self, test_group):
+        default = self.durations.default
+        return sum(self.durations.durations.get(nodeid, default) for nodeid in test_group)
+
+    def order(self, test_groups):
+        return list(test_groups)
+
+    def predicted_makespan(self, test_groups, num_slaves):
+        """Simulate handing ``test_groups`` out in order to ``num_slaves`` slaves
+
+        Each group goes to the slave that becomes free first, the same way slaves ask the master
+        for work. Provider affinity is not taken into account, so this is a lower bound
+        for what the master can actually achieve.
+
+        Returns:
+            predicted wall-clock seconds until the last slave finishes
+        """
+        if num_slaves < 1:
+            return 0.0
+        slaves = [0.0] * num_slaves
+        for test_group in self.order(test_groups):
+            heapq.heappush(slaves, heapq.heappop(slaves) + self.group_duration(test_group))
+        return max(slaves)
+
+
+class LongestFirstScheduler(CollectionOrderScheduler):
+    """Hands the longest test groups out first, so no slow group ends up trailing the run"""
+    name = 'duration'
+
+    def order(self, test_groups):
+        # sorted is stable, so groups of equal duration keep their collection order
+        return sorted(test_groups, key=self.group_duration, reverse=True)
+
+
+SCHEDULERS = {
+    scheduler.name: scheduler
+    for scheduler in (CollectionOrderScheduler, LongestFirstScheduler)}
+
+
+def get_scheduler(name, durations):
+    """Instantiate the scheduler called ``name``"""
+    try:
+        return SCHEDULERS[name](durations)
+    except KeyError:
+        raise ValueError('Unknown parallelizer scheduler {!r}, use one of: {}'.format(
+            name, ', '.join(sorted(SCHEDULERS))))
@@ -0,0 +1,102 @@
+"""Event transport between the parallelizer master and its slaves
+
+Slaves talk to the master through a zmq DEALER socket connected to the master's ROUTER socket.
+Every zmq message carries a msgpack encoded list of events, each event being a dict with its
+name stored under ``_event_name``.
+
+Most events (log starts, reports, messages) are fire and forget: the slave queues them and
+sends them in batches, without waiting for the master. Only the events the slave needs an answer
+for (collection results, requests for more tests, shutdown) are sent as requests, which flush
+the queue first so the master always sees events in the order they happened.
+
+"""
+import msgpack
+import zmq
+
+#: Number of queued events that triggers sending them to the master
+EVENT_BATCH_SIZE = 64
+
+
+def pack(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpack(payload):
+    return msgpack.unpackb(payload, raw=False)
+
+
+class SlaveChannel(object):
+    """Slave end of the event transport
+
+    Args:
+        slaveid: identity of the slave, as known by the master
+        endpoint: zmq endpoint the master is bound to
+        batch_size: number of queued events that triggers sending them
+    """
+    def __init__(self, slaveid, endpoint, batch_size=EVENT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue = []
+        ctx = zmq.Context.instance()
+        self.sock = ctx.socket(zmq.DEALER)
+        self.sock.setsockopt_string(zmq.IDENTITY, u'{}'.format(slaveid))
+        self.sock.setsockopt(zmq.LINGER, 1000)
+        self.sock.connect(endpoint)
+
+    def post(self, event, flush=False):
+        """Queue an event for the master without waiting for a reply"""
+        self._queue.append(event)
+        if flush or len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send all queued events to the master as a single message"""
+        if self._queue:
+            self.sock.send_multipart([b'', pack(self._queue)])
+            self._queue = []
+
+    def request(self, event):
+        """Send an event with all queued events before it, and wait for the master's reply"""
+        self.post(event, flush=True)
+        return unpack(self.sock.recv_multipart()[-1])
+
+    def close(self):
+        self.flush()
+        self.sock.close()
+
+
+class MasterChannel(object):
+    """Master end of the event transport
+
+    Args:
+        endpoint: zmq endpoint to bind to
+    """
+    def __init__(self, endpoint):
+        ctx = zmq.Context.instance()
+        self.sock = ctx.socket(zmq.ROUTER)
+        self.sock.bind(endpoint)
+
+    def send(self, slaveid, data):
+        """Reply to a slave's request"""
+        self.sock.send_multipart([slaveid, b'', pack(data)])
+
+    def recv(self, timeout=50):
+        """Receive every event the slaves have sent so far
+
+        Waits up to ``timeout`` milliseconds for the first message, then drains whatever else
+        is ready without blocking.
+
+        Returns:
+            list of ``(slaveid, event)`` tuples, in the order they were received
+        """
+        events = []
+        if not self.sock.poll(timeout, zmq.POLLIN):
+            return events
+        while True:
+            try:
+                slaveid, _, payload = self.sock.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return events
+            events.extend((slaveid, event) for event in unpack(payload))
+
+    def close(self):
+        self.sock.close()
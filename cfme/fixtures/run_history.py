@@ -0,0 +1,126 @@
+"""Records the outcome and durations of every test in the run history database
+
+See :py:mod:`cfme.utils.run_history` for the database itself, and ``miq history`` to query it.
+
+In parallel runs, only the master records results, as it receives the reports of all slaves.
+The timings of the UI navigations done by the tests are recorded too, slaves send theirs to the
+master after every test.
+
+"""
+import sys
+from collections import defaultdict
+
+import pytest
+
+from cfme.fixtures.pytest_store import store
+from cfme.utils.log import logger
+from cfme.utils.run_history import RunHistory, report_outcome
+
+#: Number of recorded tests after which the results are committed
+COMMIT_INTERVAL = 50
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption('--run-history', dest='run_history', default=None,
+                    help='SQLite database to record test outcomes and durations in, '
+                         'defaults to log/run_history.sqlite')
+    group.addoption('--no-run-history', dest='no_run_history', action='store_true',
+                    default=False, help='Do not record this run in the run history database')
+
+
+class RunHistoryHooks(object):
+    def pytest_miq_navigation_timings(self, config, timings):
+        """called on the parallelizer master with navigation timings sent by a slave"""
+
+
+def pytest_addhooks(pluginmanager):
+    pluginmanager.add_hookspecs(RunHistoryHooks)
+
+
+def take_navigation_timings(nodeid):
+    """Takes the timings of the UI navigations done since the last call, for the test"""
+    # not imported means there was no navigation
+    ui = sys.modules.get('cfme.utils.appliance.implementations.ui')
+    timings = []
+    while ui is not None and ui.navigation_timings:
+        timing = ui.navigation_timings.popleft()
+        timing.update(nodeid=nodeid, slaveid=store.slaveid)
+        timings.append(timing)
+    return timings
+
+
+def pytest_configure(config):
+    if config.getoption('no_run_history') or config.getoption('collectonly'):
+        return
+    config.pluginmanager.register(RunHistoryRecorder(config), 'run_history')
+
+
+class RunHistoryRecorder(object):
+    def __init__(self, config):
+        self.config = config
+        self.history = None
+        self.run_id = None
+        self.appliance_version = None
+        self.providers = []
+        self.reports = defaultdict(dict)
+        self.recorded = 0
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_sessionstart(self, session):
+        if store.parallelizer_role == 'slave':
+            return
+        from cfme.utils.conf import cfme_data
+        # longest first, so a provider key doesn't match part of a longer one
+        self.providers = sorted(cfme_data.get('management_systems', {}), key=len, reverse=True)
+        appliance = store.current_appliance
+        if appliance is not None and not appliance.is_dev:
+            self.appliance_version = appliance.version.vstring
+        self.history = RunHistory(self.config.getoption('run_history'))
+        self.run_id = self.history.start_run(self.appliance_version)
+        logger.info('Recording run %d in %s', self.run_id, self.history.path)
+
+    def provider_of(self, nodeid):
+        if '[' not in nodeid:
+            return None
+        params = nodeid.split('[', 1)[1]
+        for provider in self.providers:
+            if provider in params:
+                return provider
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == 'teardown' and getattr(report, 'slaveid', None) is None:
+            timings = take_navigation_timings(report.nodeid)
+            if timings and store.parallelizer_role == 'slave':
+                store.slave_manager.post_event('navigation_timings', timings=timings)
+            else:
+                self.pytest_miq_navigation_timings(self.config, timings)
+        if self.history is None:
+            return
+        self.reports[report.nodeid][report.when] = report
+        if report.when != 'teardown':
+            return
+        reports = self.reports.pop(report.nodeid)
+        durations = {when: rep.duration for when, rep in reports.items()}
+        self.history.record_test(
+            self.run_id, report.nodeid, report_outcome(reports),
+            slaveid=getattr(report, 'slaveid', None),
+            provider=self.provider_of(report.nodeid),
+            appliance_version=self.appliance_version,
+            **durations)
+        self.recorded += 1
+        if self.recorded % COMMIT_INTERVAL == 0:
+            self.history.commit()
+
+    def pytest_miq_navigation_timings(self, config, timings):
+        if self.history is None:
+            return
+        for timing in timings:
+            self.history.record_navigation(self.run_id, **timing)
+
+    def pytest_sessionfinish(self):
+        if self.history is None:
+            return
+        self.history.finish_run(self.run_id)
+        self.history.close()
+        self.history = None
@@ -326,6 +326,7 @@ class Discover(CFMENavigateStep):
 class Details(CFMENavigateStep):
     VIEW = InfraProviderDetailsView
     prerequisite = NavigateToSibling('All')
+    URL = 'ems_infra/{obj.id}'
 
     def step(self):
         self.prerequisite_view.entities.get_entity(name=self.obj.name, surf_pages=True).click()
@@ -0,0 +1,56 @@
+"""Script to query the run history database
+
+Usage:
+
+   miq history slowest-tests
+   miq history flakiest-tests --runs 20
+   miq history slowest-navigations
+"""
+import click
+from tabulate import tabulate
+
+from cfme.utils.run_history import RunHistory
+
+
+@click.group(help='Functions querying the history of test runs')
+def main():
+    pass
+
+
+def history_options(func):
+    func = click.option('--db', default=None,
+                        help='Run history database, defaults to log/run_history.sqlite')(func)
+    func = click.option('--limit', default=20, help='How many entries to show')(func)
+    func = click.option('--runs', default=10, help='How many of the last runs to look at')(func)
+    return func
+
+
+@main.command('slowest-tests', help='Shows the tests with the highest average duration')
+@history_options
+def slowest_tests(db, limit, runs):
+    rows = RunHistory(db).slowest_tests(limit=limit, runs=runs)
+    print(tabulate(rows, headers=['test', 'average (s)', 'results'], floatfmt='.1f'))
+
+
+@main.command('slowest-fixtures', help='Shows the fixtures with the highest total setup time')
+@history_options
+def slowest_fixtures(db, limit, runs):
+    rows = RunHistory(db).slowest_fixtures(limit=limit, runs=runs)
+    print(tabulate(rows, headers=['fixture', 'scope', 'total (s)', 'average (s)', 'setups'],
+                   floatfmt='.1f'))
+
+
+@main.command('slowest-navigations',
+              help='Shows the UI navigation destinations taking most time in total')
+@history_options
+def slowest_navigations(db, limit, runs):
+    rows = RunHistory(db).slowest_navigations(limit=limit, runs=runs)
+    print(tabulate(rows, headers=['destination', 'method', 'total (s)', 'average (s)',
+                                  'navigations'], floatfmt='.1f'))
+
+
+@main.command('flakiest-tests', help='Shows the tests flipping most between pass and fail')
+@history_options
+def flakiest_tests(db, limit, runs):
+    rows = RunHistory(db).flakiest_tests(limit=limit, runs=runs)
+    print(tabulate(rows, headers=['test', 'flakiness', 'results'], floatfmt='.2f'))
@@ -2,6 +2,7 @@ import click
 from artifactor.__main__ import main as art_main
 from cfme.scripting.appliance import main as app_main
 from cfme.scripting.conf import main as conf_main
+from cfme.scripting.history import main as history_main
 from cfme.scripting.ipyshell import main as shell_main
 from cfme.scripting.setup_env import main as setup_main
 from cfme.scripting.sprout import main as sprout_main
@@ -21,6 +22,7 @@ cli.add_command(art_main, name="artifactor-server")
 cli.add_command(rel_main, name="release")
 cli.add_command(shell_main, name="shell")
 cli.add_command(conf_main, name="conf")
+cli.add_command(history_main, name="history")
 cli.add_command(sprout_main, name="sprout")
 cli.add_command(setup_main, name="setup-env")
 
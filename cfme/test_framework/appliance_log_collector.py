@@ -10,11 +10,29 @@ Options in env.yaml will define what files to collect, will default to the set b
             - /var/www/miq/vmdb/log/production.log
             - /var/www/miq/vmdb/log/automation.log
 
-Log files will be tarred and written to log_path
+With ``--collect-logs`` the log files are collected from all appliances at session shutdown, with
+``--collect-logs-per-test`` also after every test, into a directory named after the test.
+
+The appliances are worked on concurrently. Only what was added to a log file since it was
+collected last is transferred, gzipped on the appliance and appended as a new gzip member to
+``<local_dir>/<hostname>/[<test>/]<log file name>.gz``, so ``zcat`` shows the whole content. A log
+file which got rotated or truncated meanwhile is collected again from its beginning. The per-test
+collections and the session collection keep their own offsets, so the session archive gets the
+whole logs. Every archive is overwritten the first time it is written to in a run.
+
+In parallel runs, the slaves collect the logs per test and only the master collects the session
+logs, of all the appliances.
 """
+import os
+import re
+import time
+
 import pytest
+from gevent.pool import Pool
 
+from cfme.fixtures.pytest_store import store
 from cfme.utils.path import log_path
+from cfme.utils.quote import quote
 from cfme.utils.conf import env
 from cfme.utils.log import logger
 
@@ -25,57 +43,199 @@ DEFAULT_FILES = ['/var/www/miq/vmdb/log/evm.log',
 
 DEFAULT_LOCAL = log_path
 
+#: Seconds a transfer of a single log file may take
+TRANSFER_TIMEOUT = 3600
+
+# collector of the session, created at configure when collecting
+_collector = None
+
+
+class ApplianceLogCollector(object):
+    """Collects what was added to log files of appliances since the last collection
+
+    Args:
+        log_files: paths of the log files on the appliances
+        local_dir: :py:class:`py.path.local` directory the logs are written to
+    """
+    def __init__(self, log_files, local_dir):
+        self.log_files = list(log_files)
+        self.local_dir = local_dir
+        # (hostname, stream, log file): (inode, bytes collected), the stream being 'session', or
+        # 'test' for the collections per test, where each test continues after the previous one
+        self.offsets = {}
+        # local files written to by this collector, the first write overwrites them
+        self.written = set()
+
+    @staticmethod
+    def stream(name):
+        return 'test' if name else 'session'
+
+    def stat(self, ssh_client):
+        """Returns dict of ``(inode, size)`` of the log files existing on the appliance"""
+        result = ssh_client.run_command('stat -c "%n %i %s" {} 2>/dev/null'.format(
+            ' '.join(quote(log_file) for log_file in self.log_files)))
+        stats = {}
+        for line in result.output.splitlines():
+            try:
+                log_file, inode, size = line.rsplit(' ', 2)
+                stats[log_file] = (inode, int(size))
+            except ValueError:
+                logger.warning('Unexpected stat output line %r', line)
+        return stats
+
+    def mark_appliance(self, appliance, name=None):
+        """Skips the current content of the log files, only what is added later gets collected
+
+        Args:
+            appliance: the appliance to mark the logs of
+            name: marks the offsets of the collections per test if set, of the session otherwise
+        """
+        for log_file, stat in self.stat(appliance.ssh_client).items():
+            self.offsets[(appliance.hostname, self.stream(name), log_file)] = stat
+
+    def collect_appliance(self, appliance, name=None):
+        """Collects the new content of the log files of one appliance
+
+        Args:
+            appliance: the appliance to collect the logs of
+            name: name of the directory (per appliance) to write the logs to, if any
+
+        Returns:
+            tuple of the number of bytes collected and of compressed bytes written
+        """
+        ssh_client = appliance.ssh_client
+        local_dir = self.local_dir.join(appliance.hostname)
+        if name:
+            local_dir = local_dir.join(name)
+        collected = written = 0
+        for log_file, (inode, size) in sorted(self.stat(ssh_client).items()):
+            key = (appliance.hostname, self.stream(name), log_file)
+            last_inode, offset = self.offsets.get(key, (inode, 0))
+            if inode != last_inode or size < offset:
+                logger.info('%s on %s was rotated, collecting it whole', log_file, appliance)
+                offset = 0
+            if size > offset:
+                local_file = local_dir.ensure('{}.gz'.format(os.path.basename(log_file)))
+                append = local_file.strpath in self.written
+                start = local_file.size() if append else 0
+                result = None
+                with local_file.open('ab' if append else 'wb') as f:
+                    try:
+                        result = ssh_client.run_command(
+                            'tail -c +{} {} | head -c {} | gzip -c'.format(
+                                offset + 1, quote(log_file), size - offset),
+                            timeout=TRANSFER_TIMEOUT, stdout_file=f)
+                    finally:
+                        if result is None or not result.success:
+                            # don't leave a partial gzip member behind
+                            f.truncate(start)
+                if not result.success:
+                    logger.error('Collecting %s on %s failed: %s',
+                                 log_file, appliance, result.output)
+                    continue
+                self.written.add(local_file.strpath)
+                collected += size - offset
+                written += local_file.size() - start
+            self.offsets[key] = (inode, size)
+        return collected, written
+
+    def _map(self, func, appliances):
+        def call(appliance):
+            try:
+                return func(appliance)
+            except Exception:
+                logger.exception('Log collection on %s failed', appliance)
+                return 0, 0
+        appliances = list(appliances)
+        return Pool(max(len(appliances), 1)).map(call, appliances)
+
+    def mark(self, appliances, name=None):
+        """Calls :py:meth:`mark_appliance` for all the appliances concurrently"""
+        self._map(lambda app: self.mark_appliance(app, name), appliances)
+
+    def collect(self, appliances, name=None):
+        """Calls :py:meth:`collect_appliance` for all the appliances concurrently
+
+        Returns:
+            tuple of the number of bytes collected and of compressed bytes written
+        """
+        start = time.time()
+        results = self._map(lambda app: self.collect_appliance(app, name), appliances)
+        elapsed = max(time.time() - start, 0.001)
+        collected = sum(result[0] for result in results)
+        written = sum(result[1] for result in results)
+        logger.info('Collected %.1f MB of logs (%.1f MB gzipped) from %d appliances in %.1fs, '
+                    '%.1f MB/s', collected / 1e6, written / 1e6, len(results), elapsed,
+                    collected / 1e6 / elapsed)
+        return collected, written
+
 
 def pytest_addoption(parser):
     parser.addoption('--collect-logs', action='store_true',
                      help=('Collect logs from all appliances and store locally at session '
                            'shutdown.  Configured via log_collector in env.yaml'))
+    parser.addoption('--collect-logs-per-test', action='store_true',
+                     help=('Collect what every test added to the logs of all appliances after the '
+                           'test, implies --collect-logs'))
+
+
+def get_appliances(config):
+    from cfme.test_framework.appliance import PLUGIN_KEY
+    holder = config.pluginmanager.get_plugin(PLUGIN_KEY)
+    if holder is None:
+        return []
+    return holder.appliances
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config):
+    global _collector
+    if not (config.getoption('--collect-logs') or config.getoption('--collect-logs-per-test')):
+        return
+    log_files = DEFAULT_FILES
+    local_dir = DEFAULT_LOCAL
+    try:
+        log_files = env.log_collector.log_files
+    except (AttributeError, KeyError):
+        logger.info('No log_collector.log_files in env, use default files: %s', log_files)
+        pass
+    try:
+        local_dir = log_path.join(env.log_collector.local_dir)
+    except (AttributeError, KeyError):
+        logger.info('No log_collector.local_dir in env, use default local_dir: %s', local_dir)
+        pass
+
+    # Handle local dir existing
+    local_dir.ensure(dir=True)
+    _collector = ApplianceLogCollector(log_files, local_dir)
+
+
+def pytest_sessionstart(session):
+    if _collector is not None and session.config.getoption('--collect-logs-per-test'):
+        # the first test should get only its own part of the logs
+        _collector.mark(get_appliances(session.config), name='test')
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item, nextitem):
+    yield
+    if _collector is not None and item.config.getoption('--collect-logs-per-test'):
+        _collector.collect(get_appliances(item.config), name=re.sub(r'[^\w.-]+', '_', item.nodeid))
 
 
 @pytest.hookimpl(tryfirst=True, hookwrapper=True)
 def pytest_unconfigure(config):
+    global _collector
     yield  # since hookwrapper, let hookimpl run
-    if config.getoption('--collect-logs'):
+    # in parallel runs, the master collects the session logs of all the appliances
+    if _collector is not None and store.parallelizer_role != 'slave':
         logger.info('Starting log collection on appliances')
-        log_files = DEFAULT_FILES
-        local_dir = DEFAULT_LOCAL
-        try:
-            log_files = env.log_collector.log_files
-        except (AttributeError, KeyError):
-            logger.info('No log_collector.log_files in env, use default files: %s', log_files)
-            pass
-        try:
-            local_dir = log_path.join(env.log_collector.local_dir)
-        except (AttributeError, KeyError):
-            logger.info('No log_collector.local_dir in env, use default local_dir: %s', local_dir)
-            pass
-
-        # Handle local dir existing
-        local_dir.ensure(dir=True)
-        from cfme.test_framework.appliance import PLUGIN_KEY
-        holder = config.pluginmanager.get_plugin(PLUGIN_KEY)
-        if holder is None:
+        appliances = get_appliances(config)
+        if not appliances:
             # No appliances to fetch logs from
             logger.warning('No logs collected, appliance holder is empty')
-            return
-
-        written_files = []
-        for app in holder.appliances:
-            with app.ssh_client as ssh_client:
-                tar_file = 'log-collector-{}.tar.gz'.format(
-                    app.hostname)
-                logger.debug('Creating tar file on app %s:%s with log files %s',
-                             app, tar_file, ' '.join(log_files))
-                # wrap the files in ls, redirecting stderr, to ignore files that don't exist
-                tar_result = ssh_client.run_command(
-                    'tar -czvf {tar} $(ls {files} 2>/dev/null)'
-                    .format(tar=tar_file, files=' '.join(log_files)))
-                try:
-                    assert tar_result.success
-                except AssertionError:
-                    logger.exception('Tar command non-zero RC when collecting logs on %s: %s',
-                                     app, tar_result.output)
-                    continue
-                ssh_client.get_file(tar_file, local_dir.strpath)
-            written_files.append(tar_file)
-        logger.info('Wrote the following files to local log path: %s', written_files)
+        else:
+            _collector.collect(appliances)
+            logger.info('Wrote the logs of the appliances to local log path: %s',
+                        _collector.local_dir)
+    _collector = None
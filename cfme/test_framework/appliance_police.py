@@ -1,3 +1,14 @@
+"""Keeps an eye on the health of the appliance under test.
+
+A background :py:class:`ApplianceHealthMonitor` per appliance probes its ports and web UI every
+:py:data:`PROBE_INTERVAL` seconds. The autouse :py:func:`appliance_police` fixture only reads its
+last status and returns right away when it is recent and healthy. It probes by itself when the
+status is too old or not healthy, and escalates (restarting evm or calling a human) only once per
+incident, i.e. when the appliance turned from healthy to unhealthy.
+"""
+import time
+from threading import Event as ThreadEvent, Lock, Thread
+
 import attr
 import pytest
 
@@ -5,6 +16,7 @@ import pytest
 import requests
 
 from cfme.utils import ports
+from cfme.utils.log import logger
 from cfme.utils.net import net_check
 from cfme.utils.wait import TimedOutError
 from cfme.utils.conf import rdb
@@ -13,6 +25,14 @@ from cfme.fixtures.pytest_store import store
 
 from cfme.fixtures.rdb import Rdb
 
+#: Seconds between the background probes of an appliance
+PROBE_INTERVAL = 30
+#: Seconds after which the last status is too old to be trusted and the fixture probes itself
+MAX_STATUS_AGE = 2 * PROBE_INTERVAL
+
+# running monitors by appliance url
+_monitors = {}
+
 
 @attr.s
 class AppliancePoliceException(Exception):
@@ -23,50 +43,172 @@ class AppliancePoliceException(Exception):
         return "{} (port {})".format(self.message, self.port)
 
 
+@attr.s(frozen=True)
+class HealthStatus(object):
+    """Result of a probe of an appliance
+
+    Args:
+        error: the exception the probe failed with, ``None`` if the appliance is healthy
+        checked_at: time of the probe
+        changed_at: time of the probe which found the appliance (un)healthy first
+        incident: number of times the appliance turned unhealthy
+    """
+    error = attr.ib()
+    checked_at = attr.ib()
+    changed_at = attr.ib()
+    incident = attr.ib()
+
+    @property
+    def healthy(self):
+        return self.error is None
+
+    @property
+    def age(self):
+        return time.time() - self.checked_at
+
+
+def check_appliance(appliance):
+    """Checks the ports and the web UI of the appliance
+
+    Raises:
+        :py:class:`AppliancePoliceException` if the appliance is not healthy
+    """
+    available_ports = {
+        'ssh': (appliance.hostname, appliance.ssh_port),
+        'https': (appliance.hostname, appliance.ui_port),
+        'postgres': (appliance.db_host or appliance.hostname, appliance.db_port)}
+    port_results = {pn: net_check(addr=p_addr, port=p_port, force=True)
+                    for pn, (p_addr, p_port) in available_ports.items()}
+    for port, result in port_results.items():
+        if port == 'ssh' and appliance.is_pod:
+            # ssh is not available for podified appliance
+            continue
+        if not result:
+            raise AppliancePoliceException('Unable to connect', available_ports[port][1])
+
+    try:
+        status_code = requests.get(appliance.url, verify=False,
+                                   timeout=120).status_code
+    except Exception:
+        raise AppliancePoliceException('Getting status code failed',
+                                       available_ports['https'][1])
+
+    if status_code != 200:
+        raise AppliancePoliceException('Status code was {}, should be 200'.format(
+            status_code), available_ports['https'][1])
+
+
+class ApplianceHealthMonitor(Thread):
+    """Probes an appliance in the background and keeps the last :py:class:`HealthStatus`
+
+    Args:
+        appliance: the appliance to probe
+        interval: seconds between the probes
+        check: function probing the appliance, raising an exception if it is not healthy
+    """
+    def __init__(self, appliance, interval=PROBE_INTERVAL, check=check_appliance):
+        super(ApplianceHealthMonitor, self).__init__(
+            name='appliance-health-{}'.format(appliance.hostname))
+        self.daemon = True
+        self.appliance = appliance
+        self.interval = interval
+        self.check = check
+        # incident the fixture escalated last, so it escalates each of them only once
+        self.escalated_incident = 0
+        self._status = None
+        self._lock = Lock()
+        self._stop_event = ThreadEvent()
+
+    @property
+    def status(self):
+        """The last :py:class:`HealthStatus`, ``None`` before the first probe finished"""
+        return self._status
+
+    def probe(self):
+        """Probes the appliance now, records and returns the new :py:class:`HealthStatus`"""
+        try:
+            self.check(self.appliance)
+            error = None
+        except Exception as e:
+            error = e
+        now = time.time()
+        with self._lock:
+            previous = self._status
+            if previous is not None and previous.healthy == (error is None):
+                changed_at, incident = previous.changed_at, previous.incident
+            else:
+                changed_at = now
+                incident = previous.incident if previous is not None else 0
+                if error is not None:
+                    incident += 1
+                    logger.warning('Appliance %s turned unhealthy: %s', self.appliance.url, error)
+                elif previous is not None:
+                    logger.info('Appliance %s is healthy again', self.appliance.url)
+            self._status = HealthStatus(error, now, changed_at, incident)
+            return self._status
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.probe()
+            except Exception:
+                logger.exception('Probing appliance %s failed', self.appliance.url)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def health_monitor(appliance):
+    """Returns the running monitor of the appliance, starting it if needed
+
+    Monitors of the appliances tested before are stopped.
+    """
+    monitor = _monitors.get(appliance.url)
+    if monitor is None or not monitor.is_alive():
+        for url in list(_monitors):
+            _monitors.pop(url).stop()
+        monitor = _monitors[appliance.url] = ApplianceHealthMonitor(appliance)
+        monitor.start()
+    return monitor
+
+
+def pytest_unconfigure():
+    for url in list(_monitors):
+        _monitors.pop(url).stop()
+
+
 @pytest.fixture(autouse=True, scope="function")
 def appliance_police(appliance):
     if not store.slave_manager:
         return
-    try:
-        available_ports = {
-            'ssh': (appliance.hostname, appliance.ssh_port),
-            'https': (appliance.hostname, appliance.ui_port),
-            'postgres': (appliance.db_host or appliance.hostname, appliance.db_port)}
-        port_results = {pn: net_check(addr=p_addr, port=p_port, force=True)
-                        for pn, (p_addr, p_port) in available_ports.items()}
-        for port, result in port_results.items():
-            if port == 'ssh' and appliance.is_pod:
-                # ssh is not available for podified appliance
-                continue
-            if not result:
-                raise AppliancePoliceException('Unable to connect', available_ports[port][1])
-
-        try:
-            status_code = requests.get(appliance.url, verify=False,
-                                       timeout=120).status_code
-        except Exception:
-            raise AppliancePoliceException('Getting status code failed',
-                                           available_ports['https'][1])
-
-        if status_code != 200:
-            raise AppliancePoliceException('Status code was {}, should be 200'.format(
-                status_code), available_ports['https'][1])
+    monitor = health_monitor(appliance)
+    status = monitor.status
+    if status is None or status.age > MAX_STATUS_AGE or not status.healthy:
+        # nothing recent to trust, or a failure to confirm before escalating
+        status = monitor.probe()
+    if status.healthy:
         return
-    except AppliancePoliceException as e:
+    if status.incident == monitor.escalated_incident:
+        # escalated already, nothing new since then
+        logger.warning('Appliance %s is still unhealthy: %s', appliance.url, status.error)
+        return
+    monitor.escalated_incident = status.incident
+
+    e = status.error
+    if isinstance(e, AppliancePoliceException) and e.port == 443:
         # special handling for known failure conditions
-        if e.port == 443:
-            # Lots of rdbs lately where evm seems to have entirely crashed
-            # and (sadly) the only fix is a rude restart
-            appliance.restart_evm_rude()
-            try:
-                appliance.wait_for_web_ui(900)
-                store.write_line('EVM was frozen and had to be restarted.', purple=True)
-                return
-            except TimedOutError:
-                pass
-        e_message = str(e)
-    except Exception as e:
-        e_message = str(e)
+        # Lots of rdbs lately where evm seems to have entirely crashed
+        # and (sadly) the only fix is a rude restart
+        appliance.restart_evm_rude()
+        try:
+            appliance.wait_for_web_ui(900)
+            store.write_line('EVM was frozen and had to be restarted.', purple=True)
+            monitor.probe()
+            return
+        except TimedOutError:
+            pass
+    e_message = str(e)
 
     # Regardles of the exception raised, we didn't return anywhere above
     # time to call a human
@@ -81,3 +223,4 @@ def appliance_police(appliance):
         rdb_kwargs = {}
     Rdb(msg).set_trace(**rdb_kwargs)
     store.slave_manager.message('Resuming testing following remote debugging')
+    monitor.probe()
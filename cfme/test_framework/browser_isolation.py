@@ -3,9 +3,20 @@
 
 If active, then when each test ends, the browser gets killed. That ensures that whatever way the
 browser session could be tainted after a test, the next test should not be affected.
+
+To not pay for starting a browser (and logging in) in every test, spare browsers are kept open in
+the background, see :py:meth:`cfme.utils.browser.BrowserManager.keep_spares`. With
+``--browser-isolation-login`` the spares are logged in as the default admin user already.
 """
 import pytest
-from cfme.utils.appliance import find_appliance
+from selenium.webdriver.support.ui import WebDriverWait
+
+from cfme.utils import conf
+from cfme.utils.appliance import DummyAppliance, find_appliance
+from cfme.utils.browser import manager
+
+#: Seconds the login of a spare browser may take
+LOGIN_TIMEOUT = 120
 
 
 def pytest_addoption(parser):
@@ -17,6 +28,39 @@ def pytest_addoption(parser):
             'Isolate browser sessions for each test. That makes sure that whatever state the '
             'browser is in after a test, it will be killed so the next test will have to check out '
             'a fresh browser session.'))
+    parser.addoption(
+        '--browser-isolation-spares',
+        type=int,
+        default=1,
+        help='Number of spare browsers kept open in the background with --browser-isolation')
+    parser.addoption(
+        '--browser-isolation-login',
+        action='store_true',
+        default=False,
+        help='Log the spare browsers in as the default admin user')
+
+
+def log_in_admin(selenium):
+    """Logs the selenium browser opened at the login page in as the default admin user"""
+    selenium.find_element_by_name('user_name').send_keys(
+        conf.credentials['default']['username'])
+    selenium.find_element_by_name('user_password').send_keys(
+        conf.credentials['default']['password'])
+    selenium.find_element_by_id('login').click()
+    WebDriverWait(selenium, LOGIN_TIMEOUT).until(
+        lambda selenium: not selenium.find_elements_by_name('user_name'))
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    spares = item.config.getoption('browser_isolation_spares')
+    if not item.config.getoption('browser_isolation') or spares < 1:
+        return
+    appliance = find_appliance(item, require=False)
+    if appliance is None or isinstance(appliance, DummyAppliance):
+        return
+    prepare = log_in_admin if item.config.getoption('browser_isolation_login') else None
+    manager.keep_spares(spares, url_key=appliance.server.address(), prepare=prepare)
 
 
 @pytest.mark.hookwrapper(trylast=True)
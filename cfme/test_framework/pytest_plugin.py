@@ -63,6 +63,7 @@ pytest_plugins = (
     'cfme.fixtures.disable_forgery_protection',
     'cfme.fixtures.datafile',
     'cfme.fixtures.fixtureconf',
+    'cfme.fixtures.fixture_profiler',
     'cfme.fixtures.log',
     'cfme.fixtures.maximized',
     'cfme.fixtures.merkyl',
@@ -93,6 +94,7 @@ pytest_plugins = (
     'cfme.fixtures.cli',
     'cfme.fixtures.authentication',
     'cfme.fixtures.rdb',
+    'cfme.fixtures.run_history',
     'cfme.fixtures.service_fixtures',
     'cfme.fixtures.smtp',
     'cfme.fixtures.tag',
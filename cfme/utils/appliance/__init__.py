@@ -8,6 +8,7 @@ import traceback
 import warnings
 from copy import copy
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from tempfile import NamedTemporaryFile
 from time import sleep, time
 
@@ -22,6 +23,7 @@ import yaml
 from cached_property import cached_property
 from debtcollector import removals
 from manageiq_client.api import APIException, ManageIQClient as VanillaMiqApi
+from manageiq_client.filters import Q
 from six.moves.urllib.parse import urlparse
 from werkzeug.local import LocalStack, LocalProxy
 from wrapanapi import VmState
@@ -56,6 +58,9 @@ RECOGNIZED_BY_CREDS = ["CloudManager", "Nuage::NetworkManager"]
 # A helper for the IDs
 SEQ_FACT = 1e12
 
+# Default number of resources fetched per request by MiqApi.bulk_query, the API's default maximum
+REST_PAGE_SIZE = 1000
+
 
 def _current_miqqe_version():
     """Parses MiqQE JS patch version from the patch file
@@ -85,6 +90,61 @@ class MiqApi(VanillaMiqApi):
             raise ValueError('Subcollections not supported! ({})'.format(parsed.path))
         return entity
 
+    def bulk_query(self, collection, filters=None, attributes=None, sort_by='id',
+                   page_size=REST_PAGE_SIZE, parallel=1):
+        """Fetches all resources of a collection matching the filters in as few requests as possible
+
+        Instead of listing the ids and getting each entity on its own, the resources are requested
+        expanded, filtered on the server, restricted to the wanted attributes and in pages of
+        ``page_size`` resources.
+
+        Args:
+            collection: Name of the collection, e.g. ``'vms'``
+            filters: :py:class:`manageiq_client.filters.Q` or list of ``filter[]`` strings
+            attributes: Attributes to return besides ``id`` and ``href``, all of them if None
+            sort_by: Attribute to sort the resources by, keeps the pages consistent
+            page_size: Number of resources requested at once
+            parallel: Number of pages fetched concurrently, once the first page tells the total
+
+        Returns:
+            A list of resource dicts
+        """
+        href = getattr(self.collections, collection)._href
+        params = {'expand': 'resources', 'limit': page_size, 'sort_by': sort_by,
+                  'sort_order': 'asc'}
+        if filters:
+            params['filter[]'] = filters.as_filters if isinstance(filters, Q) else list(filters)
+        if attributes:
+            params['attributes'] = ','.join(attributes)
+
+        def fetch(offset):
+            return self.get(href, offset=offset, **params)['resources']
+
+        first_page = self.get(href, offset=0, **params)
+        resources = list(first_page['resources'])
+        # subcount is the number of resources in the page, the total matching the query is
+        # subquery_count with filters and count without them
+        total = first_page.get('subquery_count' if filters else 'count')
+        if total is None:
+            # no total to plan the pages by, fetch them until one comes back short
+            page = resources
+            while len(page) == page_size:
+                page = fetch(len(resources))
+                resources.extend(page)
+            return resources
+        offsets = list(range(page_size, total, page_size))
+        if parallel > 1 and len(offsets) > 1:
+            pool = ThreadPool(min(parallel, len(offsets)))
+            try:
+                pages = pool.map(fetch, offsets)
+            finally:
+                pool.close()
+        else:
+            pages = [fetch(offset) for offset in offsets]
+        for page in pages:
+            resources.extend(page)
+        return resources
+
 
 class ApplianceException(Exception):
     pass
@@ -693,7 +753,7 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
             not recognized, but are present.
         """
         known_ems_list = []
-        for ems in self.rest_api.collections.providers:
+        for ems in self.rest_api.bulk_query('providers', attributes=['name', 'type']):
             if not any(
                     p_type in ems['type'] for p_type in RECOGNIZED_BY_IP + RECOGNIZED_BY_CREDS):
                 continue
@@ -710,14 +770,16 @@ ExecStartPre=/usr/bin/bash -c "ipcs -s|grep apache|cut -d\  -f2|while read line;
         from cfme.utils.providers import list_providers
         prov_cruds = list_providers(use_global_filters=False)
 
+        # Name check is authoritative and the only proper way to recognize a known provider
+        cruds_by_name = {}
+        for prov in prov_cruds:
+            cruds_by_name.setdefault(prov.name, prov)
+
         found_cruds = set()
         unrecognized_ems_names = set()
         for ems_name in self.managed_provider_names:
-            for prov in prov_cruds:
-                # Name check is authoritative and the only proper way to recognize a known provider
-                if ems_name == prov.name:
-                    found_cruds.add(prov)
-                    break
+            if ems_name in cruds_by_name:
+                found_cruds.add(cruds_by_name[ems_name])
             else:
                 unrecognized_ems_names.add(ems_name)
         if unrecognized_ems_names:
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import json
 import time
+from collections import deque
 from inspect import isclass
 from time import sleep
 
@@ -27,6 +28,11 @@ from . import Implementation
 
 VersionPick.VERSION_CLASS = Version
 
+#: Timings of the navigations not collected yet, dicts with ``destination``, ``method``
+#: (``here``, ``direct`` or ``steps``) and ``duration`` in seconds, the run history plugin
+#: collects them after every test
+navigation_timings = deque(maxlen=10000)
+
 
 class ErrorView(View):
     title = Text("//body/h1")
@@ -259,6 +265,10 @@ def can_skip_badness_test(fn):
 
 class CFMENavigateStep(NavigateStep):
     VIEW = None
+    #: Path of the destination relative to the appliance URL, formatted with ``obj``, e.g.
+    #: ``'ems_infra/{obj.id}'``. If set, the navigation loads it directly and walks the
+    #: prerequisites only if the destination isn't displayed then, see :py:meth:`jump`.
+    URL = None
 
     @cached_property
     def view(self):
@@ -279,6 +289,38 @@ class CFMENavigateStep(NavigateStep):
         except (AttributeError, NoSuchElementException):
             return False
 
+    def direct_url(self, *args, **kwargs):
+        """Returns the URL of the destination built from :py:attr:`URL`, or ``None``"""
+        if self.URL is None:
+            return None
+        try:
+            path = self.URL.format(obj=self.obj)
+        except Exception as e:
+            self.log_message("Could not build the URL [{}]: {}".format(self.URL, e), level="warn")
+            return None
+        return "{}/{}".format(self.appliance.url.rstrip("/"), path.lstrip("/"))
+
+    def jump(self, *args, **kwargs):
+        """Loads the :py:meth:`direct_url` and checks the destination is displayed
+
+        Returns:
+            ``True`` if the destination is displayed, ``False`` if the prerequisites and the step
+            have to be used
+        """
+        url = self.direct_url(*args, **kwargs)
+        if url is None:
+            return False
+        self.log_message("Jumping to {}".format(url))
+        try:
+            self.appliance.browser.widgetastic.url = url
+            if self.VIEW is not None:
+                self.view.flush_widget_cache()
+            return self.am_i_here()
+        except Exception as e:
+            self.log_message(
+                "Exception raised [{}] whilst jumping to {}".format(e, url), level="warn")
+            return False
+
     def pre_badness_check(self, _tries, *args, **go_kwargs):
         # check for MiqQE javascript patch on first try and patch the appliance if necessary
         if self.appliance.is_miqqe_patch_candidate and not self.appliance.miqqe_patch_applied:
@@ -501,8 +543,22 @@ class CFMENavigateStep(NavigateStep):
         str_msg = "[UI-NAV/{}/{}]: {}".format(class_name, self._name, msg)
         getattr(logger, level)(str_msg)
 
-    def construct_message(self, here, resetter, view, duration, waited):
-        str_here = "Already Here" if here else "Needed Navigation"
+    def record_timing(self, method, duration):
+        """Stores the duration of the navigation in :py:data:`navigation_timings`"""
+        class_name = self.obj.__name__ if isclass(self.obj) else self.obj.__class__.__name__
+        navigation_timings.append({
+            'destination': "{}.{}".format(class_name, self._name),
+            'method': method,
+            'duration': duration,
+        })
+
+    def construct_message(self, here, resetter, view, duration, waited, jumped=False):
+        if here:
+            str_here = "Already Here"
+        elif jumped:
+            str_here = "Jumped Directly"
+        else:
+            str_here = "Needed Navigation"
         str_resetter = "Resetter Used" if resetter else "No Resetter"
         str_view = "View Returned" if view else "No View Available"
         str_waited = "Waited on View" if waited else "No Wait on View"
@@ -537,7 +593,10 @@ class CFMENavigateStep(NavigateStep):
         except Exception as e:
             self.log_message(
                 "Exception raised [{}] whilst checking if already here".format(e), level="error")
+        jumped = False
         if not here:
+            jumped = self.jump(*args, **kwargs)
+        if not here and not jumped:
             self.log_message("Prerequisite Needed")
             self.prerequisite_view = self.prerequisite()
             try:
@@ -563,8 +622,16 @@ class CFMENavigateStep(NavigateStep):
                 message="Waiting for view [{}] to display".format(view.__class__.__name__)
             )
         self.log_message(
-            self.construct_message(here, resetter_used, view, duration, waited), level="info"
+            self.construct_message(here, resetter_used, view, duration, waited, jumped),
+            level="info"
         )
+        if here:
+            method = "here"
+        elif jumped:
+            method = "direct"
+        else:
+            method = "steps"
+        self.record_timing(method, time.time() - start_time)
         return view
 
 
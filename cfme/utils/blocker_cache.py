@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of the blocker data fetched from Bugzilla, GitHub and JIRA
+
+The data is kept in a single pickle file for :py:attr:`BlockerCache.ttl` seconds, so the master
+and the slaves of a test run, and the runs following it, resolve the same blockers without
+asking the trackers again. The blockers referenced by the collected tests are fetched in batches
+at collection time, see :py:meth:`cfme.utils.blockers.Blocker.prefetch`.
+
+Keys are strings prefixed with the engine, like ``BZ#123456`` or ``JIRA#FOO-42``.
+"""
+import os
+import time
+
+from six.moves import cPickle as pickle
+
+from cfme.utils.log import logger
+from cfme.utils.path import log_path
+
+#: Default file the cache is stored in
+DEFAULT_PATH = log_path.join('blocker_cache.pickle').strpath
+
+#: Default number of seconds the cached data are valid for
+DEFAULT_TTL = 3600
+
+
+class BlockerCache(object):
+    """Blocker data persisted on disk for ``ttl`` seconds
+
+    Args:
+        path: file the data are stored in
+        ttl: seconds the data are valid for, ``0`` disables the cache
+    """
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._data = None  # key: (timestamp, value)
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, 'rb') as f:
+                    self._data = pickle.load(f)
+            except (IOError, OSError):
+                self._data = {}
+            except Exception:
+                logger.exception('Blocker cache %s is corrupted, ignoring it', self.path)
+                self._data = {}
+        return self._data
+
+    def get(self, key, default=None):
+        """Returns the value of the key, or ``default`` if it isn't cached or is too old"""
+        if not self.ttl:
+            return default
+        entry = self._load().get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return default
+        return entry[1]
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def update(self, values):
+        """Stores the values of a dict, together with what other processes stored meanwhile"""
+        if not self.ttl or not values:
+            return
+        # reload, to keep the data other processes stored since this one loaded the file
+        self._data = None
+        now = time.time()
+        data = {key: entry for key, entry in self._load().items() if now - entry[0] <= self.ttl}
+        data.update((key, (now, value)) for key, value in values.items())
+        self._data = data
+        tmp_path = '{}.{}'.format(self.path, os.getpid())
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, 2)
+            # atomic, readers never see a partially written file
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            logger.exception('Could not write blocker cache %s', self.path)
+
+    def clear(self):
+        """Forgets all the data, in memory and on disk"""
+        self._data = {}
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+#: The cache used by :py:mod:`cfme.utils.bz` and :py:mod:`cfme.utils.blockers`
+blocker_cache = BlockerCache()
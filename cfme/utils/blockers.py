@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 import re
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+
 import six
 import six.moves.xmlrpc_client
 from github import Github
@@ -7,9 +10,15 @@ from six.moves.urllib.parse import urlparse
 
 from cfme.fixtures.pytest_store import store
 from cfme.utils import classproperty, conf, version
+from cfme.utils.blocker_cache import blocker_cache
 from cfme.utils.bz import Bugzilla
 from cfme.utils.log import logger
 
+# Number of GitHub issues fetched concurrently, there is no API to get several at once
+GH_FETCH_THREADS = 8
+# Number of JIRA issues searched for at once
+JIRA_SEARCH_SIZE = 100
+
 
 class Blocker(object):
     """Base class for all blockers
@@ -67,6 +76,34 @@ class Blocker(object):
         else:
             raise ValueError("Wrong specification of the blockers!")
 
+    @classmethod
+    def prefetch(cls, blockers):
+        """Fetches the data of many blockers at once, engine by engine, into the blocker cache.
+
+        Evaluating :py:attr:`blocks` of those blockers is then a local lookup. Engines implement
+        :py:meth:`prefetch_engine`.
+
+        Args:
+            blockers: blocker objects or anything :py:meth:`parse` accepts, ints being BZs
+        """
+        by_engine = defaultdict(list)
+        for blocker in blockers:
+            if isinstance(blocker, int):
+                blocker = BZ(blocker)
+            elif not isinstance(blocker, Blocker):
+                blocker = cls.parse(blocker)
+            by_engine[type(blocker)].append(blocker)
+        for engine_class, engine_blockers in by_engine.items():
+            try:
+                engine_class.prefetch_engine(engine_blockers)
+            except Exception:
+                logger.exception('Prefetching %s blockers failed', engine_class.__name__)
+
+    @classmethod
+    def prefetch_engine(cls, blockers):
+        """Fetches the data of the blockers of this engine at once, nothing by default"""
+        pass
+
 
 class GH(Blocker):
     DEFAULT_REPOSITORY = conf.env.get("github", {}).get("default_repo")
@@ -120,11 +157,37 @@ class GH(Blocker):
             self._issue_cache[identifier] = self.github.get_repo(self.repo).get_issue(self.issue)
         return self._issue_cache[identifier]
 
+    @property
+    def cache_key(self):
+        return "GH#{}:{}".format(self.repo, self.issue)
+
+    @property
+    def state(self):
+        """State of the issue, from the blocker cache if possible"""
+        state = blocker_cache.get(self.cache_key)
+        if state is None:
+            state = self.data.state
+            blocker_cache.update({self.cache_key: state})
+        return state
+
+    @classmethod
+    def prefetch_engine(cls, blockers):
+        missing = {blocker.cache_key: blocker for blocker in blockers
+                   if blocker.cache_key not in blocker_cache}
+        if not missing:
+            return
+        pool = ThreadPool(min(GH_FETCH_THREADS, len(missing)))
+        try:
+            states = pool.map(lambda blocker: blocker.data.state, missing.values())
+        finally:
+            pool.close()
+        blocker_cache.update(dict(zip(missing.keys(), states)))
+
     @property
     def blocks(self):
         if self.upstream_only and version.appliance_is_downstream():
             return False
-        if self.data.state == "closed":
+        if self.state == "closed":
             return False
         # Now let's check versions
         if self.since is None and self.until is None:
@@ -173,6 +236,12 @@ class BZ(Blocker):
         return self.bugzilla.resolve_blocker(
             self.bug_id, ignore_bugs=self.ignore_bugs, force_block_streams=self.forced_streams)
 
+    @classmethod
+    def prefetch_engine(cls, blockers):
+        if cls.bugzilla is None:
+            return
+        cls.bugzilla.prefetch_variants(blocker.bug_id for blocker in blockers)
+
     @property
     def bugzilla_bug(self):
         if self.data is None:
@@ -231,6 +300,44 @@ class JIRA(Blocker):
         super(JIRA, self).__init__(**kwargs)
         self.jira_id = jira_id
 
+    @property
+    def cache_key(self):
+        return "JIRA#{}".format(self.jira_id)
+
+    @classmethod
+    def prefetch_engine(cls, blockers):
+        jira = cls.jira
+        if jira is None:
+            return
+        missing = sorted({blocker.jira_id for blocker in blockers
+                          if blocker.cache_key not in blocker_cache})
+        statuses = {}
+        for i in range(0, len(missing), JIRA_SEARCH_SIZE):
+            cls._search_statuses(jira, missing[i:i + JIRA_SEARCH_SIZE], statuses)
+        blocker_cache.update(statuses)
+
+    @classmethod
+    def _search_statuses(cls, jira, keys, statuses):
+        """Adds the statuses of the issues to ``statuses``, skipping the keys which don't exist
+
+        JIRA rejects the whole search if any of the keys doesn't exist, so a failed batch is split
+        in halves until the bad keys are alone.
+        """
+        from jira.exceptions import JIRAError
+        try:
+            issues = jira.search_issues('key in ({})'.format(', '.join(keys)),
+                                        fields='status', maxResults=len(keys))
+        except JIRAError as e:
+            if len(keys) == 1:
+                logger.warning('Could not prefetch JIRA issue %s: %s', keys[0], e.text)
+                return
+            half = len(keys) // 2
+            cls._search_statuses(jira, keys[:half], statuses)
+            cls._search_statuses(jira, keys[half:], statuses)
+            return
+        for issue in issues:
+            statuses["JIRA#{}".format(issue.key)] = issue.fields.status.name
+
     @property
     def url(self):
         try:
@@ -245,8 +352,11 @@ class JIRA(Blocker):
         if jira is None:
             # JIRA unspecified, shut up and don't block
             return False
-        issue = jira.issue(self.jira_id, fields='status')
-        return issue.fields.status.name.lower() != 'done'
+        status = blocker_cache.get(self.cache_key)
+        if status is None:
+            status = jira.issue(self.jira_id, fields='status').fields.status.name
+            blocker_cache.update({self.cache_key: status})
+        return status.lower() != 'done'
 
     def __str__(self):
         return 'Jira card {}'.format(self.url)
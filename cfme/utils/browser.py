@@ -177,6 +177,10 @@ class BrowserFactory(object):
             browser.quit()
             clear_property_cache(self, '_firefox_profile')
 
+    def spawn(self):
+        """Returns a factory with the same configuration, for a browser running alongside"""
+        return type(self)(self.webdriver_class, dict(self.browser_kwargs))
+
 
 class WharfFactory(BrowserFactory):
     def __init__(self, webdriver_class, browser_kwargs, wharf):
@@ -232,12 +236,25 @@ class WharfFactory(BrowserFactory):
         finally:
             self.wharf.checkin()
 
+    def spawn(self):
+        # every browser needs its own container
+        wharf = Wharf(self.wharf.wharf_url)
+        atexit.register(wharf.checkin)
+        return type(self)(self.webdriver_class, dict(self.browser_kwargs), wharf)
+
 
 class BrowserManager(object):
     def __init__(self, browser_factory):
         self.factory = browser_factory
         self.browser = None
         self._browser_renew_thread = None
+        # spare browsers started in the background, see keep_spares
+        self.spares_count = 0
+        self.spares_url_key = None
+        self.spares_prepare = None
+        self._spares = []  # (factory, browser)
+        self._spares_lock = threading.Lock()
+        self._spares_thread = None
 
     def coerce_url_key(self, key):
         return key or store.current_appliance.url  # TODO: don't rely on store.current_appliance
@@ -337,9 +354,103 @@ class BrowserManager(object):
         log.info('starting browser for %r', url_key)
         assert self.browser is None
 
+        spare = self._take_spare(url_key)
+        if spare is not None:
+            log.info('using a spare browser for %r', url_key)
+            self.factory, self.browser = spare
+            return self.browser
         self.browser = self.factory.create(url_key=url_key)
         return self.browser
 
+    def keep_spares(self, count, url_key=None, prepare=None):
+        """Keeps spare browsers open in the background, handed out when a browser gets started
+
+        The spares are started by a background thread and replenished whenever one is taken, so
+        starting a browser costs nearly nothing as long as there is a spare ready.
+
+        Args:
+            count: Number of the spare browsers, ``0`` closes them
+            url_key: URL the spare browsers are opened at
+            prepare: Callable getting the selenium browser of every spare once it is open,
+                e.g. to log in
+        """
+        url_key = self.coerce_url_key(url_key)
+        with self._spares_lock:
+            if url_key != self.spares_url_key:
+                stale, self._spares = self._spares, []
+            else:
+                stale, self._spares = self._spares[count:], self._spares[:count]
+            self.spares_count = count
+            self.spares_url_key = url_key
+            self.spares_prepare = prepare
+        for factory, browser in stale:
+            self._close_spare(factory, browser)
+        self._replenish_spares()
+
+    def close_spares(self):
+        """Closes all the spare browsers and stops starting new ones"""
+        with self._spares_lock:
+            self.spares_count = 0
+            stale, self._spares = self._spares, []
+        for factory, browser in stale:
+            self._close_spare(factory, browser)
+
+    def _close_spare(self, factory, browser):
+        try:
+            factory.close(browser)
+        except Exception:
+            log.exception('An exception happened during spare browser shutdown')
+
+    def _take_spare(self, url_key):
+        with self._spares_lock:
+            if url_key != self.spares_url_key or not self._spares:
+                return None
+            factory, browser = self._spares.pop(0)
+        self._replenish_spares()
+        try:
+            browser.current_url
+        except UnexpectedAlertPresentException:
+            pass
+        except Exception:
+            log.exception('spare browser in unknown state, considering dead')
+            self._close_spare(factory, browser)
+            return None
+        return factory, browser
+
+    def _replenish_spares(self):
+        with self._spares_lock:
+            if len(self._spares) >= self.spares_count:
+                return
+            if self._spares_thread is not None and self._spares_thread.is_alive():
+                return
+            self._spares_thread = threading.Thread(target=self._spares_function)
+            self._spares_thread.daemon = True
+            self._spares_thread.start()
+
+    def _spares_function(self):
+        while True:
+            with self._spares_lock:
+                if len(self._spares) >= self.spares_count:
+                    return
+                url_key, prepare = self.spares_url_key, self.spares_prepare
+            log.info('starting spare browser for %r', url_key)
+            factory = self.factory.spawn()
+            browser = None
+            try:
+                browser = factory.create(url_key=url_key)
+                if prepare is not None:
+                    prepare(browser)
+            except Exception:
+                log.exception('Could not start a spare browser for %r', url_key)
+                self._close_spare(factory, browser)
+                return
+            with self._spares_lock:
+                if url_key == self.spares_url_key and len(self._spares) < self.spares_count:
+                    self._spares.append((factory, browser))
+                    continue
+            # not needed anymore meanwhile
+            self._close_spare(factory, browser)
+
 
 class WithZoom(object):
     """
@@ -454,3 +565,4 @@ def take_screenshot():
 
 
 atexit.register(manager.quit)
+atexit.register(manager.close_spares)
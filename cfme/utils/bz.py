@@ -4,15 +4,20 @@ from collections import Sequence
 
 import six
 from bugzilla import Bugzilla as _Bugzilla
+from bugzilla.bug import Bug as _Bug
 from miq_version import Version, LATEST
 
 from cached_property import cached_property
+from cfme.utils.blocker_cache import blocker_cache
 from cfme.utils.conf import credentials, env
 from cfme.utils.log import logger
 from cfme.utils.version import current_version, appliance_build_datetime, appliance_is_downstream
 
 NONE_FIELDS = {"---", "undefined", "unspecified"}
 
+# Number of bugs fetched by a single getbugs call
+GETBUGS_BATCH_SIZE = 200
+
 
 class Product(object):
     def __init__(self, data):
@@ -70,7 +75,12 @@ class Bugzilla(object):
 
     def product(self, product):
         if product not in self.__product_cache:
-            self.__product_cache[product] = self.products(product)[0]
+            key = "BZ-product#{}".format(product)
+            data = blocker_cache.get(key)
+            if data is None:
+                data = self.bugzilla._proxy.Product.get({"names": [product]})["products"][0]
+                blocker_cache.update({key: data})
+            self.__product_cache[product] = Product(data)
         return self.__product_cache[product]
 
     @property
@@ -99,6 +109,17 @@ class Bugzilla(object):
     def bugzilla(self):
         return _Bugzilla(**self.__kwargs)
 
+    @cached_property
+    def _offline_bugzilla(self):
+        # bugs restored from the blocker cache only need it for the attribute aliases
+        return _Bugzilla(url=None, cookiefile=None, tokenfile=None)
+
+    def _wrap_cached(self, id):
+        data = blocker_cache.get("BZ#{}".format(id))
+        if data is None:
+            return None
+        return BugWrapper(self, _Bug(self._offline_bugzilla, dict=data))
+
     @cached_property
     def loose(self):
         return self.__config_options.get("loose", [])
@@ -117,9 +138,63 @@ class Bugzilla(object):
     def get_bug(self, id):
         id = int(id)
         if id not in self.__bug_cache:
-            self.__bug_cache[id] = BugWrapper(self, self.bugzilla.getbug(id))
+            bug = self._wrap_cached(id)
+            if bug is None:
+                bug = BugWrapper(self, self.bugzilla.getbug(id))
+                blocker_cache.update({"BZ#{}".format(id): bug.get_raw_data()})
+            self.__bug_cache[id] = bug
         return self.__bug_cache[id]
 
+    def get_bugs(self, ids):
+        """Returns the bugs, fetching those which aren't cached with batched getbugs calls.
+
+        Bugs which don't exist or are not accessible are left out.
+        """
+        ids = sorted({int(id) for id in ids})
+        missing = []
+        for id in ids:
+            if id not in self.__bug_cache:
+                bug = self._wrap_cached(id)
+                if bug is None:
+                    missing.append(id)
+                else:
+                    self.__bug_cache[id] = bug
+        fetched = {}
+        for i in range(0, len(missing), GETBUGS_BATCH_SIZE):
+            for bug in self.bugzilla.getbugs(missing[i:i + GETBUGS_BATCH_SIZE]):
+                if bug is not None:
+                    self.__bug_cache[bug.id] = BugWrapper(self, bug)
+                    fetched["BZ#{}".format(bug.id)] = bug.get_raw_data()
+        blocker_cache.update(fetched)
+        return [self.__bug_cache[id] for id in ids if id in self.__bug_cache]
+
+    def prefetch_variants(self, ids):
+        """Fetches the bugs and all the bugs :py:meth:`get_bug_variants` looks at for them.
+
+        The bugs are fetched level by level with :py:meth:`get_bugs`, instead of one by one
+        as :py:meth:`get_bug_variants` walks them.
+        """
+        expanded = set()
+        # id: id of the bug blocked by it, if it is only a candidate copy of that bug
+        pending = {int(id): None for id in ids}
+        while pending:
+            self.get_bugs(pending)
+            next_pending = {}
+            for id, blocked in pending.items():
+                bug = self.__bug_cache.get(id)
+                if bug is None or (blocked is not None and bug.copy_of != blocked):
+                    continue
+                expanded.add(id)
+                related = [bug.copy_of]
+                if bug.status == "CLOSED" and bug.resolution == "DUPLICATE":
+                    related.append(bug.dupe_of)
+                for related_id in related:
+                    if related_id:
+                        next_pending[int(related_id)] = None
+                for blocked_id in bug.blocks or []:
+                    next_pending.setdefault(int(blocked_id), id)
+            pending = {id: blocked for id, blocked in next_pending.items() if id not in expanded}
+
     def get_bug_variants(self, id):
         if isinstance(id, BugWrapper):
             bug = id
@@ -340,7 +415,8 @@ class BugWrapper(object):
         # With these states, the change is in upstream
         if self.status not in {"POST", "MODIFIED", "ON_QA", "VERIFIED", "RELEASE_PENDING"}:
             return False
-        history = self.get_history_raw()["bugs"][0]["history"]
+        # the bug may come from the blocker cache, so ask the live connection
+        history = self._bugzilla.bugzilla.bugs_history_raw([self.id])["bugs"][0]["history"]
         changes = []
         # We look for status changes in the history
         for event in history:
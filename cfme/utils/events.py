@@ -4,6 +4,7 @@
 
 """
 
+from itertools import product
 from time import sleep
 from threading import Thread, Event as ThreadEvent
 
@@ -70,31 +71,43 @@ class Event(object):
                             self.event_attrs.values()])
         return "BaseEvent({})".format(params)
 
-    def process_id(self):
-        """ Resolves target_id by target_type and target name."""
-        if 'target_name' in self.event_attrs and 'target_id' not in self.event_attrs:
-            try:
-                target_type = self.event_attrs['target_type'].value
-                target_name = self.event_attrs['target_name'].value
+    def process_id(self, cache=None):
+        """ Resolves target_id by target_type and target name.
 
-                # Target type should be present in TARGET_TYPES
-                if target_type not in self.TARGET_TYPES:
-                    raise TypeError(
-                        'Type {} is not specified in the TARGET_TYPES.'.format(target_type))
-
-                target_rest = self.TARGET_TYPES[target_type]
-                target_collection = getattr(self._appliance.rest_api.collections, target_rest)
-                o = target_collection.filter(Q('name', '=', target_name))
+        Args:
+            cache: optional dict of already resolved ``(target_type, target_name): target_id``,
+                   it is updated with the resolved target_id
 
-                if not o.resources:
-                    raise ValueError('{} with name {} not found.'.format(target_type, target_name))
+        Returns:
+            ``True`` if the event has a target_id or doesn't need one, ``False`` if the target
+            isn't found yet
+        """
+        if 'target_name' not in self.event_attrs or 'target_id' in self.event_attrs:
+            return True
+        target_type = self.event_attrs['target_type'].value
+        target_name = self.event_attrs['target_name'].value
+        if cache is not None and (target_type, target_name) in cache:
+            target_id = cache[(target_type, target_name)]
+        else:
+            # Target type should be present in TARGET_TYPES
+            if target_type not in self.TARGET_TYPES:
+                raise TypeError(
+                    'Type {} is not specified in the TARGET_TYPES.'.format(target_type))
 
-                # Set target_id if target object was found
-                self.event_attrs['target_id'] = EventAttr(**{'target_id': o[0].id})
+            target_rest = self.TARGET_TYPES[target_type]
+            target_collection = getattr(self._appliance.rest_api.collections, target_rest)
+            o = target_collection.filter(Q('name', '=', target_name))
 
-            except ValueError:
+            if not o.resources:
                 # Target isn't added yet. Need to wait
-                sleep(1)
+                return False
+            target_id = o[0].id
+            if cache is not None:
+                cache[(target_type, target_name)] = target_id
+
+        # Set target_id if target object was found
+        self.event_attrs['target_id'] = EventAttr(**{'target_id': target_id})
+        return True
 
     def matches(self, evt):
         """ Compares common attributes of expected event and passed event."""
@@ -113,24 +126,105 @@ class Event(object):
 
     def build_from_entity(self, event_entity):
         """ Builds Event object from event Entity"""
-        for key, value in event_entity['_data'].items():
+        return self.build_from_data(event_entity['_data'])
+
+    def build_from_data(self, event_data):
+        """ Builds Event object from event record dict"""
+        for key, value in event_data.items():
             self.add_attrs(EventAttr(**{key: value}))
         return self
 
 
-class RestEventListener(Thread):
+class EventIndexMixin(object):
+    """ Dispatches the got events to the expected events through an index on :py:attr:`INDEX_ATTRS`
+
+    Used by the event listeners, which keep the expected events in ``_events_to_listen``, the
+    resolved target ids in ``_target_ids`` and the index in ``_index``, and implement
+    :py:meth:`_event_target_type` and :py:meth:`_resolve_target`.
+
+    :var INDEX_ATTRS: Attributes the expected events are indexed by
+    """
+    INDEX_ATTRS = ('target_type', 'target_id', 'event_type')
+
+    def _event_target_type(self, event):
+        """ Returns the target type of a got event record."""
+        raise NotImplementedError
+
+    def _resolve_target(self, evt):
+        """ Resolves target_id of an expected event, returns whether it was found."""
+        raise NotImplementedError
+
+    def _is_indexed(self, evt):
+        """ Returns whether an expected event can match anything yet."""
+        return True
+
+    def resolve_targets(self, events):
+        """ Resolves target ids of the expected events targeting the types of passed events.
+
+        Resolved ids are cached, so every target is looked up only until it is found.
+        """
+        target_types = {self._event_target_type(event) for event in events}
+        for exp_event in list(self._events_to_listen):
+            evt = exp_event['event']
+            target_type = evt.event_attrs.get('target_type')
+            if ('target_name' not in evt.event_attrs or 'target_id' in evt.event_attrs or
+                    target_type is None or target_type.value not in target_types):
+                continue
+            if self._resolve_target(evt):
+                self._index = None
+
+    def _index_key(self, evt):
+        key = []
+        for name in self.INDEX_ATTRS:
+            attr = evt.event_attrs.get(name)
+            # attributes compared by cmp_func can't be looked up by value, they match any value
+            if attr is None or not attr.value or attr.cmp_func:
+                key.append(None)
+            else:
+                key.append(str(attr.value))
+        return tuple(key)
+
+    def get_index(self):
+        """ Returns dict of expected events by the values of their :py:attr:`INDEX_ATTRS`.
+
+        ``None`` in a key stands for any value.
+        """
+        if self._index is None:
+            index = {}
+            for position, exp_event in enumerate(self._events_to_listen):
+                if not self._is_indexed(exp_event['event']):
+                    continue
+                key = self._index_key(exp_event['event'])
+                index.setdefault(key, []).append((position, exp_event))
+            self._index = index
+        return self._index
+
+    def get_candidates(self, index, got_event):
+        """ Returns expected events which may match got event, in the order they were added."""
+        values = [(value, None) if value is not None else (None,)
+                  for value in self._index_key(got_event)]
+        candidates = []
+        for key in product(*values):
+            candidates.extend(index.get(key, []))
+        return [exp_event for _, exp_event in sorted(candidates, key=lambda c: c[0])]
+
+
+class RestEventListener(EventIndexMixin, Thread):
     """ EventListener accepts "expected" events, listens to db events and compares matched events
     with expected events. Runs callback function if expected events have it.
 
-    :var FILTER_ATTRS: List of filters used in REST API call
+    Every second all the new ``event_streams`` records are fetched with a single query and are
+    dispatched to the expected events through an index, see :py:class:`EventIndexMixin`, so the
+    number of REST calls doesn't grow with the number of expected events.
     """
-    FILTER_ATTRS = ['event_type', 'target_type', 'target_id', 'source']
 
     def __init__(self, appliance):
         super(RestEventListener, self).__init__()
         self._appliance = appliance
         self._events_to_listen = []
         self._last_processed_id = 0  # this is used to filter out old or processed events
+        self._target_ids = {}  # resolved (target_type, target_name): target_id
+        self._index = None  # built on demand, reset when the expected events change
         self._stop_event = ThreadEvent()
 
         self.event_streams = appliance.rest_api.collections.event_streams
@@ -186,9 +280,10 @@ class RestEventListener(Thread):
                 logger.info("event {} is added to listening queue.".format(evt))
             else:
                 raise ValueError("one of events doesn't belong to Event class")
+        self._index = None
 
     def start(self):
-        self._last_processed_id = self.get_max_record_id()
+        self._last_processed_id = self.get_max_record_id() or 0
         self._stop_event.clear()
         super(RestEventListener, self).start()
         logger.info('Event Listener has been started')
@@ -212,56 +307,49 @@ class RestEventListener(Thread):
         """
         while not self._stop_event.is_set():
             sleep(1)
-            cur_last_record_id = self.get_max_record_id()
-            if not cur_last_record_id:
+            events = self.get_new_events()
+            if not events:
                 continue
 
-            for exp_event in self._events_to_listen:
-
-                # Skip if event has occurred
-                if exp_event['first_event'] and len(exp_event['matched_events']):
-                    continue
-
-                matched_events = self.get_next_portion(exp_event['event'], cur_last_record_id)
-
-                if not matched_events:
-                    continue
-
-                # Match events
-                try:
-                    for event_entity in matched_events:
-                            got_event = Event(self._appliance).build_from_entity(event_entity)
-                            if exp_event['event'].matches(got_event):
-                                if exp_event['callback']:
-                                    exp_event['callback'](exp_event=exp_event['event'],
-                                                          got_event=got_event)
-                                exp_event['matched_events'].append(got_event)
-                except Exception:
-                    logger.exception("An exception during matching events occurred.")
+            self.resolve_targets(events)
+            index = self.get_index()
+            for event_data in events:
+                got_event = Event(self._appliance).build_from_data(event_data)
+                for exp_event in self.get_candidates(index, got_event):
+
+                    # Skip if event has occurred
+                    if exp_event['first_event'] and len(exp_event['matched_events']):
+                        continue
+
+                    # Match events
+                    try:
+                        if exp_event['event'].matches(got_event):
+                            if exp_event['callback']:
+                                exp_event['callback'](exp_event=exp_event['event'],
+                                                      got_event=got_event)
+                            exp_event['matched_events'].append(got_event)
+                    except Exception:
+                        logger.exception("An exception during matching events occurred.")
 
                 if self._stop_event.is_set():
                     break
-            self._last_processed_id = cur_last_record_id
-
-    def get_next_portion(self, evt, max_id=None):
-        """ Returns list with one or more events matched with expected event.
 
-        Returns None if there is no matched events."""
-        evt.process_id()
+    def get_new_events(self):
+        """ Returns the records of all the events newer than the last processed one.
 
-        q = Q('id', '>', self._last_processed_id)  # ensure we get only new events
-        if max_id:
-            q &= Q('id', '<=', max_id)
+        The records are fetched expanded and in pages, with as few REST calls as possible.
+        """
+        events = self._appliance.rest_api.bulk_query(
+            'event_streams', filters=Q('id', '>', self._last_processed_id))
+        if events:
+            self._last_processed_id = max(int(event['id']) for event in events)
+        return events
 
-        used_filters = set(self.FILTER_ATTRS).intersection(set(evt.event_attrs))
-        for filter_attr in used_filters:
-            evt_attr = evt.event_attrs[filter_attr]
-            if evt_attr.value:
-                q &= Q(filter_attr, '=', evt_attr.value)
-        result = self.event_streams.filter(q)
+    def _event_target_type(self, event):
+        return event.get('target_type')
 
-        if len(result):
-            return result
+    def _resolve_target(self, evt):
+        return evt.process_id(cache=self._target_ids)
 
     @property
     def got_events(self):
@@ -272,6 +360,7 @@ class RestEventListener(Thread):
 
     def reset_events(self):
         self._events_to_listen = []
+        self._index = None
 
     def check_expected_events(self):
         """ Checks that all expected events has arrived."""
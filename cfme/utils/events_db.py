@@ -8,10 +8,12 @@ from contextlib import contextmanager
 from collections import Iterable
 from datetime import datetime
 from numbers import Number
+from select import select
 from sqlalchemy.sql.expression import func
 from time import sleep
 from threading import Thread, Event as ThreadEvent
 
+from cfme.utils.events import EventIndexMixin
 from cfme.utils.log import create_sublogger
 
 logger = create_sublogger('events')
@@ -20,6 +22,7 @@ logger = create_sublogger('events')
 class EventTool(object):
     """EventTool serves as a wrapper to getting the events from the database.
     :var OBJECT_TABLE: Mapping of object types to tables and column names.
+    :var NOTIFY_CHANNEL: Channel notified by the trigger on ``event_streams`` inserts.
     """
     OBJECT_TABLE = {
         # target_type: (table_name, name_column, id_column)
@@ -27,6 +30,22 @@ class EventTool(object):
         'Host': ('hosts', 'name', 'id'),
         'Service': ('services', 'name', 'id'),
     }
+    NOTIFY_CHANNEL = 'cfme_event_streams'
+    NOTIFY_TRIGGER_SQL = """
+        CREATE OR REPLACE FUNCTION {channel}_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{channel}', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS {channel}_notify ON event_streams;
+        CREATE TRIGGER {channel}_notify AFTER INSERT ON event_streams
+            FOR EACH STATEMENT EXECUTE PROCEDURE {channel}_notify();
+    """
+    NOTIFY_UNINSTALL_SQL = """
+        DROP TRIGGER IF EXISTS {channel}_notify ON event_streams;
+        DROP FUNCTION IF EXISTS {channel}_notify();
+    """
 
     def __init__(self, appliance):
         self.appliance = appliance
@@ -49,6 +68,12 @@ class EventTool(object):
                        if tbl.name == 'event_streams'][-1]
         return [(cl.name, cl.type.python_type) for cl in event_table.c.values()]
 
+    @cached_property
+    def default_attrs(self):
+        """``event_streams`` columns as :py:class:`EventAttr` without value, shared by events"""
+        return {attr_name: EventAttr(**{attr_name: None, 'attr_type': attr_type})
+                for attr_name, attr_type in self.event_streams_attributes}
+
     def query(self, *args, **kwargs):
         """Wrapper for the SQLAlchemy query method."""
         return self.appliance.db.client.session.query(*args, **kwargs)
@@ -127,6 +152,40 @@ class EventTool(object):
                 'event_type': event.event_type})
         return results
 
+    def install_notify_trigger(self):
+        """Installs a trigger notifying :py:attr:`NOTIFY_CHANNEL` when events are inserted.
+
+        Replaces the trigger if it exists already, so it is safe to call it repeatedly.
+        """
+        with self.appliance.db.client.engine.begin() as connection:
+            connection.execute(self.NOTIFY_TRIGGER_SQL.format(channel=self.NOTIFY_CHANNEL))
+
+    def uninstall_notify_trigger(self):
+        """Drops the trigger and the function installed by :py:meth:`install_notify_trigger`."""
+        with self.appliance.db.client.engine.begin() as connection:
+            connection.execute(self.NOTIFY_UNINSTALL_SQL.format(channel=self.NOTIFY_CHANNEL))
+
+    def notifications_connection(self):
+        """Returns a new DBAPI connection listening to :py:attr:`NOTIFY_CHANNEL`.
+
+        The connection is detached from the pool and in autocommit mode, so that the
+        notifications are delivered as soon as they are sent. Close it when done.
+        """
+        connection = self.appliance.db.client.engine.raw_connection()
+        connection.detach()
+        # the pool pings the connection on checkout, which opens a transaction
+        connection.connection.rollback()
+        connection.connection.autocommit = True
+        cursor = connection.cursor()
+        cursor.execute('LISTEN {}'.format(self.NOTIFY_CHANNEL))
+        cursor.close()
+        return connection
+
+    def send_notification(self):
+        """Notifies :py:attr:`NOTIFY_CHANNEL`, waking up all the listeners."""
+        with self.appliance.db.client.engine.begin() as connection:
+            connection.execute('NOTIFY {}'.format(self.NOTIFY_CHANNEL))
+
     @contextmanager
     def ensure_event_happens(self, target_type, target_id, event_type):
         """Context manager usable for one-off checking of the events.
@@ -187,7 +246,7 @@ class Event(object):
     def __init__(self, event_tool, *args):
         self._tool = event_tool
         # filling obtaining default attributes and their types
-        self._default_attrs = {}  # EventAttr obj
+        self._default_attrs = None  # EventAttr obj
         self._populate_defaults()
 
         # container for event attributes
@@ -205,8 +264,8 @@ class Event(object):
         return "BaseEvent({})".format(params)
 
     def _populate_defaults(self):
-        for attr_name, attr_type in self._tool.event_streams_attributes:
-            self._default_attrs[attr_name] = EventAttr(**{attr_name: None, 'attr_type': attr_type})
+        # the defaults are only read, so all events share the ones of the tool
+        self._default_attrs = self._tool.default_attrs
 
     def _parse_raw_event(self, evt):
         for attr in self._default_attrs:
@@ -281,33 +340,51 @@ class Event(object):
         return self
 
 
-class DbEventListener(Thread):
+class DbEventListener(EventIndexMixin, Thread):
     """
      accepts "expected" events, listens to db events and compares showed up events with expected
      events. Runs callback function if expected events have it.
+
+     New events are read in batches of at most ``batch_size`` rows, following the id of the last
+     processed one. Every event is only compared with the expected events indexed under its
+     :py:attr:`INDEX_ATTRS`, see :py:class:`cfme.utils.events.EventIndexMixin`. When idle, the
+     listener either polls every :py:attr:`POLL_INTERVAL` or, with ``notify``, waits for a
+     notification from a trigger installed on ``event_streams``. The trigger is shared by all the
+     listeners of the appliance, so it stays installed unless ``stop`` is asked to drop it.
+
+    :var BATCH_SIZE: Default maximum number of events read at once.
+    :var POLL_INTERVAL: Seconds between queries when there are no new events.
+    :var NOTIFY_TIMEOUT: Seconds between queries when waiting for notifications, in case one
+                         gets lost.
     """
-    def __init__(self, appliance):
+    BATCH_SIZE = 500
+    POLL_INTERVAL = 0.2
+    NOTIFY_TIMEOUT = 5
+
+    def __init__(self, appliance, notify=False, batch_size=BATCH_SIZE):
         super(DbEventListener, self).__init__()
         self._appliance = appliance
         self._tool = EventTool(self._appliance)
+        self.notify = notify
+        self.batch_size = batch_size
 
         self._events_to_listen = []
         # last_id is used to ignore already arrived messages the database
         # When database is "cleared" the id of the last event is placed here. That is then used
         # in queries to prevent events of this id and earlier to get in.
         self._last_processed_id = None
+        self._target_ids = {}  # resolved (target_type, target_name): target_id
+        self._index = None  # built on demand, reset when the expected events change
+        self._notifications = None  # connection listening to the notifications
         self._stop_event = ThreadEvent()
 
     def set_last_record(self, evt=None):
         if evt:
             self._last_processed_id = evt.event_attrs['id'].value
         else:
-            try:
-                self._last_processed_id = self._tool.query(
-                    func.max(self._tool.event_streams.id)).one()
-            except IndexError:
-                # No events yet, so do nothing
-                pass
+            # No events yet means 0
+            self._last_processed_id = self._tool.query(
+                func.max(self._tool.event_streams.id)).scalar() or 0
 
     def new_event(self, *attrs, **kwattrs):
         """
@@ -364,16 +441,30 @@ class DbEventListener(Thread):
                     raise ValueError("one of events doesn't belong to Event class")
         else:
             raise ValueError('incorrect is passed')
+        self._index = None
 
     def start(self):
         logger.info('Event Listener has been started')
         self.set_last_record()
+        if self.notify:
+            self._tool.install_notify_trigger()
         self._stop_event.clear()
         super(DbEventListener, self).start()
 
-    def stop(self):
+    def stop(self, uninstall_trigger=False):
+        """Stops the listener.
+
+        Args:
+            uninstall_trigger: Drop the notify trigger too, only when no other listener of the
+                               appliance uses notifications anymore.
+        """
         logger.info('Event Listener has been stopped')
         self._stop_event.set()
+        if self._notifications is not None:
+            # don't let it wait for the notify timeout
+            self._tool.send_notification()
+        if uninstall_trigger:
+            self._tool.uninstall_notify_trigger()
 
     def run(self):
         self.process_events()
@@ -387,26 +478,67 @@ class DbEventListener(Thread):
         processes all new db events and compares them with expected events.
         processed events are ignored next time
         """
-        while not self._stop_event.is_set():
-            events = self.get_next_portion()
-            if len(events) == 0:
-                sleep(0.2)
-                continue
-            for got_event in events:
-                logger.debug("processing event id {}".format(got_event.id))
-                got_event = Event(event_tool=self._tool).build_from_raw_event(got_event)
-                for exp_event in self._events_to_listen:
-                    if exp_event['first_event'] and len(exp_event['matched_events']) > 0:
-                        continue
-
-                    if exp_event['event'].matches(got_event):
-                        if exp_event['callback']:
-                            exp_event['callback'](exp_event=exp_event['event'], got_event=got_event)
-                        exp_event['matched_events'].append(got_event)
-                self.set_last_record(got_event)
-
-                if self._stop_event.is_set():
-                    break
+        if self.notify:
+            self._notifications = self._tool.notifications_connection()
+        try:
+            while not self._stop_event.is_set():
+                events = self.get_next_portion()
+                if events:
+                    self.resolve_targets(events)
+                    index = self.get_index()
+                for got_event in events:
+                    logger.debug("processing event id {}".format(got_event.id))
+                    got_event = Event(event_tool=self._tool).build_from_raw_event(got_event)
+                    for exp_event in self.get_candidates(index, got_event):
+                        if exp_event['first_event'] and len(exp_event['matched_events']) > 0:
+                            continue
+
+                        if exp_event['event'].matches(got_event):
+                            if exp_event['callback']:
+                                exp_event['callback'](exp_event=exp_event['event'],
+                                                      got_event=got_event)
+                            exp_event['matched_events'].append(got_event)
+                    self.set_last_record(got_event)
+
+                    if self._stop_event.is_set():
+                        break
+                # a full batch means there are likely more events waiting
+                if len(events) < self.batch_size:
+                    self.wait_for_events()
+        finally:
+            if self._notifications is not None:
+                self._notifications.close()
+                self._notifications = None
+
+    def wait_for_events(self):
+        """
+        waits for a notification about new events, or just sleeps when not using notifications
+        """
+        if self._notifications is None:
+            sleep(self.POLL_INTERVAL)
+            return
+        connection = self._notifications.connection
+        if select([connection], [], [], self.NOTIFY_TIMEOUT) != ([], [], []):
+            connection.poll()
+            del connection.notifies[:]
+
+    def _event_target_type(self, event):
+        return event.target_type
+
+    def _resolve_target(self, evt):
+        key = (evt.event_attrs['target_type'].value, evt.event_attrs['target_name'].value)
+        if key not in self._target_ids:
+            try:
+                self._target_ids[key] = self._tool.process_id(*key)
+            except ValueError:
+                # vm or host name isn't added to db yet. need to wait
+                return False
+        evt.event_attrs['target_id'] = EventAttr(**{'target_id': self._target_ids[key]})
+        return True
+
+    def _is_indexed(self, evt):
+        # can't match anything until its target shows up in db
+        return 'target_name' not in evt.event_attrs or 'target_id' in evt.event_attrs
 
     @property
     def got_events(self):
@@ -423,12 +555,16 @@ class DbEventListener(Thread):
 
     def reset_events(self):
         self._events_to_listen = []
+        self._index = None
 
     def get_next_portion(self):
+        """
+        returns at most batch_size events following the last processed one, ordered by id
+        """
         logger.debug("obtaining next portion of events")
         return self._tool.query(self._tool.event_streams)\
             .filter(self._tool.event_streams.id > self._last_processed_id)\
-            .order_by(self._tool.event_streams.id).yield_per(100).all()
+            .order_by(self._tool.event_streams.id).limit(self.batch_size).all()
 
     def check_expected_events(self):
         return all([len(event['matched_events']) for event in self.got_events])
@@ -3,6 +3,7 @@
 appliance.
 """
 import csv
+import multiprocessing
 import subprocess
 from datetime import datetime
 from datetime import timedelta
@@ -44,6 +45,11 @@ miqwkr_id = re.compile(r'with\sID:\s\[([0-9]*)\]')
 # For use with workers exiting, such as authentication failures:
 miqwkr_id_2 = re.compile(r'ID\s\[([0-9]*)\]')
 
+# Lines about worker lifecycles, the same lines evm_to_workers used to grep for:
+evm_worker_filter = re.compile(
+    r'Interrupt|MIQ\([A-Za-z]*\) ID|"evm_worker_(?:uptime_exceeded|memory_exceeded|stop)|'
+    r'Worker exiting\.')
+
 # top regular expressions
 # Cpu(s): 13.7%us,  1.2%sy,  2.1%ni, 80.0%id,  1.7%wa,  0.0%hi,  0.1%si,  1.3%st
 miq_cpu = re.compile(r'Cpu\(s\)\:\s+([0-9\.]*)%us,\s+([0-9\.]*)%sy,\s+([0-9\.]*)%ni,\s+'
@@ -61,87 +67,186 @@ miq_top = re.compile(r'([0-9]+)\s+[0-9]+\s+[A-Za-z0-9]+\s+[0-9]+\s+[0-9\-]+\s+([
 
 
 def evm_to_messages(evm_file, filters):
-    test_start = ''
-    test_end = ''
-    line_count = 0
-    messages = {}
-    msg_cmds = {}
+    """Parse the messages out of an evm.log, see :py:func:`evm_to_messages_and_workers`"""
+    return evm_to_messages_and_workers(evm_file, filters)[0]
 
-    runningtime = time()
-    evmlogfile = open(evm_file, 'r')
-    evm_log_line = evmlogfile.readline()
-    while evm_log_line:
-        line_count += 1
-        evm_log_line = evm_log_line.strip()
 
-        miqmsg_result = miqmsg.search(evm_log_line)
-        if miqmsg_result:
+def evm_to_workers(evm_file):
+    """Parse the worker lifecycles out of an evm.log, see :py:func:`evm_to_messages_and_workers`"""
+    return evm_to_messages_and_workers(evm_file, {})[1]
+
+
+def evm_to_messages_and_workers(evm_file, filters, processes=1):
+    """Parse the queue messages and the worker lifecycles out of an evm.log in a single pass
+
+    Lines are checked for a few substrings first, so only the few lines about the queue or
+    workers go through the more expensive regular expressions. With ``processes`` greater than 1,
+    the file is split into that many chunks, parsed in parallel; the records extracted from each
+    chunk are then replayed in order, so the results are the same as a sequential parse.
+
+    Returns:
+        a tuple of ``(messages, msg_cmds, test_start, test_end, line_count)`` and
+        ``(workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_line_count)``
+    """
+    if processes > 1:
+        file_size = os.path.getsize(evm_file)
+        chunk_size = file_size // processes + 1
+        chunks = [(evm_file, start, min(start + chunk_size, file_size))
+                  for start in range(0, file_size, chunk_size)]
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(_parse_evm_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_parse_evm_chunk((evm_file, 0, None))]
 
-            # Obtains the first timestamp in the log file
-            if test_start == '':
-                ts, pid = get_msg_timestamp_pid(evm_log_line)
-                test_start = ts
+    line_count = sum(chunk_line_count for records, chunk_line_count in results)
+    records = (record for chunk_records, chunk_line_count in results for record in chunk_records)
+    return _replay_evm_records(records, filters, line_count)
 
-            # A message was first put on the queue, this starts its queuing time
-            if (miqmsg_result.group(1) == 'MiqQueue.put'):
 
-                msg_cmd = get_msg_cmd(evm_log_line)
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    messages[msg_id] = MiqMsgStat()
-                    messages[msg_id].msg_id = msg_id
-                    messages[msg_id].msg_id = '\'' + msg_id + '\''
-                    messages[msg_id].msg_cmd = msg_cmd
-                    messages[msg_id].pid_put = pid
-                    messages[msg_id].puttime = ts
-                    msg_args = get_msg_args(evm_log_line)
-                    if msg_args is False:
-                        logger.debug('Could not obtain message args line #: %s', line_count)
-                    else:
-                        messages[msg_id].msg_args = msg_args
-                else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.get_via_drb'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    if msg_id in messages:
-                        ts, pid = get_msg_timestamp_pid(evm_log_line)
-                        test_end = ts
-                        messages[msg_id].pid_get = pid
-                        messages[msg_id].gettime = ts
-                        messages[msg_id].deq_time = get_msg_deq(evm_log_line)
-                    else:
-                        logger.error('Message ID not in dictionary: %s', msg_id)
-                else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
+def _parse_evm_chunk(chunk):
+    """Extract compact records about queue messages and workers from a part of an evm.log
+
+    ``chunk`` is a ``(evm_file, start, end)`` tuple, the lines starting in the byte range
+    ``[start, end)`` are parsed, up to the end of the file if ``end`` is None.
 
-            elif (miqmsg_result.group(1) == 'MiqQueue.delivered'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
+    Returns:
+        a list of records and the number of lines read. Records are tuples, the first element
+        being the record type:
+
+        - ``('start', timestamp)`` for the first queue related line
+        - ``('put', msg_id, msg_cmd, msg_args, timestamp, pid)``
+        - ``('get', msg_id, deq_time, timestamp, pid)``
+        - ``('delivered', msg_id, del_time, timestamp)``
+        - ``('worker', line)`` for lines about worker lifecycles
+    """
+    evm_file, start, end = chunk
+    records = []
+    line_count = 0
+    started = False
+    with open(evm_file, 'rb') as evmlogfile:
+        position = start
+        if start:
+            # the line crossing the chunk start belongs to the previous chunk
+            evmlogfile.seek(start - 1)
+            position += len(evmlogfile.readline()) - 1
+        while end is None or position < end:
+            evm_log_line = evmlogfile.readline()
+            if not evm_log_line:
+                break
+            position += len(evm_log_line)
+            line_count += 1
+            if (line_count % 1000000) == 0:
+                logger.info('Parsed %s lines of %s', line_count, evm_file)
+
+            # Cheap substring checks first, only the few lines about the queue or workers
+            # are decoded and go through the regular expressions
+            queue_line = b'MIQ(MiqQueue.' in evm_log_line or (
+                not started and b'MIQ(' in evm_log_line)
+            worker_line = (b'Interrupt' in evm_log_line or b'"evm_worker_' in evm_log_line or
+                           b'Worker exiting.' in evm_log_line or b') ID [' in evm_log_line)
+            if not (queue_line or worker_line):
+                continue
+            evm_log_line = evm_log_line.decode('utf-8', 'replace').strip()
+
+            miqmsg_result = queue_line and miqmsg.search(evm_log_line)
+            if miqmsg_result:
+                if not started:
+                    started = True
+                    records.append(('start', get_msg_timestamp_pid(evm_log_line)[0]))
+
+                source = miqmsg_result.group(1)
+                if source == 'MiqQueue.put':
                     ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    if msg_id in messages:
-                        messages[msg_id].del_time = get_msg_del(evm_log_line)
-                        messages[msg_id].total_time = messages[msg_id].deq_time + \
-                            messages[msg_id].del_time
-                    else:
-                        logger.error('Message ID not in dictionary: %s', msg_id)
-                else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
+                    records.append(('put', get_msg_id(evm_log_line), get_msg_cmd(evm_log_line),
+                                    get_msg_args(evm_log_line), ts, pid))
+                elif source == 'MiqQueue.get_via_drb':
+                    ts, pid = get_msg_timestamp_pid(evm_log_line)
+                    records.append(('get', get_msg_id(evm_log_line), get_msg_deq(evm_log_line),
+                                    ts, pid))
+                elif source == 'MiqQueue.delivered':
+                    ts, pid = get_msg_timestamp_pid(evm_log_line)
+                    records.append(('delivered', get_msg_id(evm_log_line),
+                                    get_msg_del(evm_log_line), ts))
 
-        if (line_count % 100000) == 0:
-            timediff = time() - runningtime
-            runningtime = time()
-            logger.info('Count {} : Parsed 100000 lines in %s', line_count, timediff)
+            if worker_line and evm_worker_filter.search(evm_log_line):
+                records.append(('worker', evm_log_line))
+    return records, line_count
 
-        evm_log_line = evmlogfile.readline()
 
+def _replay_evm_records(records, filters, line_count):
+    test_start = ''
+    test_end = ''
+    messages = {}
+    workers = {}
+    wkr_counts = {
+        'evm_worker_memory_exceeded': 0,
+        'evm_worker_uptime_exceeded': 0,
+        'evm_worker_stop': 0,
+        'Interrupted': 0,
+        'Worker Exited': 0,
+    }
+    wkr_line_count = 0
+
+    for record in records:
+        kind = record[0]
+        if kind == 'worker':
+            wkr_line_count += 1
+            _evm_worker_line(record[1], workers, wkr_counts)
+        elif kind == 'start':
+            if test_start == '':
+                test_start = record[1]
+        elif not record[1]:
+            logger.error('Could not obtain message id for %s', kind)
+        elif kind == 'put':
+            # A message was first put on the queue, this starts its queuing time
+            kind, msg_id, msg_cmd, msg_args, ts, pid = record
+            test_end = ts
+            message = messages[msg_id] = MiqMsgStat()
+            message.msg_id = '\'' + msg_id + '\''
+            message.msg_cmd = msg_cmd
+            message.pid_put = pid
+            message.puttime = ts
+            if msg_args is False:
+                logger.debug('Could not obtain message args for message id: %s', msg_id)
+            else:
+                message.msg_args = msg_args
+        elif kind == 'get':
+            kind, msg_id, deq_time, ts, pid = record
+            if msg_id in messages:
+                test_end = ts
+                message = messages[msg_id]
+                message.pid_get = pid
+                message.gettime = ts
+                message.deq_time = deq_time
+            else:
+                logger.error('Message ID not in dictionary: %s', msg_id)
+        elif kind == 'delivered':
+            kind, msg_id, del_time, ts = record
+            test_end = ts
+            if msg_id in messages:
+                message = messages[msg_id]
+                message.del_time = del_time
+                message.total_time = message.deq_time + message.del_time
+            else:
+                logger.error('Message ID not in dictionary: %s', msg_id)
+
+    msg_cmds = _messages_to_commands(messages, filters)
+    return (
+        (messages, msg_cmds, test_start, test_end, line_count),
+        (workers, wkr_counts['evm_worker_memory_exceeded'],
+         wkr_counts['evm_worker_uptime_exceeded'], wkr_counts['evm_worker_stop'],
+         wkr_counts['Interrupted'], wkr_counts['Worker Exited'], wkr_line_count))
+
+
+def _messages_to_commands(messages, filters):
     # I tried to avoid two loops but this reduced the complexity of filtering on messages.
     # By filtering over messages, we can better display what is occuring under the covers, as a
     # daily rollup is picked up off the queue different than a hourly rollup, etc
+    msg_cmds = {}
     for msg in sorted(messages.keys()):
         msg_args = messages[msg].msg_args
         # Determine if the pattern matches and append to the command if it does
@@ -160,82 +265,49 @@ def evm_to_messages(evm_file, filters):
             msg_cmds[msg_cmd]['total'].append(round(messages[msg].total_time, 2))
             msg_cmds[msg_cmd]['queue'].append(round(messages[msg].deq_time, 2))
             msg_cmds[msg_cmd]['execute'].append(round(messages[msg].del_time, 2))
-
-    return messages, msg_cmds, test_start, test_end, line_count
-
-
-def evm_to_workers(evm_file):
-    # Use grep to reduce # of lines to sort through
-    p = subprocess.Popen(['grep', 'Interrupt\\|MIQ([A-Za-z]*) ID\\|"evm_worker_uptime_exceeded\\|'
-            '"evm_worker_memory_exceeded\\|"evm_worker_stop\\|Worker exiting.', evm_file],
-            stdout=subprocess.PIPE)
-    greppedevmlog, err = p.communicate()
-    greppedevmlog = greppedevmlog.strip()
-
-    evmlines = greppedevmlog.split('\n')
-
-    workers = {}
-    wkr_upt_exc = 0
-    wkr_mem_exc = 0
-    wkr_stp = 0
-    wkr_int = 0
-    wkr_ext = 0
-    for evm_log_line in evmlines:
-        ts, pid = get_msg_timestamp_pid(evm_log_line)
-
-        miqwkr_result = miqwkr.search(evm_log_line)
-        if miqwkr_result:
-            workerid = int(miqwkr_result.group(2))
-            if workerid not in workers:
-                workers[workerid] = MiqWorker()
-                workers[workerid].worker_type = miqwkr_result.group(1)
-                workers[workerid].pid = miqwkr_result.group(3)
-                workers[workerid].worker_id = int(workerid)
-                workers[workerid].start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_uptime_exceeded' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_upt_exc += 1
-                        workers[workerid].terminated = 'evm_worker_uptime_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_memory_exceeded' in evm_log_line:
+    return msg_cmds
+
+
+def _evm_worker_line(evm_log_line, workers, wkr_counts):
+    # Updates the workers and termination counts from a worker lifecycle line
+    ts, pid = get_msg_timestamp_pid(evm_log_line)
+
+    miqwkr_result = miqwkr.search(evm_log_line)
+    if miqwkr_result:
+        workerid = int(miqwkr_result.group(2))
+        if workerid not in workers:
+            workers[workerid] = MiqWorker()
+            workers[workerid].worker_type = miqwkr_result.group(1)
+            workers[workerid].pid = miqwkr_result.group(3)
+            workers[workerid].worker_id = int(workerid)
+            workers[workerid].start_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+        return
+
+    for terminated in ('evm_worker_uptime_exceeded', 'evm_worker_memory_exceeded',
+                       'evm_worker_stop'):
+        if terminated in evm_log_line:
             miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_mem_exc += 1
-                        workers[workerid].terminated = 'evm_worker_memory_exceeded'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'evm_worker_stop' in evm_log_line:
-            miqwkr_id_result = miqwkr_id.search(evm_log_line)
-            if miqwkr_id_result:
-                workerid = int(miqwkr_id_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_stp += 1
-                        workers[workerid].terminated = 'evm_worker_stop'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
-        elif 'Interrupt' in evm_log_line:
+            break
+    else:
+        if 'Interrupt' in evm_log_line:
             for workerid in workers:
                 if not workers[workerid].end_ts:
-                    wkr_int += 1
+                    wkr_counts['Interrupted'] += 1
                     workers[workerid].terminated = 'Interrupted'
                     workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+            return
         elif 'Worker exiting.' in evm_log_line:
-            miqwkr_id_2_result = miqwkr_id_2.search(evm_log_line)
-            if miqwkr_id_2_result:
-                workerid = int(miqwkr_id_2_result.group(1))
-                if workerid in workers:
-                    if not workers[workerid].terminated:
-                        wkr_ext += 1
-                        workers[workerid].terminated = 'Worker Exited'
-                        workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+            terminated = 'Worker Exited'
+            miqwkr_id_result = miqwkr_id_2.search(evm_log_line)
+        else:
+            return
 
-    return workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, len(evmlines)
+    if miqwkr_id_result:
+        workerid = int(miqwkr_id_result.group(1))
+        if workerid in workers and not workers[workerid].terminated:
+            wkr_counts[terminated] += 1
+            workers[workerid].terminated = terminated
+            workers[workerid].end_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
 
 
 def split_appliance_charts(top_appliance, charts_dir):
@@ -799,7 +871,7 @@ def top_to_workers(workers, top_file):
     return top_workers, len(top_lines)
 
 
-def perf_process_evm(evm_file, top_file):
+def perf_process_evm(evm_file, top_file, processes=1):
     msg_filters = {
         '-hourly': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"hourly\"'),
         '-daily': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"daily\"'),
@@ -812,22 +884,18 @@ def perf_process_evm(evm_file, top_file):
     starttime = time()
     initialtime = starttime
 
-    logger.info('----------- Parsing evm log file for messages -----------')
-    messages, msg_cmds, test_start, test_end, msg_lc = evm_to_messages(evm_file, msg_filters)
+    logger.info('----------- Parsing evm log file for messages and workers -----------')
+    ((messages, msg_cmds, test_start, test_end, msg_lc),
+     (workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc)) = \
+        evm_to_messages_and_workers(evm_file, msg_filters, processes)
     timediff = time() - starttime
     logger.info('----------- Completed Parsing evm log file -----------')
-    logger.info('Parsed %s lines of evm log file for messages in %s', msg_lc, timediff)
+    logger.info('Parsed %s lines of evm log file in %s', msg_lc, timediff)
     logger.info('Total # of Messages: %d', len(messages))
     logger.info('Total # of Commands: %d', len(msg_cmds))
     logger.info('Start Time: %s', test_start)
     logger.info('End Time: %s', test_end)
-
-    logger.info('----------- Parsing evm log file for workers -----------')
-    starttime = time()
-    workers, wkr_mem_exc, wkr_upt_exc, wkr_stp, wkr_int, wkr_ext, wkr_lc = evm_to_workers(evm_file)
-    timediff = time() - starttime
-    logger.info('----------- Completed Parsing evm log for workers -----------')
-    logger.info('Parsed %s lines of evm log file for workers in %s', wkr_lc, timediff)
+    logger.info('Parsed %s lines of evm log file for workers', wkr_lc)
     logger.info('Total # of Workers: %d', len(workers))
     logger.info('# Workers Memory Exceeded: %s', wkr_mem_exc)
     logger.info('# Workers Uptime Exceeded: %s', wkr_upt_exc)
@@ -1033,10 +1101,12 @@ def perf_process_evm(evm_file, top_file):
 
 
 class MiqMsgStat(object):
+    # there is one of these per queue message, keep them small
+    __slots__ = ('msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
+        'deq_time', 'del_time', 'total_time')
+    headers = list(__slots__)
 
     def __init__(self):
-        self.headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
-            'deq_time', 'del_time', 'total_time']
         self.msg_id = ''
         self.msg_cmd = ''
         self.msg_args = ''
@@ -1098,9 +1168,10 @@ class MiqMsgBucket(object):
 
 
 class MiqWorker(object):
+    __slots__ = ('worker_id', 'worker_type', 'pid', 'start_ts', 'end_ts', 'terminated')
+    headers = list(__slots__)
 
     def __init__(self):
-        self.headers = ['worker_id', 'worker_type', 'pid', 'start_ts', 'end_ts', 'terminated']
         self.worker_id = 0
         self.worker_type = ''
         self.pid = ''
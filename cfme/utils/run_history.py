@@ -0,0 +1,215 @@
+"""Persistent history of test runs, backed by a local SQLite database
+
+Every test run records one row per test (outcome, setup/call/teardown durations, slave id,
+appliance version and provider key), one row per fixture setup and one row per UI navigation,
+which is then queried to find the slowest tests, fixtures and navigations, or the tests flipping
+between passing and failing the most.
+
+The database lives in ``log/run_history.sqlite`` by default, it is fed by the
+:py:mod:`cfme.fixtures.run_history` plugin and can be inspected with ``miq history``.
+
+Usage:
+
+.. code-block:: python
+
+    history = RunHistory()
+    for nodeid, average, runs in history.slowest_tests(limit=10):
+        print(nodeid, average)
+
+"""
+import sqlite3
+import time
+from collections import defaultdict
+
+from cfme.utils.path import log_path
+
+#: Default location of the run history database
+DEFAULT_HISTORY_PATH = log_path.join('run_history.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    finished REAL,
+    appliance_version TEXT
+);
+CREATE TABLE IF NOT EXISTS tests (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    nodeid TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    setup REAL NOT NULL DEFAULT 0,
+    call REAL NOT NULL DEFAULT 0,
+    teardown REAL NOT NULL DEFAULT 0,
+    slaveid TEXT,
+    provider TEXT,
+    appliance_version TEXT
+);
+CREATE INDEX IF NOT EXISTS tests_nodeid ON tests (nodeid, run_id);
+CREATE TABLE IF NOT EXISTS fixtures (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    fixture TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    setup REAL NOT NULL DEFAULT 0,
+    teardown REAL NOT NULL DEFAULT 0,
+    nodeid TEXT,
+    slaveid TEXT
+);
+CREATE INDEX IF NOT EXISTS fixtures_fixture ON fixtures (fixture, run_id);
+CREATE TABLE IF NOT EXISTS navigations (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    destination TEXT NOT NULL,
+    method TEXT NOT NULL,
+    duration REAL NOT NULL DEFAULT 0,
+    nodeid TEXT,
+    slaveid TEXT
+);
+CREATE INDEX IF NOT EXISTS navigations_destination ON navigations (destination, run_id);
+"""
+
+
+def report_outcome(reports):
+    """Compute the outcome of a test from its ``{phase: report}`` dict
+
+    Returns:
+        ``'error'`` if setup or teardown failed, otherwise ``'failed'``, ``'skipped'``
+        or ``'passed'``
+    """
+    for when in ('setup', 'call', 'teardown'):
+        report = reports.get(when)
+        if report is None:
+            continue
+        if report.failed:
+            return 'failed' if when == 'call' else 'error'
+        if report.skipped:
+            return 'skipped'
+    return 'passed'
+
+
+def flakiness(outcomes):
+    """Ratio of outcome flips between consecutive runs, ``0`` being perfectly stable
+
+    Skipped runs are ignored, errors count as failures.
+    """
+    results = [outcome == 'passed' for outcome in outcomes if outcome != 'skipped']
+    if len(results) < 2:
+        return 0.0
+    flips = sum(1 for previous, current in zip(results, results[1:]) if previous != current)
+    return float(flips) / (len(results) - 1)
+
+
+class RunHistory(object):
+    """Access to the run history database
+
+    Args:
+        path: path of the SQLite database, created if it doesn't exist
+    """
+    def __init__(self, path=None):
+        self.path = str(path or DEFAULT_HISTORY_PATH)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def start_run(self, appliance_version=None):
+        """Record the start of a run, returns its id"""
+        with self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO runs (started, appliance_version) VALUES (?, ?)',
+                (time.time(), appliance_version))
+        return cursor.lastrowid
+
+    def finish_run(self, run_id):
+        with self.conn:
+            self.conn.execute('UPDATE runs SET finished = ? WHERE id = ?', (time.time(), run_id))
+
+    def record_test(self, run_id, nodeid, outcome, setup=0, call=0, teardown=0,
+                    slaveid=None, provider=None, appliance_version=None):
+        """Record the result of a test, :py:meth:`commit` makes it permanent"""
+        self.conn.execute(
+            'INSERT INTO tests (run_id, nodeid, outcome, setup, call, teardown, slaveid, '
+            'provider, appliance_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (run_id, nodeid, outcome, setup, call, teardown, slaveid, provider,
+             appliance_version))
+
+    def record_fixture(self, run_id, fixture, scope, setup=0, teardown=0,
+                       nodeid=None, slaveid=None):
+        """Record a fixture setup and teardown, :py:meth:`commit` makes it permanent"""
+        self.conn.execute(
+            'INSERT INTO fixtures (run_id, fixture, scope, setup, teardown, nodeid, slaveid) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (run_id, fixture, scope, setup, teardown, nodeid, slaveid))
+
+    def record_navigation(self, run_id, destination, method, duration=0, nodeid=None,
+                          slaveid=None):
+        """Record a UI navigation, :py:meth:`commit` makes it permanent"""
+        self.conn.execute(
+            'INSERT INTO navigations (run_id, destination, method, duration, nodeid, slaveid) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (run_id, destination, method, duration, nodeid, slaveid))
+
+    def _min_run_id(self, runs):
+        # id of the oldest of the last ``runs`` runs
+        row = self.conn.execute(
+            'SELECT MIN(id) FROM (SELECT id FROM runs ORDER BY id DESC LIMIT ?)',
+            (runs,)).fetchone()
+        return row[0] or 0
+
+    def slowest_tests(self, limit=20, runs=10):
+        """Tests with the highest average duration over the last ``runs`` runs
+
+        Returns:
+            list of ``(nodeid, average seconds, number of results)`` tuples
+        """
+        return self.conn.execute(
+            'SELECT nodeid, AVG(setup + call + teardown) AS duration, COUNT(*) FROM tests '
+            'WHERE run_id >= ? GROUP BY nodeid ORDER BY duration DESC LIMIT ?',
+            (self._min_run_id(runs), limit)).fetchall()
+
+    def slowest_fixtures(self, limit=20, runs=10):
+        """Fixtures with the highest total setup and teardown time over the last ``runs`` runs
+
+        Returns:
+            list of ``(fixture, scope, total seconds, average seconds, number of setups)`` tuples
+        """
+        return self.conn.execute(
+            'SELECT fixture, scope, SUM(setup + teardown) AS total, AVG(setup + teardown), '
+            'COUNT(*) FROM fixtures WHERE run_id >= ? GROUP BY fixture, scope '
+            'ORDER BY total DESC LIMIT ?',
+            (self._min_run_id(runs), limit)).fetchall()
+
+    def slowest_navigations(self, limit=20, runs=10):
+        """Navigation destinations taking the most time in total over the last ``runs`` runs
+
+        Navigations ending up already at the destination are not counted.
+
+        Returns:
+            list of ``(destination, method, total seconds, average seconds, number of
+            navigations)`` tuples
+        """
+        return self.conn.execute(
+            'SELECT destination, method, SUM(duration) AS total, AVG(duration), COUNT(*) '
+            'FROM navigations WHERE run_id >= ? AND method != ? GROUP BY destination, method '
+            'ORDER BY total DESC LIMIT ?',
+            (self._min_run_id(runs), 'here', limit)).fetchall()
+
+    def flakiest_tests(self, limit=20, runs=10):
+        """Tests flipping the most between passing and failing over the last ``runs`` runs
+
+        Returns:
+            list of ``(nodeid, flakiness, number of results)`` tuples, see :py:func:`flakiness`
+        """
+        outcomes = defaultdict(list)
+        for nodeid, outcome in self.conn.execute(
+                'SELECT nodeid, outcome FROM tests WHERE run_id >= ? ORDER BY run_id',
+                (self._min_run_id(runs),)):
+            outcomes[nodeid].append(outcome)
+        scores = [(nodeid, flakiness(results), len(results))
+                  for nodeid, results in outcomes.items()]
+        scores = [score for score in scores if score[1] > 0]
+        scores.sort(key=lambda score: (-score[1], score[0]))
+        return scores[:limit]
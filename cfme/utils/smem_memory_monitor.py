@@ -1,5 +1,7 @@
 """Monitor Memory on a CFME/Miq appliance and builds report&graphs displaying usage per process."""
 import json
+import shutil
+import tempfile
 import time
 import traceback
 from collections import OrderedDict
@@ -13,7 +15,8 @@ from yaycl import AttrDict
 
 from cfme.utils.conf import cfme_performance
 from cfme.utils.log import logger
-from cfme.utils.path import results_path
+from cfme.utils.path import results_path, scripts_path
+from cfme.utils.timeseries import TimeSeries
 from cfme.utils.version import current_version
 from cfme.utils.version import get_version
 
@@ -134,36 +137,57 @@ test_ts = time.strftime('%Y%m%d%H%M%S')
 # 10s sample interval (occasionally sampling can take almost 4s on an appliance doing a lot of work)
 SAMPLE_INTERVAL = 10
 
+# Where the streaming sampler script is pushed to on the appliance
+REMOTE_SAMPLER = '/tmp/smem_sampler.py'
+
+# Sampled appliance wide and per process measurements, in MiB
+APPLIANCE_FIELDS = ['total', 'free', 'used', 'buffers', 'cached', 'slab', 'swap_total',
+    'swap_free']
+PROCESS_FIELDS = ['rss', 'pss', 'uss', 'vss', 'swap']
+
 
 class SmemMemoryMonitor(Thread):
-    def __init__(self, ssh_client, scenario_data):
+    """Thread sampling the appliance memory and per process memory until ``signal`` is False
+
+    Args:
+        ssh_client: ssh client of the monitored appliance
+        scenario_data: scenario being run, used for the report
+        sampler: ``'stream'`` pushes ``scripts/smem_sampler.py`` to the appliance, which streams
+            JSON samples back over a single long-lived channel; ``'poll'`` runs separate
+            meminfo, psql and smem commands for every sample. The stream sampler falls back to
+            polling if it cannot be started or its stream breaks.
+        sample_interval: seconds between samples, the stream sampler supports sub-second
+            intervals
+    """
+    def __init__(self, ssh_client, scenario_data, sampler='stream',
+            sample_interval=SAMPLE_INTERVAL):
         super(SmemMemoryMonitor, self).__init__()
         self.ssh_client = ssh_client
         self.scenario_data = scenario_data
+        self.sampler = sampler
+        self.sample_interval = sample_interval
         self.grafana_urls = {}
         self.miq_server_id = ''
         self.use_slab = False
         self.signal = True
+        # Directory full chunks of samples are spilled to, created when monitoring starts
+        self.spill_dir = None
+        self.series_count = 0
+
+    def new_series(self, fields):
+        self.series_count += 1
+        return TimeSeries(fields, spill_dir=self.spill_dir,
+            name='series-{}'.format(self.series_count))
 
     def create_process_result(self, process_results, starttime, process_pid, process_name,
             memory_by_pid):
         if process_pid in memory_by_pid.keys():
             if process_name not in process_results:
                 process_results[process_name] = OrderedDict()
-                process_results[process_name][process_pid] = OrderedDict()
             if process_pid not in process_results[process_name]:
-                process_results[process_name][process_pid] = OrderedDict()
-            process_results[process_name][process_pid][starttime] = {}
-            rss_mem = memory_by_pid[process_pid]['rss']
-            pss_mem = memory_by_pid[process_pid]['pss']
-            uss_mem = memory_by_pid[process_pid]['uss']
-            vss_mem = memory_by_pid[process_pid]['vss']
-            swap_mem = memory_by_pid[process_pid]['swap']
-            process_results[process_name][process_pid][starttime]['rss'] = rss_mem
-            process_results[process_name][process_pid][starttime]['pss'] = pss_mem
-            process_results[process_name][process_pid][starttime]['uss'] = uss_mem
-            process_results[process_name][process_pid][starttime]['vss'] = vss_mem
-            process_results[process_name][process_pid][starttime]['swap'] = swap_mem
+                process_results[process_name][process_pid] = self.new_series(PROCESS_FIELDS)
+            process_results[process_name][process_pid].append(starttime,
+                memory_by_pid[process_pid])
             del memory_by_pid[process_pid]
         else:
             logger.warn('Process {} PID, not found: {}'.format(process_name, process_pid))
@@ -174,32 +198,35 @@ class SmemMemoryMonitor(Thread):
         # 5.4 - RHEL 6 / Centos 6
         # Application Memory Used : MemTotal - (MemFree + Buffers + Cached)
         # Available memory could potentially be better metric
-        appliance_results[plottime] = {}
-
         result = self.ssh_client.run_command('cat /proc/meminfo')
         if result.failed:
             logger.error('Exit_status nonzero in get_appliance_memory: {}, {}'
                          .format(result.rc, result.output))
-            del appliance_results[plottime]
         else:
             meminfo_raw = result.output.replace('kB', '').strip()
             meminfo = OrderedDict((k.strip(), v.strip()) for k, v in
                 (value.strip().split(':') for value in meminfo_raw.split('\n')))
-            appliance_results[plottime]['total'] = float(meminfo['MemTotal']) / 1024
-            appliance_results[plottime]['free'] = float(meminfo['MemFree']) / 1024
-            if 'MemAvailable' in meminfo:  # 5.5, RHEL 7/Centos 7
-                self.use_slab = True
-                mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
-                    meminfo['Slab']) + float(meminfo['Cached']))) / 1024
-            else:  # 5.4, RHEL 6/Centos 6
-                mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
-                    meminfo['Buffers']) + float(meminfo['Cached']))) / 1024
-            appliance_results[plottime]['used'] = mem_used
-            appliance_results[plottime]['buffers'] = float(meminfo['Buffers']) / 1024
-            appliance_results[plottime]['cached'] = float(meminfo['Cached']) / 1024
-            appliance_results[plottime]['slab'] = float(meminfo['Slab']) / 1024
-            appliance_results[plottime]['swap_total'] = float(meminfo['SwapTotal']) / 1024
-            appliance_results[plottime]['swap_free'] = float(meminfo['SwapFree']) / 1024
+            self.create_appliance_result(appliance_results, plottime, meminfo)
+
+    def create_appliance_result(self, appliance_results, plottime, meminfo):
+        """Append a sample computed from the /proc/meminfo values (in kB)"""
+        sample = {}
+        sample['total'] = float(meminfo['MemTotal']) / 1024
+        sample['free'] = float(meminfo['MemFree']) / 1024
+        if 'MemAvailable' in meminfo:  # 5.5, RHEL 7/Centos 7
+            self.use_slab = True
+            mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
+                meminfo['Slab']) + float(meminfo['Cached']))) / 1024
+        else:  # 5.4, RHEL 6/Centos 6
+            mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
+                meminfo['Buffers']) + float(meminfo['Cached']))) / 1024
+        sample['used'] = mem_used
+        sample['buffers'] = float(meminfo['Buffers']) / 1024
+        sample['cached'] = float(meminfo['Cached']) / 1024
+        sample['slab'] = float(meminfo['Slab']) / 1024
+        sample['swap_total'] = float(meminfo['SwapTotal']) / 1024
+        sample['swap_free'] = float(meminfo['SwapFree']) / 1024
+        appliance_results.append(plottime, sample)
 
     def get_evm_workers(self):
         result = self.ssh_client.run_command(
@@ -271,87 +298,133 @@ class SmemMemoryMonitor(Thread):
         return memory_by_pid
 
     def _real_run(self):
-        """ Result dictionaries:
-        appliance_results[timestamp][measurement] = value
-        appliance_results[timestamp]['total'] = value
-        appliance_results[timestamp]['free'] = value
-        appliance_results[timestamp]['used'] = value
-        appliance_results[timestamp]['buffers'] = value
-        appliance_results[timestamp]['cached'] = value
-        appliance_results[timestamp]['slab'] = value
-        appliance_results[timestamp]['swap_total'] = value
-        appliance_results[timestamp]['swap_free'] = value
+        """ Results are columnar time series (:py:class:`cfme.utils.timeseries.TimeSeries`):
+        appliance_results: series of the appliance measurements
         appliance measurements: total/free/used/buffers/cached/slab/swap_total/swap_free
-        process_results[name][pid][timestamp][measurement] = value
-        process_results[name][pid][timestamp]['rss'] = value
-        process_results[name][pid][timestamp]['pss'] = value
-        process_results[name][pid][timestamp]['uss'] = value
-        process_results[name][pid][timestamp]['vss'] = value
-        process_results[name][pid][timestamp]['swap'] = value
+        process_results[name][pid]: series of the process measurements
+        process measurements: rss/pss/uss/vss/swap
+        Full chunks of samples are spilled to a temporary directory, removed after the report
+        is created.
         """
-        appliance_results = OrderedDict()
+        self.spill_dir = tempfile.mkdtemp(prefix='smem-samples-')
+        try:
+            self._monitor()
+        finally:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def _monitor(self):
+        appliance_results = self.new_series(APPLIANCE_FIELDS)
         process_results = OrderedDict()
         install_smem(self.ssh_client)
         self.get_miq_server_id()
         logger.info('Starting Monitoring Thread.')
+        if self.sampler == 'stream':
+            try:
+                self.stream_samples(appliance_results, process_results)
+            except Exception as e:
+                logger.warning('Streaming sampler failed, falling back to polling: {}'.format(e))
+        self.poll_samples(appliance_results, process_results)
+        logger.info('Monitoring CFME Memory Terminating')
+
+        create_report(self.scenario_data, appliance_results, process_results, self.use_slab,
+            self.grafana_urls)
+
+    def stream_samples(self, appliance_results, process_results):
+        """Sample with the sampler script, reading its JSON lines until ``signal`` is False"""
+        if self.ssh_client.is_container or self.ssh_client.is_pod or \
+                self.ssh_client.username != 'root':
+            raise Exception('Streaming sampler requires a root ssh session on the appliance host')
+        self.ssh_client.put_file(scripts_path.join('smem_sampler.py').strpath, REMOTE_SAMPLER)
+        session = self.ssh_client.get_transport().open_session()
+        # A sample not arriving in time means the sampler is hung
+        session.settimeout(self.sample_interval * 3 + 60)
+        session.exec_command(
+            '$(command -v python || command -v python3) {} --interval {} --server-id "{}" '
+            '--workers-interval {}'.format(REMOTE_SAMPLER, self.sample_interval,
+                self.miq_server_id, max(self.sample_interval, SAMPLE_INTERVAL)))
+        stdout = session.makefile()
+        logger.info('Streaming memory samples every {}s'.format(self.sample_interval))
+        try:
+            while self.signal:
+                line = stdout.readline()
+                if not line:
+                    raise Exception('Sampler exited: {}'.format(
+                        session.makefile_stderr().read().strip()))
+                sample = json.loads(line)
+                plottime = sample['timestamp']
+                self.create_appliance_result(appliance_results, plottime, sample['meminfo'])
+                memory_by_pid = {}
+                for pid, memory in sample['processes'].items():
+                    memory_by_pid[pid] = {
+                        measurement: float(memory[measurement]) / 1024
+                        for measurement in PROCESS_FIELDS}
+                    memory_by_pid[pid]['name'] = memory['name']
+                    memory_by_pid[pid]['cmd'] = memory['cmd']
+                self.create_process_results(process_results, plottime, sample['workers'],
+                    memory_by_pid)
+        finally:
+            # Closing the channel makes the sampler exit on its next write
+            session.close()
+
+    def poll_samples(self, appliance_results, process_results):
+        """Sample by running separate commands over ssh until ``signal`` is False"""
         while self.signal:
             starttime = time.time()
-            plottime = datetime.now()
+            plottime = starttime
 
             self.get_appliance_memory(appliance_results, plottime)
             workers = self.get_evm_workers()
             memory_by_pid = self.get_pids_memory()
-
-            for worker_pid in workers:
-                self.create_process_result(process_results, plottime, worker_pid,
-                    workers[worker_pid], memory_by_pid)
-
-            for pid in sorted(memory_by_pid.keys()):
-                if memory_by_pid[pid]['name'] == 'httpd':
-                    self.create_process_result(process_results, plottime, pid, 'httpd',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'postgres':
-                    self.create_process_result(process_results, plottime, pid, 'postgres',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'postmaster':
-                    self.create_process_result(process_results, plottime, pid, 'postgres',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'memcached':
-                    self.create_process_result(process_results, plottime, pid, 'memcached',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'collectd':
-                    self.create_process_result(process_results, plottime, pid, 'collectd',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'ruby':
-                    if 'evm_server.rb' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'MIQ Server (evm_server.rb)', memory_by_pid)
-                    elif 'MIQ Server' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'MIQ Server (evm_server.rb)', memory_by_pid)
-                    elif 'evm_watchdog.rb' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'evm_watchdog.rb', memory_by_pid)
-                    elif 'appliance_console.rb' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'appliance_console.rb', memory_by_pid)
-                    elif 'evm:dbsync:replicate' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'evm:dbsync:replicate', memory_by_pid)
-                    else:
-                        logger.debug('Unaccounted for ruby pid: {}'.format(pid))
+            self.create_process_results(process_results, plottime, workers, memory_by_pid)
 
             timediff = time.time() - starttime
             logger.debug('Monitoring sampled in {}s'.format(round(timediff, 4)))
 
             # Sleep Monitoring interval
             # Roughly 10s samples, accounts for collection of memory measurements
-            time_to_sleep = abs(SAMPLE_INTERVAL - timediff)
+            time_to_sleep = abs(self.sample_interval - timediff)
             time.sleep(time_to_sleep)
-        logger.info('Monitoring CFME Memory Terminating')
 
-        create_report(self.scenario_data, appliance_results, process_results, self.use_slab,
-            self.grafana_urls)
+    def create_process_results(self, process_results, plottime, workers, memory_by_pid):
+        """Append the samples of the workers and other monitored processes"""
+        for worker_pid in workers:
+            self.create_process_result(process_results, plottime, worker_pid,
+                workers[worker_pid], memory_by_pid)
+
+        for pid in sorted(memory_by_pid.keys()):
+            if memory_by_pid[pid]['name'] == 'httpd':
+                self.create_process_result(process_results, plottime, pid, 'httpd',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'postgres':
+                self.create_process_result(process_results, plottime, pid, 'postgres',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'postmaster':
+                self.create_process_result(process_results, plottime, pid, 'postgres',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'memcached':
+                self.create_process_result(process_results, plottime, pid, 'memcached',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'collectd':
+                self.create_process_result(process_results, plottime, pid, 'collectd',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'ruby':
+                if 'evm_server.rb' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(process_results, plottime, pid,
+                        'MIQ Server (evm_server.rb)', memory_by_pid)
+                elif 'MIQ Server' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(process_results, plottime, pid,
+                        'MIQ Server (evm_server.rb)', memory_by_pid)
+                elif 'evm_watchdog.rb' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(process_results, plottime, pid,
+                        'evm_watchdog.rb', memory_by_pid)
+                elif 'appliance_console.rb' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(process_results, plottime, pid,
+                        'appliance_console.rb', memory_by_pid)
+                elif 'evm:dbsync:replicate' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(process_results, plottime, pid,
+                        'evm:dbsync:replicate', memory_by_pid)
+                else:
+                    logger.debug('Unaccounted for ruby pid: {}'.format(pid))
 
     def run(self):
         try:
@@ -430,14 +503,14 @@ def compile_per_process_results(procs_to_compile, process_results, ts_end):
     total_running_swap = 0
     for process in procs_to_compile:
         if process in process_results:
-            for pid in process_results[process]:
-                if ts_end in process_results[process][pid]:
+            for series in process_results[process].values():
+                if series.end == ts_end:
                     alive_pids += 1
-                    total_running_rss += process_results[process][pid][ts_end]['rss']
-                    total_running_pss += process_results[process][pid][ts_end]['pss']
-                    total_running_uss += process_results[process][pid][ts_end]['uss']
-                    total_running_vss += process_results[process][pid][ts_end]['vss']
-                    total_running_swap += process_results[process][pid][ts_end]['swap']
+                    total_running_rss += series.last('rss')
+                    total_running_pss += series.last('pss')
+                    total_running_uss += series.last('uss')
+                    total_running_vss += series.last('vss')
+                    total_running_swap += series.last('swap')
                 else:
                     recycled_pids += 1
     return alive_pids, recycled_pids, total_running_rss, total_running_pss, total_running_uss, \
@@ -449,24 +522,15 @@ def generate_raw_data_csv(directory, appliance_results, process_results):
     file_name = str(directory.join('appliance.csv'))
     with open(file_name, 'w') as csv_file:
         csv_file.write('TimeStamp,Total,Free,Used,Buffers,Cached,Slab,Swap_Total,Swap_Free\n')
-        for ts in appliance_results:
-            csv_file.write('{},{},{},{},{},{},{},{},{}\n'.format(ts,
-                appliance_results[ts]['total'], appliance_results[ts]['free'],
-                appliance_results[ts]['used'], appliance_results[ts]['buffers'],
-                appliance_results[ts]['cached'], appliance_results[ts]['slab'],
-                appliance_results[ts]['swap_total'], appliance_results[ts]['swap_free']))
+        for row in appliance_results.rows():
+            csv_file.write('{},{},{},{},{},{},{},{},{}\n'.format(*row))
     for process_name in process_results:
-        for process_pid in process_results[process_name]:
+        for process_pid, series in process_results[process_name].items():
             file_name = str(directory.join('{}-{}.csv'.format(process_pid, process_name)))
             with open(file_name, 'w') as csv_file:
                 csv_file.write('TimeStamp,RSS,PSS,USS,VSS,SWAP\n')
-                for ts in process_results[process_name][process_pid]:
-                    csv_file.write('{},{},{},{},{},{}\n'.format(ts,
-                        process_results[process_name][process_pid][ts]['rss'],
-                        process_results[process_name][process_pid][ts]['pss'],
-                        process_results[process_name][process_pid][ts]['uss'],
-                        process_results[process_name][process_pid][ts]['vss'],
-                        process_results[process_name][process_pid][ts]['swap']))
+                for row in series.rows():
+                    csv_file.write('{},{},{},{},{},{}\n'.format(*row))
     timediff = time.time() - starttime
     logger.info('Generated Raw Data CSVs in: {}'.format(timediff))
 
@@ -477,29 +541,13 @@ def generate_summary_csv(file_name, appliance_results, process_results, provider
     with open(str(file_name), 'w') as csv_file:
         csv_file.write('Version: {}, Provider(s): {}\n'.format(version_string, provider_names))
         csv_file.write('Measurement,Start of test,End of test\n')
-        start = appliance_results.keys()[0]
-        end = appliance_results.keys()[-1]
-        csv_file.write('Appliance Total Memory,{},{}\n'.format(
-            round(appliance_results[start]['total'], 2), round(appliance_results[end]['total'], 2)))
-        csv_file.write('Appliance Free Memory,{},{}\n'.format(
-            round(appliance_results[start]['free'], 2), round(appliance_results[end]['free'], 2)))
-        csv_file.write('Appliance Used Memory,{},{}\n'.format(
-            round(appliance_results[start]['used'], 2), round(appliance_results[end]['used'], 2)))
-        csv_file.write('Appliance Buffers,{},{}\n'.format(
-            round(appliance_results[start]['buffers'], 2),
-            round(appliance_results[end]['buffers'], 2)))
-        csv_file.write('Appliance Cached,{},{}\n'.format(
-            round(appliance_results[start]['cached'], 2),
-            round(appliance_results[end]['cached'], 2)))
-        csv_file.write('Appliance Slab,{},{}\n'.format(
-            round(appliance_results[start]['slab'], 2),
-            round(appliance_results[end]['slab'], 2)))
-        csv_file.write('Appliance Total Swap,{},{}\n'.format(
-            round(appliance_results[start]['swap_total'], 2),
-            round(appliance_results[end]['swap_total'], 2)))
-        csv_file.write('Appliance Free Swap,{},{}\n'.format(
-            round(appliance_results[start]['swap_free'], 2),
-            round(appliance_results[end]['swap_free'], 2)))
+        for measurement, field in [('Appliance Total Memory', 'total'),
+                ('Appliance Free Memory', 'free'), ('Appliance Used Memory', 'used'),
+                ('Appliance Buffers', 'buffers'), ('Appliance Cached', 'cached'),
+                ('Appliance Slab', 'slab'), ('Appliance Total Swap', 'swap_total'),
+                ('Appliance Free Swap', 'swap_free')]:
+            csv_file.write('{},{},{}\n'.format(measurement,
+                round(appliance_results.first(field), 2), round(appliance_results.last(field), 2)))
 
         summary_csv_measurement_dump(csv_file, process_results, 'rss')
         summary_csv_measurement_dump(csv_file, process_results, 'pss')
@@ -538,17 +586,12 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write(' : <b><a href=\'workload.html\'>Workload Info</a></b>')
         html_file.write(' : <b><a href=\'graphs/\'>Graphs directory</a></b>\n')
         html_file.write(' : <b><a href=\'rawdata/\'>CSVs directory</a></b><br>\n')
-        start = appliance_results.keys()[0]
-        end = appliance_results.keys()[-1]
-        timediff = end - start
+        end = appliance_results.end
         total_proc_count = 0
         for proc_name in process_results:
             total_proc_count += len(process_results[proc_name].keys())
-        growth = appliance_results[end]['used'] - appliance_results[start]['used']
-        max_used_memory = 0
-        for ts in appliance_results:
-            if appliance_results[ts]['used'] > max_used_memory:
-                max_used_memory = appliance_results[ts]['used']
+        growth = appliance_results.last('used') - appliance_results.first('used')
+        max_used_memory = float(appliance_results.column('used').max())
         html_file.write('<table border="1">\n')
         html_file.write('<tr><td>\n')
         # Appliance Wide Results
@@ -567,12 +610,10 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write('</tr>\n')
         html_file.write('<td><a href=\'rawdata/appliance.csv\'>{}</a></td>\n'.format(
             version_string))
-        html_file.write('<td>{}</td>\n'.format(start.replace(microsecond=0)))
-        html_file.write('<td>{}</td>\n'.format(end.replace(microsecond=0)))
-        html_file.write('<td>{}</td>\n'.format(unicode(timediff).partition('.')[0]))
-        html_file.write('<td>{}</td>\n'.format(round(appliance_results[end]['total'], 2)))
-        html_file.write('<td>{}</td>\n'.format(round(appliance_results[start]['used'], 2)))
-        html_file.write('<td>{}</td>\n'.format(round(appliance_results[end]['used'], 2)))
+        html_file.write(format_time_span(appliance_results))
+        html_file.write('<td>{}</td>\n'.format(round(appliance_results.last('total'), 2)))
+        html_file.write('<td>{}</td>\n'.format(round(appliance_results.first('used'), 2)))
+        html_file.write('<td>{}</td>\n'.format(round(appliance_results.last('used'), 2)))
         html_file.write('<td>{}</td>\n'.format(round(growth, 2)))
         html_file.write('<td>{}</td>\n'.format(round(max_used_memory, 2)))
         html_file.write('<td>{}</td>\n'.format(total_proc_count))
@@ -748,11 +789,8 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write('<img src=\'graphs/{}\'>\n'.format(file_name))
         file_name = '{}-appliance_swap.png'.format(version_string)
         # Check for swap usage through out time frame:
-        max_swap_used = 0
-        for ts in appliance_results:
-            swap_used = appliance_results[ts]['swap_total'] - appliance_results[ts]['swap_free']
-            if swap_used > max_swap_used:
-                max_swap_used = swap_used
+        max_swap_used = float((appliance_results.column('swap_total') -
+            appliance_results.column('swap_free')).max())
         if max_swap_used < 10:  # Less than 10MiB Max, then hide graph
             html_file.write('<br><a href=\'graphs/{}\'>Swap Graph '.format(file_name))
             html_file.write('(Hidden, max_swap_used < 10 MiB)</a>\n')
@@ -777,10 +815,7 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         # By Worker Type Memory Used
         for ordered_name in process_order:
             if ordered_name in process_results:
-                for pid in process_results[ordered_name]:
-                    start = process_results[ordered_name][pid].keys()[0]
-                    end = process_results[ordered_name][pid].keys()[-1]
-                    timediff = end - start
+                for pid, series in process_results[ordered_name].items():
                     html_file.write('<tr>\n')
                     if len(process_results[ordered_name]) > 1:
                         html_file.write('<td><a href=\'#{}\'>{}</a></td>\n'.format(ordered_name,
@@ -791,23 +826,12 @@ def generate_summary_html(directory, version_string, appliance_results, process_
                         html_file.write('<td>{}</td>\n'.format(ordered_name))
                         html_file.write('<td><a href=\'#{}-{}.png\'>{}</a></td>\n'.format(
                             ordered_name, pid, pid))
-                    html_file.write('<td>{}</td>\n'.format(start.replace(microsecond=0)))
-                    html_file.write('<td>{}</td>\n'.format(end.replace(microsecond=0)))
-                    html_file.write('<td>{}</td>\n'.format(unicode(timediff).partition('.')[0]))
-                    rss_change = process_results[ordered_name][pid][end]['rss'] - \
-                        process_results[ordered_name][pid][start]['rss']
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][start]['rss'], 2)))
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][end]['rss'], 2)))
-                    html_file.write('<td>{}</td>\n'.format(round(rss_change, 2)))
-                    pss_change = process_results[ordered_name][pid][end]['pss'] - \
-                        process_results[ordered_name][pid][start]['pss']
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][start]['pss'], 2)))
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][end]['pss'], 2)))
-                    html_file.write('<td>{}</td>\n'.format(round(pss_change, 2)))
+                    html_file.write(format_time_span(series))
+                    for measurement in ('rss', 'pss'):
+                        first, last = series.first(measurement), series.last(measurement)
+                        html_file.write('<td>{}</td>\n'.format(round(first, 2)))
+                        html_file.write('<td>{}</td>\n'.format(round(last, 2)))
+                        html_file.write('<td>{}</td>\n'.format(round(last - first, 2)))
                     html_file.write('<td><a href=\'rawdata/{}-{}.csv\'>csv</a></td>\n'.format(
                         pid, ordered_name))
                     html_file.write('</tr>\n')
@@ -840,6 +864,14 @@ def generate_summary_html(directory, version_string, appliance_results, process_
     logger.info('Generated Summary html in: {}'.format(timediff))
 
 
+def format_time_span(series):
+    """Start time, end time and duration cells of a series, for the summary html"""
+    start = datetime.fromtimestamp(series.start)
+    end = datetime.fromtimestamp(series.end)
+    return '<td>{}</td>\n<td>{}</td>\n<td>{}</td>\n'.format(start.replace(microsecond=0),
+        end.replace(microsecond=0), str(end - start).partition('.')[0])
+
+
 def generate_workload_html(directory, ver, scenario_data, provider_names, grafana_urls):
     starttime = time.time()
     file_name = str(directory.join('workload.html'))
@@ -997,17 +1029,16 @@ def graph_appliance_measurements(graphs_path, ver, appliance_results, use_slab,
 
     starttime = time.time()
 
-    dates = appliance_results.keys()
-    total_memory_list = list(appliance_results[ts]['total'] for ts in appliance_results.keys())
-    free_memory_list = list(appliance_results[ts]['free'] for ts in appliance_results.keys())
-    used_memory_list = list(appliance_results[ts]['used'] for ts in appliance_results.keys())
-    buffers_memory_list = list(
-        appliance_results[ts]['buffers'] for ts in appliance_results.keys())
-    cache_memory_list = list(appliance_results[ts]['cached'] for ts in appliance_results.keys())
-    slab_memory_list = list(appliance_results[ts]['slab'] for ts in appliance_results.keys())
-    swap_total_list = list(appliance_results[ts]['swap_total'] for ts in
-        appliance_results.keys())
-    swap_free_list = list(appliance_results[ts]['swap_free'] for ts in appliance_results.keys())
+    dates = appliance_results.datetimes()
+    columns = appliance_results.columns()
+    total_memory_list = columns['total']
+    free_memory_list = columns['free']
+    used_memory_list = columns['used']
+    buffers_memory_list = columns['buffers']
+    cache_memory_list = columns['cached']
+    slab_memory_list = columns['slab']
+    swap_total_list = columns['swap_total']
+    swap_free_list = columns['swap_free']
 
     # Stack Plot Memory Usage
     file_name = graphs_path.join('{}-appliance_memory.png'.format(ver))
@@ -1079,7 +1110,7 @@ def graph_appliance_measurements(graphs_path, ver, appliance_results, use_slab,
     plt.xlabel('Date / Time')
     plt.ylabel('Swap (MiB)')
 
-    swap_used_list = [t - f for f, t in zip(swap_free_list, swap_total_list)]
+    swap_used_list = swap_total_list - swap_free_list
     y = [swap_used_list, swap_free_list]
     plt.stackplot(dates, *y, baseline='zero')
     ax.annotate(str(round(swap_total_list[0], 2)), xy=(dates[0], swap_total_list[0]),
@@ -1122,13 +1153,11 @@ def graph_all_miq_workers(graph_file_path, process_results, provider_names):
     plt.ylabel('Memory (MiB)')
     for process_name in process_results:
         if 'Worker' in process_name or 'Handler' in process_name or 'Catcher' in process_name:
-            for process_pid in process_results[process_name]:
-                dates = process_results[process_name][process_pid].keys()
-
-                rss_samples = list(process_results[process_name][process_pid][ts]['rss']
-                        for ts in process_results[process_name][process_pid].keys())
-                vss_samples = list(process_results[process_name][process_pid][ts]['vss']
-                        for ts in process_results[process_name][process_pid].keys())
+            for process_pid, series in process_results[process_name].items():
+                dates = series.datetimes()
+                columns = series.columns()
+                rss_samples = columns['rss']
+                vss_samples = columns['vss']
                 plt.plot(dates, rss_samples, linewidth=1, label='{} {} RSS'.format(process_pid,
                     process_name))
                 plt.plot(dates, vss_samples, linewidth=1, label='{} {} VSS'.format(
@@ -1154,21 +1183,17 @@ def graph_individual_process_measurements(graph_file_path, process_results, prov
 
     starttime = time.time()
     for process_name in process_results:
-        for process_pid in process_results[process_name]:
+        for process_pid, series in process_results[process_name].items():
 
             file_name = graph_file_path.join('{}-{}.png'.format(process_name, process_pid))
 
-            dates = process_results[process_name][process_pid].keys()
-            rss_samples = list(process_results[process_name][process_pid][ts]['rss']
-                    for ts in process_results[process_name][process_pid].keys())
-            pss_samples = list(process_results[process_name][process_pid][ts]['pss']
-                    for ts in process_results[process_name][process_pid].keys())
-            uss_samples = list(process_results[process_name][process_pid][ts]['uss']
-                    for ts in process_results[process_name][process_pid].keys())
-            vss_samples = list(process_results[process_name][process_pid][ts]['vss']
-                    for ts in process_results[process_name][process_pid].keys())
-            swap_samples = list(process_results[process_name][process_pid][ts]['swap']
-                    for ts in process_results[process_name][process_pid].keys())
+            dates = series.datetimes()
+            columns = series.columns()
+            rss_samples = columns['rss']
+            pss_samples = columns['pss']
+            uss_samples = columns['uss']
+            vss_samples = columns['vss']
+            swap_samples = columns['swap']
 
             fig, ax = plt.subplots()
             plt.title('Provider(s)/Size: {}\nProcess/Worker: {}\nPID: {}'.format(provider_names,
@@ -1181,27 +1206,27 @@ def graph_individual_process_measurements(graph_file_path, process_results, prov
             plt.plot(dates, vss_samples, linewidth=1, label='VSS')
             plt.plot(dates, swap_samples, linewidth=1, label='Swap')
 
-            if rss_samples:
+            if len(rss_samples):
                 ax.annotate(str(round(rss_samples[0], 2)), xy=(dates[0], rss_samples[0]),
                     xytext=(4, 4), textcoords='offset points')
                 ax.annotate(str(round(rss_samples[-1], 2)), xy=(dates[-1], rss_samples[-1]),
                     xytext=(4, -4), textcoords='offset points')
-            if pss_samples:
+            if len(pss_samples):
                 ax.annotate(str(round(pss_samples[0], 2)), xy=(dates[0], pss_samples[0]),
                     xytext=(4, 4), textcoords='offset points')
                 ax.annotate(str(round(pss_samples[-1], 2)), xy=(dates[-1], pss_samples[-1]),
                     xytext=(4, -4), textcoords='offset points')
-            if uss_samples:
+            if len(uss_samples):
                 ax.annotate(str(round(uss_samples[0], 2)), xy=(dates[0], uss_samples[0]),
                     xytext=(4, 4), textcoords='offset points')
                 ax.annotate(str(round(uss_samples[-1], 2)), xy=(dates[-1], uss_samples[-1]),
                     xytext=(4, -4), textcoords='offset points')
-            if vss_samples:
+            if len(vss_samples):
                 ax.annotate(str(round(vss_samples[0], 2)), xy=(dates[0], vss_samples[0]),
                     xytext=(4, 4), textcoords='offset points')
                 ax.annotate(str(round(vss_samples[-1], 2)), xy=(dates[-1], vss_samples[-1]),
                     xytext=(4, -4), textcoords='offset points')
-            if swap_samples:
+            if len(swap_samples):
                 ax.annotate(str(round(swap_samples[0], 2)), xy=(dates[0], swap_samples[0]),
                     xytext=(4, 4), textcoords='offset points')
                 ax.annotate(str(round(swap_samples[-1], 2)), xy=(dates[-1], swap_samples[-1]),
@@ -1242,45 +1267,40 @@ def graph_same_miq_workers(graph_file_path, process_results, provider_names):
             plt.xlabel('Date / Time')
             plt.ylabel('Memory (MiB)')
 
-            for process_pid in process_results[process_name]:
-                dates = process_results[process_name][process_pid].keys()
-
-                rss_samples = list(process_results[process_name][process_pid][ts]['rss']
-                        for ts in process_results[process_name][process_pid].keys())
-                pss_samples = list(process_results[process_name][process_pid][ts]['pss']
-                        for ts in process_results[process_name][process_pid].keys())
-                uss_samples = list(process_results[process_name][process_pid][ts]['uss']
-                        for ts in process_results[process_name][process_pid].keys())
-                vss_samples = list(process_results[process_name][process_pid][ts]['vss']
-                        for ts in process_results[process_name][process_pid].keys())
-                swap_samples = list(process_results[process_name][process_pid][ts]['swap']
-                        for ts in process_results[process_name][process_pid].keys())
+            for process_pid, series in process_results[process_name].items():
+                dates = series.datetimes()
+                columns = series.columns()
+                rss_samples = columns['rss']
+                pss_samples = columns['pss']
+                uss_samples = columns['uss']
+                vss_samples = columns['vss']
+                swap_samples = columns['swap']
                 plt.plot(dates, rss_samples, linewidth=1, label='{} RSS'.format(process_pid))
                 plt.plot(dates, pss_samples, linewidth=1, label='{} PSS'.format(process_pid))
                 plt.plot(dates, uss_samples, linewidth=1, label='{} USS'.format(process_pid))
                 plt.plot(dates, vss_samples, linewidth=1, label='{} VSS'.format(process_pid))
                 plt.plot(dates, swap_samples, linewidth=1, label='{} SWAP'.format(process_pid))
-                if rss_samples:
+                if len(rss_samples):
                     ax.annotate(str(round(rss_samples[0], 2)), xy=(dates[0], rss_samples[0]),
                         xytext=(4, 4), textcoords='offset points')
                     ax.annotate(str(round(rss_samples[-1], 2)), xy=(dates[-1],
                         rss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if pss_samples:
+                if len(pss_samples):
                     ax.annotate(str(round(pss_samples[0], 2)), xy=(dates[0],
                         pss_samples[0]), xytext=(4, 4), textcoords='offset points')
                     ax.annotate(str(round(pss_samples[-1], 2)), xy=(dates[-1],
                         pss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if uss_samples:
+                if len(uss_samples):
                     ax.annotate(str(round(uss_samples[0], 2)), xy=(dates[0],
                         uss_samples[0]), xytext=(4, 4), textcoords='offset points')
                     ax.annotate(str(round(uss_samples[-1], 2)), xy=(dates[-1],
                         uss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if vss_samples:
+                if len(vss_samples):
                     ax.annotate(str(round(vss_samples[0], 2)), xy=(dates[0],
                         vss_samples[0]), xytext=(4, 4), textcoords='offset points')
                     ax.annotate(str(round(vss_samples[-1], 2)), xy=(dates[-1],
                         vss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if swap_samples:
+                if len(swap_samples):
                     ax.annotate(str(round(swap_samples[0], 2)), xy=(dates[0],
                         swap_samples[0]), xytext=(4, 4), textcoords='offset points')
                     ax.annotate(str(round(swap_samples[-1], 2)), xy=(dates[-1],
@@ -1306,8 +1326,6 @@ def summary_csv_measurement_dump(csv_file, process_results, measurement):
     for ordered_name in process_order:
         if ordered_name in process_results:
             for process_pid in sorted(process_results[ordered_name]):
-                start = process_results[ordered_name][process_pid].keys()[0]
-                end = process_results[ordered_name][process_pid].keys()[-1]
+                series = process_results[ordered_name][process_pid]
                 csv_file.write('{},{},{},{}\n'.format(ordered_name, process_pid,
-                    round(process_results[ordered_name][process_pid][start][measurement], 2),
-                    round(process_results[ordered_name][process_pid][end][measurement], 2)))
+                    round(series.first(measurement), 2), round(series.last(measurement), 2)))
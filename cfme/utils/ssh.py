@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+import codecs
 import gevent
 import socket
 import sys
+import threading
+from gevent.pool import Pool
+from gevent.select import select
 from subprocess import check_call
 
 import attr
@@ -28,6 +32,13 @@ import six
 # in seconds (float)
 RUNCMD_TIMEOUT = 1200.0
 
+# Maximum number of bytes read from a channel at once
+READ_CHUNK_SIZE = 32768
+
+# Commands run concurrently by SSHClient.run_commands. sshd's default MaxSessions is 10 and the
+# transport is shared with other clients (and their sftp/scp channels), so leave room for them.
+MAX_CONCURRENT_COMMANDS = 5
+
 
 @attr.s(frozen=True)
 class SSHResult(object):
@@ -97,6 +108,58 @@ _ssh_pubkey_file = project_path.join('.generated_ssh_key.pub')
 _client_session = []
 
 
+class TransportPool(object):
+    """Transports shared by the clients connecting to the same host with the same credentials
+
+    Paramiko multiplexes any number of channels over a single transport, so instead of every
+    client opening its own connection, clients reuse an active transport of an equal client and
+    the transport is only closed once its last client is closed.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> transport
+        self._transports = {}
+        # id(transport) -> number of clients using it
+        self._users = {}
+
+    @staticmethod
+    def key(connect_kwargs):
+        return tuple(connect_kwargs.get(kwarg) for kwarg in (
+            'hostname', 'port', 'username', 'password', 'key_filename', 'pkey'))
+
+    def acquire(self, key):
+        """Active transport for ``key``, or ``None`` if the client has to connect itself"""
+        with self._lock:
+            transport = self._transports.get(key)
+            if transport is None or not transport.is_active():
+                return None
+            self._users[id(transport)] += 1
+            return transport
+
+    def add(self, key, transport):
+        """Register a newly connected transport of a client"""
+        with self._lock:
+            current = self._transports.get(key)
+            if current is None or not current.is_active():
+                self._transports[key] = transport
+            self._users[id(transport)] = self._users.get(id(transport), 0) + 1
+
+    def release(self, transport):
+        """Release a client's transport, returns whether other clients still use it"""
+        with self._lock:
+            users = self._users.pop(id(transport), 1) - 1
+            if users > 0:
+                self._users[id(transport)] = users
+                return True
+            for key, pooled in list(self._transports.items()):
+                if pooled is transport:
+                    del self._transports[key]
+            return False
+
+
+_transport_pool = TransportPool()
+
+
 class SSHClient(paramiko.SSHClient):
     """paramiko.SSHClient wrapper
 
@@ -111,10 +174,13 @@ class SSHClient(paramiko.SSHClient):
             app and ``container`` then specifies the name of the pod to interact with.
         stdout: If specified, overrides the system stdout file for streaming output.
         stderr: If specified, overrides the system stderr file for streaming output.
+        shared_transport: If True (default), the transport is shared with the other clients
+            connected to the same host with the same credentials, see :py:class:`TransportPool`
     """
     def __init__(self, stream_output=False, **connect_kwargs):
         super(SSHClient, self).__init__()
         self._streaming = stream_output
+        self._shared_transport = connect_kwargs.pop('shared_transport', True)
         # deprecated/useless karg, included for backward-compat
         self._keystate = connect_kwargs.pop('keystate', None)
         # Container is used to store both docker VM's container name and Openshift pod name.
@@ -204,6 +270,12 @@ class SSHClient(paramiko.SSHClient):
     def close(self):
         with diaper:
             _client_session.remove(self)
+        transport = getattr(self, '_transport', None)
+        if transport is not None and self._shared_transport and \
+                _transport_pool.release(transport):
+            # other clients still use the transport, just forget about it
+            self._transport = None
+            return
         super(SSHClient, self).close()
 
     @property
@@ -220,9 +292,21 @@ class SSHClient(paramiko.SSHClient):
 
         if not self.connected:
             self._connect_kwargs.update(kwargs)
-            self._check_port()
-            # Only install ssh keys if they aren't installed (or currently being installed)
-            conn = super(SSHClient, self).connect(**self._connect_kwargs)
+            if self._transport is not None and self._shared_transport:
+                # the transport went down, stop counting this client as one of its users
+                _transport_pool.release(self._transport)
+                self._transport = None
+            pool_key = TransportPool.key(self._connect_kwargs)
+            transport = _transport_pool.acquire(pool_key) if self._shared_transport else None
+            if transport is not None:
+                self._transport = transport
+                conn = None
+            else:
+                self._check_port()
+                # Only install ssh keys if they aren't installed (or currently being installed)
+                conn = super(SSHClient, self).connect(**self._connect_kwargs)
+                if self._shared_transport:
+                    _transport_pool.add(pool_key, self._transport)
         else:
             conn = None
 
@@ -261,7 +345,7 @@ class SSHClient(paramiko.SSHClient):
         return super(SSHClient, self).get_transport(*args, **kwargs)
 
     def run_command(self, command, timeout=RUNCMD_TIMEOUT, reraise=False, ensure_host=False,
-                    ensure_user=False, container=None):
+                    ensure_user=False, container=None, stdout_file=None):
         """Run a command over SSH.
 
         Args:
@@ -273,6 +357,9 @@ class SSHClient(paramiko.SSHClient):
             ensure_user: Ensure that the command is run as the user we logged in, so in case we are
                 not root, setting this to True will prevent from running sudo.
             container: allows to temporarily override default container
+            stdout_file: Binary file object the standard output is written to as it comes, instead
+                of being kept in the result, e.g. to download large command output. Not usable
+                with sudo, which needs a pseudo-tty mangling the output.
         Returns:
             A :py:class:`SSHResult` instance.
         """
@@ -281,13 +368,13 @@ class SSHClient(paramiko.SSHClient):
         try:
             with gevent.Timeout(timeout):
                 return self._run_command(command, timeout, reraise, ensure_host, ensure_user,
-                                         container)
+                                         container, stdout_file)
         except gevent.Timeout:
             logger.error("command %s couldn't finish in given timeout %s", command, timeout)
             raise
 
     def _run_command(self, command, timeout=RUNCMD_TIMEOUT, reraise=False, ensure_host=False,
-                     ensure_user=False, container=None):
+                     ensure_user=False, container=None, stdout_file=None):
         if isinstance(command, dict):
             command = VersionPicker(command).pick(self.vmdb_version)
         original_command = command
@@ -324,55 +411,54 @@ class SSHClient(paramiko.SSHClient):
                 session.settimeout(float(timeout))
 
             session.exec_command(command)
-            stdout = session.makefile()
-            stderr = session.makefile_stderr()
-
-            def write_output(line, file):
-                output.append(line)
-                if self._streaming:
-                    file.write(line)
-
+            stdout_decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            stderr_decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+            def write_output(data, decoder, file, final=False):
+                text = decoder.decode(data, final)
+                if text:
+                    output.append(text)
+                    if self._streaming:
+                        file.write(text)
+
+            # Read whatever output is available in chunks, so the remote side never blocks on a
+            # full buffer, and otherwise wait until the channel becomes readable. The channel's
+            # fileno is signalled by paramiko on new stdout/stderr data and on close, and gevent's
+            # select lets other greenlets (and the timeout watchdog) run meanwhile.
             while True:
-                if session.exit_status_ready():
-                    break
-                no_data = 0
-                # While the program is running loop through collecting line by line so that we don't
-                # fill the buffers up without a newline.
-                # Also, note that for long running programs if we try to read output when there
-                # is none (and in the case of stderr may never be any)
-                # we risk blocking so long that the write buffer on the remote side will fill
-                # and the remote program will block on a write.
-                # The blocking on our side occurs in paramiko's buffered_pipe.py's read() call,
-                # which will block if its internal buffer is empty.
+                got_data = False
                 if session.recv_ready():
-                    try:
-                        line = next(stdout)
-                        write_output(line, self.f_stdout)
-                    except StopIteration:
-                        pass
-                else:
-                    no_data += 1
-
+                    if stdout_file is None:
+                        write_output(session.recv(READ_CHUNK_SIZE), stdout_decoder, self.f_stdout)
+                    else:
+                        stdout_file.write(session.recv(READ_CHUNK_SIZE))
+                    got_data = True
                 if session.recv_stderr_ready():
-                    try:
-                        line = next(stderr)
-                        write_output(line, self.f_stderr)
-                    except StopIteration:
-                        pass
+                    write_output(
+                        session.recv_stderr(READ_CHUNK_SIZE), stderr_decoder, self.f_stderr)
+                    got_data = True
+                if got_data:
+                    continue
+                if session.eof_received and (session.exit_status_ready() or session.closed):
+                    break
+                select([session], [], [], 1.0)
+            # Data arriving together with the EOF between the checks above is still buffered,
+            # recv returns it without blocking once the EOF was received, and then nothing.
+            while True:
+                data = session.recv(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                if stdout_file is None:
+                    write_output(data, stdout_decoder, self.f_stdout)
                 else:
-                    no_data += 1
-
-                if no_data == 2:
-                    gevent.sleep(0.01)
-
-            # When the program finishes, we need to grab the rest of the output that is left.
-            # Also, we don't have the issue of blocking reads because since the command is
-            # finished, any pending reads of SSH encrypted data will finish shortly and put in
-            # the buffer or for an empty file EOF will be reached as it will be closed.
-            for line in stdout:
-                write_output(line, self.f_stdout)
-            for line in stderr:
-                write_output(line, self.f_stderr)
+                    stdout_file.write(data)
+            while True:
+                data = session.recv_stderr(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                write_output(data, stderr_decoder, self.f_stderr)
+            write_output(b'', stdout_decoder, self.f_stdout, final=True)
+            write_output(b'', stderr_decoder, self.f_stderr, final=True)
 
             exit_status = session.recv_exit_status()
             if exit_status != 0:
@@ -394,6 +480,25 @@ class SSHClient(paramiko.SSHClient):
         # Return whatever we have in the output
         return SSHResult(rc=1, output=''.join(output), command=command)
 
+    def run_commands(self, commands, timeout=RUNCMD_TIMEOUT, concurrency=MAX_CONCURRENT_COMMANDS,
+                     **kwargs):
+        """Run several commands concurrently, each one on its own channel of the transport.
+
+        Args:
+            commands: Iterable of commands, see :py:meth:`run_command`.
+            timeout: Timeout of each command.
+            concurrency: Maximum number of commands running at the same time, sshd refuses
+                more channels than its ``MaxSessions`` (10 by default) on the shared transport.
+            **kwargs: Passed to :py:meth:`run_command`.
+        Returns:
+            A list of :py:class:`SSHResult` instances, in the order of ``commands``.
+        """
+        # connect once, before the commands race for it
+        self.get_transport()
+        pool = Pool(concurrency)
+        return pool.map(
+            lambda command: self.run_command(command, timeout=timeout, **kwargs), commands)
+
     def cpu_spike(self, seconds=60, cpus=2, **kwargs):
         """Creates a CPU spike of specific length and processes.
 
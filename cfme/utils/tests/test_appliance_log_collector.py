@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Tests of :py:class:`cfme.test_framework.appliance_log_collector.ApplianceLogCollector`
+
+They run only when ``CFME_TEST_SSHD`` points to a local sshd accepting root logins, e.g.
+``root:secret@127.0.0.1:22``, the log files are created in a local temporary directory.
+"""
+import gzip
+import os
+
+import pytest
+
+from cfme.test_framework.appliance_log_collector import ApplianceLogCollector
+from cfme.utils.ssh import SSHClient
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class LocalAppliance(object):
+    def __init__(self, hostname, ssh_client):
+        self.hostname = hostname
+        self.ssh_client = ssh_client
+
+
+@pytest.fixture
+def local_appliances():
+    sshd = os.environ.get('CFME_TEST_SSHD')
+    if not sshd:
+        pytest.skip('CFME_TEST_SSHD is not set')
+    credentials, _, address = sshd.rpartition('@')
+    username, _, password = credentials.partition(':')
+    hostname, _, port = address.partition(':')
+    ssh_client = SSHClient(hostname=hostname, port=int(port or 22), username=username,
+                           password=password)
+    yield [LocalAppliance('appliance{}'.format(i), ssh_client) for i in range(3)]
+    ssh_client.close()
+
+
+def read(path):
+    with gzip.open(path.strpath) as f:
+        return f.read()
+
+
+def test_appliance_log_collector(local_appliances, tmpdir):
+    logs = tmpdir.mkdir('logs')
+    evm_log = logs.join('evm.log')
+    evm_log.write(''.join('line {}\n'.format(i) for i in range(10000)))
+    collector = ApplianceLogCollector(
+        [evm_log.strpath, logs.join('missing.log').strpath], tmpdir.join('collected'))
+
+    collected, written = collector.collect(local_appliances)
+    assert collected == 3 * evm_log.size()
+    assert 0 < written < collected
+    for appliance in local_appliances:
+        assert read(tmpdir.join('collected', appliance.hostname, 'evm.log.gz')) == \
+            evm_log.read_binary()
+
+    # only what was added since the mark goes to the test directory
+    collector.mark(local_appliances, name='test')
+    evm_log.write('test line\n', mode='a')
+    assert collector.collect(local_appliances, name='test')[0] == 3 * len('test line\n')
+    assert read(tmpdir.join('collected', 'appliance0', 'test', 'evm.log.gz')) == b'test line\n'
+    assert collector.collect(local_appliances, name='test') == (0, 0)
+    # the session collection has its own offsets
+    assert collector.collect(local_appliances)[0] == 3 * len('test line\n')
+    assert collector.collect(local_appliances) == (0, 0)
+
+    # a rotated log is collected whole, appended to what was collected before
+    evm_log.remove()
+    evm_log.write('rotated\n')
+    collector.collect(local_appliances)
+    assert read(tmpdir.join('collected', 'appliance1', 'evm.log.gz')).endswith(
+        b'line 9999\ntest line\nrotated\n')
+
+    # another run overwrites what was collected before
+    collector = ApplianceLogCollector([evm_log.strpath], tmpdir.join('collected'))
+    collector.collect(local_appliances)
+    assert read(tmpdir.join('collected', 'appliance2', 'evm.log.gz')) == b'rotated\n'
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from cfme.utils.blocker_cache import BlockerCache
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def cache_path(tmpdir):
+    return tmpdir.join('cache', 'blockers.pickle').strpath
+
+
+def test_blocker_cache_shared(cache_path):
+    master = BlockerCache(cache_path)
+    slave = BlockerCache(cache_path)
+    assert slave.get('BZ#1') is None
+    master.update({'BZ#1': {'id': 1}})
+    slave.update({'JIRA#FOO-1': 'Done'})
+    # both processes see what the other one stored
+    assert BlockerCache(cache_path).get('BZ#1') == {'id': 1}
+    assert 'JIRA#FOO-1' in BlockerCache(cache_path)
+    assert 'JIRA#FOO-2' not in BlockerCache(cache_path)
+
+
+def test_blocker_cache_ttl(cache_path, monkeypatch):
+    cache = BlockerCache(cache_path, ttl=10)
+    cache.update({'GH#foo/bar:1': 'open'})
+    later = time.time() + 11
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert 'GH#foo/bar:1' not in cache
+    assert 'GH#foo/bar:1' not in BlockerCache(cache_path, ttl=10)
+
+
+def test_blocker_cache_disabled(cache_path):
+    cache = BlockerCache(cache_path, ttl=0)
+    cache.update({'BZ#1': {'id': 1}})
+    assert 'BZ#1' not in cache
+    assert 'BZ#1' not in BlockerCache(cache_path)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Tests of the spare browsers of :py:class:`cfme.utils.browser.BrowserManager`"""
+import threading
+
+import pytest
+
+from cfme.utils.browser import BrowserManager
+from cfme.utils.wait import wait_for
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+URL = 'https://appliance.example.com'
+
+
+class FakeBrowser(object):
+    def __init__(self, url_key):
+        self.url_key = url_key
+        self.current_url = url_key
+        self.closed = False
+
+
+class FakeFactory(object):
+    def __init__(self, created):
+        self.created = created
+        self.lock = threading.Lock()
+
+    def spawn(self):
+        return FakeFactory(self.created)
+
+    def create(self, url_key):
+        browser = FakeBrowser(url_key)
+        with self.lock:
+            self.created.append(browser)
+        return browser
+
+    def close(self, browser):
+        if browser:
+            browser.closed = True
+
+
+@pytest.fixture
+def manager():
+    manager = BrowserManager(FakeFactory([]))
+    yield manager
+    manager.close_spares()
+    manager.quit()
+
+
+def wait_for_spares(manager, count):
+    wait_for(lambda: len(manager._spares) == count, num_sec=10, delay=0.05)
+
+
+def test_spare_is_handed_out(manager):
+    prepared = []
+    manager.keep_spares(1, url_key=URL, prepare=prepared.append)
+    wait_for_spares(manager, 1)
+    spare = manager._spares[0][1]
+    assert prepared == [spare]
+
+    assert manager.ensure_open(URL) is spare
+    # replenished in the background
+    wait_for_spares(manager, 1)
+    assert manager._spares[0][1] is not spare
+
+    manager.quit()
+    assert spare.closed
+
+
+def test_spares_of_other_url_are_not_used(manager):
+    manager.keep_spares(1, url_key=URL)
+    wait_for_spares(manager, 1)
+    spare = manager._spares[0][1]
+    other_url = 'https://other.example.com'
+    browser = manager.ensure_open(other_url)
+    assert browser is not spare
+    assert browser.url_key == other_url
+
+    manager.keep_spares(1, url_key=other_url)
+    assert spare.closed
+    wait_for_spares(manager, 1)
+
+
+def test_dead_spare_is_not_used(manager):
+    manager.keep_spares(1, url_key=URL)
+    wait_for_spares(manager, 1)
+    spare = manager._spares[0][1]
+    del spare.current_url
+    assert manager.ensure_open(URL) is not spare
+    assert spare.closed
+
+
+def test_close_spares(manager):
+    manager.keep_spares(2, url_key=URL)
+    wait_for_spares(manager, 2)
+    spares = [browser for _, browser in manager._spares]
+    manager.close_spares()
+    assert all(browser.closed for browser in spares)
+    assert manager._spares == []
@@ -0,0 +1,64 @@
+import pytest
+
+from cfme.fixtures.parallelizer.scheduler import (
+    CollectionOrderScheduler, DurationStore, LongestFirstScheduler, get_scheduler)
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+GROUPS = [
+    ['test_a.py::test_fast[prov1]'],
+    ['test_b.py::test_medium[prov1]', 'test_b.py::test_medium2[prov1]'],
+    ['test_c.py::test_slow[prov2]'],
+]
+
+
+@pytest.fixture
+def durations(tmpdir):
+    store = DurationStore(tmpdir.join('durations.json'))
+    store.update({
+        'test_a.py::test_fast[prov1]': 1.0,
+        'test_b.py::test_medium[prov1]': 5.0,
+        'test_b.py::test_medium2[prov1]': 5.0,
+        'test_c.py::test_slow[prov2]': 30.0,
+    })
+    return store
+
+
+def test_duration_store_roundtrip(durations):
+    durations.save()
+    loaded = DurationStore(durations.path).load()
+    assert loaded.durations == durations.durations
+    loaded.update({'test_c.py::test_slow[prov2]': 10.0})
+    assert loaded.get('test_c.py::test_slow[prov2]') == 20.0
+    # unknown tests are assumed to take the mean of the known ones
+    assert loaded.get('test_d.py::test_new') == loaded.default
+
+
+def test_duration_store_missing_file(tmpdir):
+    store = DurationStore(tmpdir.join('nonexistent.json')).load()
+    assert len(store) == 0
+    assert store.get('anything') > 0
+
+
+def test_collection_order_scheduler(durations):
+    scheduler = get_scheduler('collection', durations)
+    assert isinstance(scheduler, CollectionOrderScheduler)
+    assert scheduler.order(GROUPS) == GROUPS
+    assert scheduler.predicted_makespan(GROUPS, 1) == 41.0
+
+
+def test_longest_first_scheduler(durations):
+    scheduler = get_scheduler('duration', durations)
+    assert isinstance(scheduler, LongestFirstScheduler)
+    assert scheduler.order(GROUPS) == [GROUPS[2], GROUPS[1], GROUPS[0]]
+    assert scheduler.predicted_makespan(GROUPS, 2) == 30.0
+    # handing the slow group out last leaves one slave running alone
+    assert get_scheduler('collection', durations).predicted_makespan(GROUPS, 2) == 31.0
+
+
+def test_unknown_scheduler(durations):
+    with pytest.raises(ValueError):
+        get_scheduler('random', durations)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Tests of :py:meth:`cfme.utils.appliance.MiqApi.bulk_query` against a fake API"""
+import pytest
+
+from cfme.utils.appliance import MiqApi
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+HREF = 'https://appliance.example.com/api/vms'
+
+
+class FakeCollection(object):
+    _href = HREF
+
+
+class FakeCollections(object):
+    vms = FakeCollection()
+
+
+def fake_api(num_vms, totals=True):
+    """MiqApi answering queries of num_vms VMs, every other one named 'even-*'"""
+    vms = [{'id': str(i), 'name': '{}-{}'.format('even' if i % 2 == 0 else 'odd', i)}
+           for i in range(1, num_vms + 1)]
+    requests = []
+
+    def get(href, offset, limit, **params):
+        assert href == HREF
+        requests.append(offset)
+        matching = vms
+        if 'filter[]' in params:
+            matching = [vm for vm in vms if vm['name'].startswith('even')]
+        page = matching[offset:offset + limit]
+        result = {'name': 'vms', 'subcount': len(page), 'resources': page}
+        if totals:
+            result['count'] = len(vms)
+            if 'filter[]' in params:
+                result['subquery_count'] = len(matching)
+        return result
+
+    api = MiqApi.__new__(MiqApi)
+    api.collections = FakeCollections()
+    api.get = get
+    return api, requests
+
+
+@pytest.mark.parametrize('parallel', [1, 3])
+def test_bulk_query_pages(parallel):
+    api, requests = fake_api(2500)
+    resources = api.bulk_query('vms', page_size=1000, parallel=parallel)
+    assert [vm['id'] for vm in resources] == [str(i) for i in range(1, 2501)]
+    assert sorted(requests) == [0, 1000, 2000]
+
+
+def test_bulk_query_filtered_pages():
+    api, requests = fake_api(4500)
+    resources = api.bulk_query('vms', filters=['name=even-*'], page_size=1000)
+    assert len(resources) == 2250
+    assert all(vm['name'].startswith('even') for vm in resources)
+    assert requests == [0, 1000, 2000]
+
+
+def test_bulk_query_pages_without_totals():
+    api, requests = fake_api(2000, totals=False)
+    assert len(api.bulk_query('vms', page_size=1000)) == 2000
+    # the last page is empty, that tells there are no more
+    assert requests == [0, 1000, 2000]
@@ -0,0 +1,47 @@
+import pytest
+
+from cfme.utils.run_history import RunHistory, flakiness
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.fixture
+def history(tmpdir):
+    history = RunHistory(tmpdir.join('history.sqlite'))
+    yield history
+    history.close()
+
+
+def record_run(history, results):
+    run_id = history.start_run('5.10.0.1')
+    for nodeid, (outcome, call) in results.items():
+        history.record_test(run_id, nodeid, outcome, setup=1, call=call, teardown=1)
+    history.record_fixture(run_id, 'setup_provider', 'module', setup=5, teardown=1)
+    history.record_navigation(run_id, 'InfraProvider.Details', 'steps', duration=4)
+    history.record_navigation(run_id, 'InfraProvider.Details', 'direct', duration=1)
+    history.record_navigation(run_id, 'InfraProvider.Details', 'here', duration=0.1)
+    history.finish_run(run_id)
+
+
+def test_flakiness():
+    assert flakiness([]) == 0
+    assert flakiness(['passed', 'passed', 'passed']) == 0
+    assert flakiness(['passed', 'failed', 'passed']) == 1
+    assert flakiness(['passed', 'skipped', 'error', 'failed']) == 0.5
+
+
+def test_slowest_and_flakiest(history):
+    record_run(history, {'test_a': ('passed', 10), 'test_b': ('passed', 1)})
+    record_run(history, {'test_a': ('failed', 20), 'test_b': ('passed', 1)})
+    record_run(history, {'test_a': ('passed', 30), 'test_b': ('passed', 1)})
+
+    assert history.slowest_tests(limit=1) == [('test_a', 22.0, 3)]
+    assert history.slowest_tests(runs=1)[0] == ('test_a', 32.0, 1)
+    assert history.flakiest_tests() == [('test_a', 1.0, 3)]
+    assert history.slowest_fixtures() == [('setup_provider', 'module', 18.0, 6.0, 3)]
+    assert history.slowest_navigations() == [
+        ('InfraProvider.Details', 'steps', 12.0, 4.0, 3),
+        ('InfraProvider.Details', 'direct', 3.0, 1.0, 3)]
@@ -32,3 +32,12 @@ def test_scp_client_can_put_a_file(appliance, tmpdir):
     assert "content" in tmpfile.read()
     # Clean up the server
     appliance.ssh_client.run_command("rm -f /tmp/{}".format(tmpfile.basename))
+
+
+def test_ssh_client_run_commands(appliance):
+    # Commands run concurrently, results come back in order
+    results = appliance.ssh_client.run_commands(
+        ['sleep 1; echo {}'.format(i) for i in range(15)] + ['exit 3'])
+    assert [result.output.strip() for result in results[:-1]] == [str(i) for i in range(15)]
+    assert all(result.success for result in results[:-1])
+    assert results[-1].rc == 3
@@ -0,0 +1,39 @@
+import pytest
+
+from cfme.utils.timeseries import TimeSeries
+
+pytest.importorskip('numpy')
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+def fill(series, samples):
+    for i in range(samples):
+        series.append(1000.0 + 10 * i, {'rss': float(i), 'vss': 2.0 * i})
+
+
+@pytest.mark.parametrize('spill', [False, True], ids=['memory', 'spilled'])
+def test_timeseries(tmpdir, spill):
+    series = TimeSeries(['rss', 'vss'], spill_dir=str(tmpdir) if spill else None, chunk_size=4)
+    fill(series, 10)
+    assert len(series) == 10
+    assert len(tmpdir.listdir()) == (2 if spill else 0)
+    assert list(series.column('rss')) == [float(i) for i in range(10)]
+    assert list(series.timestamps) == [1000.0 + 10 * i for i in range(10)]
+    assert series.columns()['vss'].max() == 18.0
+    assert (series.start, series.end) == (1000.0, 1090.0)
+    assert (series.first('vss'), series.last('vss')) == (0.0, 18.0)
+    rows = list(series.rows())
+    assert len(rows) == 10
+    assert rows[3][1:] == (3.0, 6.0)
+
+
+def test_timeseries_empty():
+    series = TimeSeries(['rss'])
+    assert len(series) == 0
+    assert len(series.column('rss')) == 0
+    with pytest.raises(IndexError):
+        series.first('rss')
@@ -0,0 +1,143 @@
+"""Compact, appendable columnar time series backed by NumPy arrays
+
+Samples are stored column by column: one array of timestamps (seconds since the epoch) and one
+array of values per field, instead of one dict per sample. Full chunks can be spilled to ``.npy``
+files on disk and are memory mapped back when read, so long monitoring runs keep a bounded amount
+of samples in memory.
+
+Usage:
+
+.. code-block:: python
+
+    series = TimeSeries(['rss', 'vss'])
+    series.append(time.time(), {'rss': 120.5, 'vss': 800.0})
+    series.column('rss').max()
+    series.first('rss'), series.last('rss')
+
+"""
+import os
+from datetime import datetime
+
+#: Default number of samples kept in memory before a chunk is spilled (a day of 10s samples)
+CHUNK_SIZE = 8640
+
+
+class TimeSeries(object):
+    """Time series of float samples with a fixed set of fields
+
+    Args:
+        fields: names of the sampled values
+        spill_dir: directory full chunks are written to, if ``None`` everything stays in memory
+        name: file name prefix of the spilled chunks, must be unique within ``spill_dir``
+        chunk_size: number of samples kept in memory before spilling, or initial capacity
+            if not spilling
+    """
+    def __init__(self, fields, spill_dir=None, name='series', chunk_size=CHUNK_SIZE):
+        # Import here to allow perf to install numpy separately
+        import numpy
+        self._np = numpy
+        self.fields = list(fields)
+        self._index = {field: i for i, field in enumerate(self.fields)}
+        self.spill_dir = spill_dir
+        self.name = name
+        self.chunk_size = chunk_size
+        # row 0 holds the timestamps, the following rows the fields, in order
+        self._buffer = numpy.empty((len(self.fields) + 1, chunk_size))
+        self._length = 0
+        self._spilled = []
+        self._spilled_length = 0
+
+    def __len__(self):
+        return self._spilled_length + self._length
+
+    def append(self, timestamp, values):
+        """Append a sample
+
+        Args:
+            timestamp: seconds since the epoch, as returned by :py:func:`time.time`
+            values: dict of field values, every field has to be present
+        """
+        if self._length == self._buffer.shape[1]:
+            if self.spill_dir is None:
+                self._buffer = self._np.concatenate(
+                    [self._buffer, self._np.empty_like(self._buffer)], axis=1)
+            else:
+                self.spill()
+        column = self._buffer[:, self._length]
+        column[0] = timestamp
+        for field, i in self._index.items():
+            column[i + 1] = values[field]
+        self._length += 1
+
+    def spill(self):
+        """Write the samples held in memory to a new chunk file in ``spill_dir``"""
+        if not self._length:
+            return
+        path = os.path.join(
+            self.spill_dir, '{}-{}.npy'.format(self.name, len(self._spilled)))
+        self._np.save(path, self._buffer[:, :self._length])
+        self._spilled.append(path)
+        self._spilled_length += self._length
+        self._length = 0
+
+    def _data(self):
+        # all samples as a single (fields + 1, samples) array
+        current = self._buffer[:, :self._length]
+        if not self._spilled:
+            return current
+        chunks = [self._np.load(path, mmap_mode='r') for path in self._spilled]
+        return self._np.concatenate(chunks + [current], axis=1)
+
+    @property
+    def timestamps(self):
+        """Array of the sample timestamps"""
+        return self._data()[0]
+
+    def column(self, field):
+        """Array of the values of ``field``"""
+        return self._data()[self._index[field] + 1]
+
+    def columns(self):
+        """Dict of the value arrays of all fields, sharing a single read of the spilled chunks"""
+        data = self._data()
+        return {field: data[i + 1] for field, i in self._index.items()}
+
+    def datetimes(self):
+        """List of the sample timestamps as local :py:class:`datetime.datetime` objects"""
+        return [datetime.fromtimestamp(ts) for ts in self.timestamps]
+
+    @property
+    def start(self):
+        """Timestamp of the first sample"""
+        return self._value(0, 0)
+
+    @property
+    def end(self):
+        """Timestamp of the last sample"""
+        return self._value(0, len(self) - 1)
+
+    def first(self, field):
+        """First value of ``field``"""
+        return self._value(self._index[field] + 1, 0)
+
+    def last(self, field):
+        """Last value of ``field``"""
+        return self._value(self._index[field] + 1, len(self) - 1)
+
+    def _value(self, row, sample):
+        # single value lookup, without concatenating the spilled chunks
+        if not len(self):
+            raise IndexError('{} has no samples'.format(self.name))
+        if sample >= self._spilled_length:
+            return float(self._buffer[row, sample - self._spilled_length])
+        for path in self._spilled:
+            chunk = self._np.load(path, mmap_mode='r')
+            if sample < chunk.shape[1]:
+                return float(chunk[row, sample])
+            sample -= chunk.shape[1]
+
+    def rows(self):
+        """Iterate over ``(datetime, values...)`` tuples, values ordered like :py:attr:`fields`"""
+        data = self._data()
+        for i, ts in enumerate(data[0]):
+            yield (datetime.fromtimestamp(ts),) + tuple(float(v) for v in data[1:, i])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Benchmark for the evm.log parser used by the perf message statistics
+
+Generates a synthetic evm.log, mostly noise with queue messages (put, dequeued, delivered) and
+worker lifecycle lines sprinkled in, then parses it with
+:py:func:`cfme.utils.perf_message_stats.evm_to_messages_and_workers` sequentially and with
+several processes, and prints the parse times.
+
+Example usage:
+
+    scripts/evm_log_benchmark.py --lines 5000000 --processes 4
+
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from cfme.utils.perf_message_stats import evm_to_messages_and_workers
+
+LINE_PREFIX = '[----] I, [{ts} #{pid}:2b0d4c]  INFO -- : '
+NOISE = ('MIQ(ManageIQ::Providers::Vmware::InfraManager::Refresher#refresh) '
+         'EMS: [vsphere], id: [1] Refreshing targets for EMS...Complete')
+PUT = ('MIQ(MiqQueue.put) Message id: [{id}],  id: [], Zone: [default], Role: [ems_operations], '
+       'Server: [], Ident: [generic], Target id: [], Instance id: [{id}], Task id: [], '
+       'Command: [Vm.perf_capture_realtime], Timeout: [600], Priority: [100], State: [ready], '
+       'Deliver On: [], Data: [], Args: [["2018-11-26T10:00:00Z", "hourly"]]')
+GET = ('MIQ(MiqQueue.get_via_drb) Message id: [{id}], MiqWorker id: [12], Zone: [default], '
+       'Role: [ems_operations], Server: [], Ident: [generic], Target id: [], Instance id: [{id}], '
+       'Task id: [], Command: [Vm.perf_capture_realtime], Timeout: [600], Priority: [100], '
+       'State: [dequeue], Deliver On: [], Data: [], Args: [], Dequeued in: [1.5] seconds')
+DELIVERED = ('MIQ(MiqQueue.delivered) Message id: [{id}], State: [ok], '
+             'Delivered in [2.25] seconds')
+WORKER_START = ('MIQ(MiqGenericWorker) ID [{id}], PID [{pid}], GUID [abc], Zone [default], '
+                'Active Roles [automate], Assigned Roles [automate], Configuration:')
+WORKER_STOP = 'MIQ(MiqServer#stop_worker) Event: "evm_worker_stop" with ID: [{id}]'
+
+
+def generate_log(path, num_lines):
+    now = datetime(2018, 11, 26)
+    step = timedelta(milliseconds=10)
+    msg_id = 0
+    worker_id = 0
+    with open(path, 'w') as f:
+        for i in range(num_lines):
+            now += step
+            ts = now.strftime('%Y-%m-%dT%H:%M:%S.%f')
+            pid = random.randint(1000, 9999)
+            roll = i % 100
+            if roll == 0:
+                msg_id += 1
+                line = PUT.format(id=msg_id)
+            elif roll == 10 and msg_id:
+                line = GET.format(id=msg_id)
+            elif roll == 20 and msg_id:
+                line = DELIVERED.format(id=msg_id)
+            elif i % 50000 == 30:
+                worker_id += 1
+                line = WORKER_START.format(id=worker_id, pid=pid)
+            elif i % 50000 == 40050 and worker_id:
+                line = WORKER_STOP.format(id=worker_id)
+            else:
+                line = NOISE
+            f.write(LINE_PREFIX.format(ts=ts, pid=pid) + line + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=2000000, help='lines in the synthetic log')
+    parser.add_argument('--processes', type=int, default=4, help='processes for parallel parsing')
+    parser.add_argument('--log', default=None, help='parse this log instead of a synthetic one')
+    args = parser.parse_args()
+
+    if args.log:
+        path = args.log
+    else:
+        fd, path = tempfile.mkstemp(suffix='-evm.log')
+        os.close(fd)
+        start = time.time()
+        generate_log(path, args.lines)
+        print('generated {} lines ({} MB) in {:.1f}s'.format(
+            args.lines, os.path.getsize(path) // 2 ** 20, time.time() - start))
+    try:
+        for processes in sorted({1, args.processes}):
+            start = time.time()
+            (messages, _, _, _, line_count), workers = evm_to_messages_and_workers(
+                path, {}, processes)
+            elapsed = time.time() - start
+            print('{} process(es): {} lines, {} messages, {} workers in {:.1f}s '
+                  '({:.0f} lines/s)'.format(processes, line_count, len(messages),
+                                            len(workers[0]), elapsed, line_count / elapsed))
+    finally:
+        if not args.log:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
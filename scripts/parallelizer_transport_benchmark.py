@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""Micro-benchmark for the parallelizer event transport
+
+Simulates N slaves, each reporting M tests (a log start and setup/call/teardown reports per test)
+to a master, and prints the number of events per second the master handled. The ``legacy`` mode
+reproduces the previous protocol (REQ socket, JSON, one acknowledged round-trip per event) for
+comparison.
+
+Example usage:
+
+    scripts/parallelizer_transport_benchmark.py --slaves 8 --tests 2000
+
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import zmq
+
+from cfme.fixtures.parallelizer.transport import MasterChannel, SlaveChannel
+
+
+def fake_report(nodeid, when):
+    # roughly the shape and size of a serialized TestReport
+    return {
+        'nodeid': nodeid,
+        'location': ['cfme/tests/test_module.py', 42, 'test_something[provider]'],
+        'keywords': {'test_something[provider]': 1, 'test_module.py': 1, 'tier': 1},
+        'outcome': 'passed',
+        'longrepr': None,
+        'when': when,
+        'user_properties': [],
+        'sections': [],
+        'duration': 1.2345,
+    }
+
+
+def test_events(slaveid, num_tests):
+    for i in range(num_tests):
+        nodeid = 'cfme/tests/test_module.py::test_something[{}-{}]'.format(slaveid, i)
+        yield {'_event_name': 'runtest_logstart', 'nodeid': nodeid,
+               'location': ['cfme/tests/test_module.py', 42, 'test_something']}
+        for when in ('setup', 'call', 'teardown'):
+            yield {'_event_name': 'runtest_logreport', 'report': fake_report(nodeid, when)}
+
+
+def run_slave(slaveid, endpoint, num_tests, legacy):
+    if legacy:
+        sock = zmq.Context.instance().socket(zmq.REQ)
+        sock.setsockopt_string(zmq.IDENTITY, slaveid)
+        sock.connect(endpoint)
+        for event in test_events(slaveid, num_tests):
+            sock.send_json(event)
+            sock.recv_json()
+        sock.send_json({'_event_name': 'shutdown'})
+        sock.recv_json()
+    else:
+        channel = SlaveChannel(slaveid, endpoint)
+        for event in test_events(slaveid, num_tests):
+            channel.post(event, flush=event['_event_name'] == 'runtest_logstart' or
+                         event['report']['when'] == 'teardown')
+        channel.request({'_event_name': 'shutdown'})
+        channel.close()
+
+
+def run_master(endpoint, num_slaves, legacy):
+    """Handle events until all slaves shut down, returns the number of events handled"""
+    handled = 0
+    running = num_slaves
+    if legacy:
+        sock = zmq.Context.instance().socket(zmq.ROUTER)
+        sock.bind(endpoint)
+        while running:
+            if not zmq.zmq_poll([(sock, zmq.POLLIN)], 50):
+                continue
+            slaveid, _, event_json = sock.recv_multipart(flags=zmq.NOBLOCK)
+            event = json.loads(event_json)
+            if event['_event_name'] == 'shutdown':
+                running -= 1
+            handled += 1
+            sock.send_multipart([slaveid, b'', json.dumps('ack').encode('utf-8')])
+        sock.close()
+    else:
+        channel = MasterChannel(endpoint)
+        while running:
+            for slaveid, event in channel.recv():
+                if event['_event_name'] == 'shutdown':
+                    running -= 1
+                    channel.send(slaveid, 'ack')
+                handled += 1
+        channel.close()
+    return handled
+
+
+def benchmark(num_slaves, num_tests, legacy):
+    tmpdir = tempfile.mkdtemp()
+    endpoint = 'ipc://{}'.format(os.path.join(tmpdir, 'bench'))
+    slaves = [
+        multiprocessing.Process(
+            target=run_slave, args=('slave{:02d}'.format(i), endpoint, num_tests, legacy))
+        for i in range(num_slaves)]
+    try:
+        start = time.time()
+        for slave in slaves:
+            slave.start()
+        handled = run_master(endpoint, num_slaves, legacy)
+        elapsed = time.time() - start
+        for slave in slaves:
+            slave.join()
+    finally:
+        shutil.rmtree(tmpdir)
+    return handled, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slaves', type=int, default=8, help='number of simulated slaves')
+    parser.add_argument('--tests', type=int, default=1000, help='number of tests per slave')
+    parser.add_argument('--mode', choices=['both', 'batched', 'legacy'], default='both')
+    args = parser.parse_args()
+
+    modes = ['legacy', 'batched'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        handled, elapsed = benchmark(args.slaves, args.tests, mode == 'legacy')
+        print('{:>8}: {} events from {} slaves in {:.2f}s, {:.0f} events/s'.format(
+            mode, handled, args.slaves, elapsed, handled / elapsed))
+
+
+if __name__ == '__main__':
+    main()
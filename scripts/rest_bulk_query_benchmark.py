@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""Benchmark for :py:meth:`cfme.utils.appliance.MiqApi.bulk_query` against a stub REST server
+
+Starts a local stub of the ManageIQ REST API serving a ``vms`` collection (with paging, expanded
+resources, attributes and simple ``filter[]`` support, and a simulated latency per request),
+then maps every VM name to its id:
+
+- ``per-entity``: listing the VMs and getting each one by id, like the provider helpers used to;
+  only the first ``--per-entity-vms`` VMs are looked up and the total is extrapolated
+- ``bulk``: a single :py:meth:`bulk_query` with ``attributes=name``, sequential and with
+  parallel page fetches
+
+Example usage:
+
+    scripts/rest_bulk_query_benchmark.py --vms 10000 --latency 5
+
+"""
+import argparse
+import json
+import threading
+import time
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import parse_qs, urlparse
+
+from cfme.utils.appliance import MiqApi
+
+
+class StubApiServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, num_vms, latency):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubApiHandler)
+        self.latency = latency
+        self.requests = 0
+        self.url = 'http://127.0.0.1:{}/api'.format(self.server_address[1])
+        self.vms = [{
+            'id': str(i),
+            'href': '{}/vms/{}'.format(self.url, i),
+            'name': 'vm-{:05d}'.format(i),
+            'type': 'ManageIQ::Providers::Vmware::InfraManager::Vm',
+            'vendor': 'vmware',
+            'power_state': 'on',
+            'ems_id': '1',
+            'host_id': str(i % 50),
+            'guid': 'guid-{}'.format(i),
+        } for i in range(1, num_vms + 1)]
+
+    def matches(self, vm, filters):
+        for expression in filters:
+            attribute, _, value = expression.split(' ', 2)
+            if str(vm.get(attribute)) != value.strip('\'"'):
+                return False
+        return True
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.latency)
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        path = [step for step in url.path.split('/') if step]
+        if path == ['api']:
+            return self.send_json({
+                'name': 'API', 'version': '3.0', 'collections': [
+                    {'name': 'vms', 'href': '{}/vms'.format(server.url), 'description': 'VMs'}]})
+        if len(path) == 3:
+            return self.send_json(server.vms[int(path[2]) - 1])
+        vms = [vm for vm in server.vms if server.matches(vm, params.get('filter[]', []))]
+        offset = int(params.get('offset', ['0'])[0])
+        limit = int(params.get('limit', [str(len(vms))])[0])
+        page = vms[offset:offset + limit]
+        if 'expand' in params:
+            attributes = params.get('attributes', [''])[0].split(',')
+            if attributes != ['']:
+                keep = set(attributes) | {'id', 'href'}
+                page = [{k: v for k, v in vm.items() if k in keep} for vm in page]
+        else:
+            page = [{'href': vm['href']} for vm in page]
+        result = {'name': 'vms', 'count': len(server.vms), 'subcount': len(page),
+                  'resources': page}
+        if 'filter[]' in params:
+            result['subquery_count'] = len(vms)
+        self.send_json(result)
+
+
+def per_entity(api, limit):
+    """Map VM names to ids the way the provider helpers used to, for ``limit`` VMs"""
+    id_map = {}
+    for vm in api.collections.vms.all[:limit]:
+        id_map[api.collections.vms.get(id=vm.id).name] = vm.id
+    return id_map
+
+
+def bulk(api, parallel):
+    return {vm['name']: vm['id'] for vm in api.bulk_query('vms', attributes=['name'],
+                                                          parallel=parallel)}
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vms', type=int, default=10000, help='number of VMs in the stub')
+    parser.add_argument('--latency', type=float, default=5, help='milliseconds per request')
+    parser.add_argument('--per-entity-vms', type=int, default=200,
+                        help='number of VMs looked up one by one')
+    parser.add_argument('--parallel', type=int, default=4, help='pages fetched concurrently')
+    args = parser.parse_args()
+
+    server = StubApiServer(args.vms, args.latency / 1000.0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    api = MiqApi(server.url, ('admin', 'smartvm'), verify_ssl=False)
+
+    limit = min(args.per_entity_vms, args.vms)
+    runs = [('per-entity', lambda: per_entity(api, limit), args.vms / float(limit)),
+            ('bulk', lambda: bulk(api, 1), 1),
+            ('bulk x{}'.format(args.parallel), lambda: bulk(api, args.parallel), 1)]
+    for name, run, factor in runs:
+        server.requests = 0
+        start = time.time()
+        id_map = run()
+        elapsed = time.time() - start
+        print('{:>12}: {} VMs mapped with {} requests in {:.2f}s{}'.format(
+            name, len(id_map), server.requests, elapsed,
+            ', {:.1f}s extrapolated to {} VMs'.format(elapsed * factor, args.vms)
+            if factor != 1 else ''))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""Memory sampler pushed to and run on the appliance by the memory monitor
+
+Prints one JSON object per line every ``--interval`` seconds, until its output is closed:
+
+.. code-block:: json
+
+    {"timestamp": 1543226400.0,
+     "meminfo": {"MemTotal": 8010000, "MemFree": 1200000, ...},
+     "workers": {"1234": "MiqGenericWorker", ...},
+     "processes": {"1234": {"rss": 250000, "pss": 240000, "uss": 230000, "vss": 900000,
+                            "swap": 0, "name": "ruby", "cmd": "MIQ: MiqGenericWorker id: 1"},
+                   ...}}
+
+Memory values are in kB, like in ``/proc/meminfo`` and the ``smem`` output. Per process values
+are read from ``/proc/<pid>/smaps`` the same way ``smem`` computes them, but only for the
+processes named in ``--names`` and the workers of the server, and the workers are only queried
+from the database every ``--workers-interval`` seconds, to keep the sampler light.
+
+Only the standard library is used, so it runs with whatever python the appliance has.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SMAPS_FIELDS = {
+    'Size': 'vss',
+    'Rss': 'rss',
+    'Pss': 'pss',
+    'Private_Clean': 'uss',
+    'Private_Dirty': 'uss',
+    'Swap': 'swap',
+}
+
+
+def read_meminfo():
+    meminfo = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            meminfo[key.strip()] = int(value.split()[0])
+    return meminfo
+
+
+def read_workers(server_id):
+    if not server_id:
+        return {}
+    try:
+        output = subprocess.check_output([
+            'psql', '-t', '-q', '-A', '-F', '|', '-d', 'vmdb_production', '-c',
+            "select pid,type from miq_workers where miq_server_id = '{}'".format(server_id)])
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    workers = {}
+    for line in output.decode('utf-8').splitlines():
+        pid_worker = line.split('|')
+        if len(pid_worker) == 2 and pid_worker[0].strip():
+            workers[pid_worker[0].strip()] = pid_worker[1].strip()
+    return workers
+
+
+def read_process(pid):
+    proc = os.path.join('/proc', pid)
+    with open(os.path.join(proc, 'comm')) as f:
+        name = f.read().strip()
+    with open(os.path.join(proc, 'cmdline')) as f:
+        cmd = f.read().replace('\0', ' ').strip()
+    memory = {'rss': 0, 'pss': 0, 'uss': 0, 'vss': 0, 'swap': 0}
+    with open(os.path.join(proc, 'smaps')) as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            field = SMAPS_FIELDS.get(key)
+            if field:
+                memory[field] += int(value.split()[0])
+    memory['name'] = name
+    memory['cmd'] = cmd
+    return memory
+
+
+def read_processes(names, pids):
+    processes = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            if pid not in pids:
+                with open(os.path.join('/proc', pid, 'comm')) as f:
+                    if f.read().strip() not in names:
+                        continue
+            processes[pid] = read_process(pid)
+        except (IOError, OSError):
+            # the process exited meanwhile
+            continue
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interval', type=float, default=10, help='seconds between samples')
+    parser.add_argument('--server-id', default='', help='id of the miq server of the workers')
+    parser.add_argument('--workers-interval', type=float, default=10,
+                        help='seconds between queries of the server workers')
+    parser.add_argument('--names', default='ruby,httpd,postgres,postmaster,memcached,collectd',
+                        help='comma separated names of the processes to sample')
+    args = parser.parse_args()
+
+    names = set(args.names.split(','))
+    workers = {}
+    workers_time = 0
+    while True:
+        start = time.time()
+        if start - workers_time >= args.workers_interval:
+            workers = read_workers(args.server_id)
+            workers_time = start
+        sample = {
+            'timestamp': start,
+            'meminfo': read_meminfo(),
+            'workers': workers,
+            'processes': read_processes(names, workers),
+        }
+        try:
+            sys.stdout.write(json.dumps(sample) + '\n')
+            sys.stdout.flush()
+        except IOError:
+            # the monitor closed the channel
+            return
+        time.sleep(max(args.interval - (time.time() - start), 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Benchmark for running many small commands with :py:class:`cfme.utils.ssh.SSHClient`
+
+Runs the same command a number of times against an sshd (a local one by default) in three ways
+and prints the commands per second for each:
+
+- ``fresh``: a new client, and so a new connection, for every command
+- ``sequential``: one client, one command after the other
+- ``batch``: one client, :py:meth:`cfme.utils.ssh.SSHClient.run_commands`
+
+Example usage:
+
+    scripts/ssh_benchmark.py --username $USER --password secret --commands 200
+
+"""
+import argparse
+import time
+
+from cfme.utils.ssh import SSHClient
+
+
+def run_fresh(connect_kwargs, commands):
+    for command in commands:
+        client = SSHClient(shared_transport=False, **connect_kwargs)
+        client.run_command(command)
+        client.close()
+
+
+def run_sequential(connect_kwargs, commands):
+    client = SSHClient(shared_transport=False, **connect_kwargs)
+    for command in commands:
+        client.run_command(command)
+    client.close()
+
+
+def run_batch(connect_kwargs, commands):
+    client = SSHClient(shared_transport=False, **connect_kwargs)
+    client.run_commands(commands)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hostname', default='127.0.0.1', help='sshd to run the commands on')
+    parser.add_argument('--port', type=int, default=22)
+    parser.add_argument('--username', default='root')
+    parser.add_argument('--password', default=None)
+    parser.add_argument('--key-filename', default=None, help='private key to authenticate with')
+    parser.add_argument('--commands', type=int, default=100, help='number of commands to run')
+    parser.add_argument('--command', default='cat /proc/loadavg', help='command to run')
+    args = parser.parse_args()
+
+    connect_kwargs = {
+        'hostname': args.hostname,
+        'port': args.port,
+        'username': args.username,
+        'password': args.password,
+        'key_filename': args.key_filename,
+    }
+    commands = [args.command] * args.commands
+    for name, runner in [('fresh', run_fresh), ('sequential', run_sequential),
+                         ('batch', run_batch)]:
+        start = time.time()
+        runner(connect_kwargs, commands)
+        elapsed = time.time() - start
+        print('{:>10}: {} commands in {:.2f}s, {:.1f} commands/s'.format(
+            name, len(commands), elapsed, len(commands) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
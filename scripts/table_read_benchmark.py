@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""Benchmark of reading the ManageIQ summary and list tables against a static HTML fixture
+
+Writes a page with a summary table (including a rowspan field with tag images, like My Company
+Tags) and a list table into a temporary file, opens it in a local browser and reads the tables:
+
+- ``per-element``: the fields and cells one by one, each a browser round trip
+- ``snapshot``: :py:meth:`widgetastic_manageiq.SummaryTable.read` and
+  :py:meth:`widgetastic_manageiq.Table.read`, a single script per table
+
+Example usage:
+
+    scripts/table_read_benchmark.py --browser chrome --fields 60 --rows 200
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from selenium import webdriver
+from widgetastic.browser import Browser
+from widgetastic.widget import Table as VanillaTable
+from widgetastic.widget import View
+
+from widgetastic_manageiq import SummaryTable, Table
+
+PAGE = """<!DOCTYPE html>
+<html><body>
+<table class="table table-bordered table-striped table-summary-screen">
+  <thead><tr><th colspan="2" align="left">Properties</th></tr></thead>
+  <tbody>
+{fields}
+  </tbody>
+</table>
+<table id="list" class="table table-striped">
+  <thead><tr>{headers}</tr></thead>
+  <tbody>
+{rows}
+  </tbody>
+</table>
+</body></html>
+"""
+
+
+class BenchmarkView(View):
+    summary = SummaryTable(title="Properties")
+    table = Table('//table[@id="list"]')
+
+
+def write_page(num_fields, num_tags, num_rows, num_columns):
+    fields = [
+        '<tr><td class="label">Field {0}</td><td title="Value {0}">Value {0}</td></tr>'.format(i)
+        for i in range(num_fields)
+    ]
+    label = '<td class="label" rowspan="{}">My Company Tags</td>'.format(num_tags)
+    fields.extend(
+        '<tr>{}<td><img class="tag" alt="Tag" src="tag.png"> Category {} : Tag</td></tr>'.format(
+            label if i == 0 else "", i
+        )
+        for i in range(num_tags)
+    )
+    headers = "".join("<th>Column {}</th>".format(i) for i in range(num_columns))
+    rows = [
+        "<tr>{}</tr>".format(
+            "".join("<td>Cell {} {}</td>".format(row, column) for column in range(num_columns))
+        )
+        for row in range(num_rows)
+    ]
+    handle, path = tempfile.mkstemp(suffix=".html")
+    with os.fdopen(handle, "w") as f:
+        f.write(PAGE.format(fields="\n".join(fields), headers=headers, rows="\n".join(rows)))
+    return path
+
+
+def measure(name, func):
+    start = time.time()
+    result = func()
+    print("{:>12}: {:8.3f}s".format(name, time.time() - start))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--browser", choices=["chrome", "firefox"], default="chrome")
+    parser.add_argument("--fields", type=int, default=60, help="Number of summary fields")
+    parser.add_argument("--tags", type=int, default=10, help="Number of tags in the rowspan")
+    parser.add_argument("--rows", type=int, default=200, help="Number of list table rows")
+    parser.add_argument("--columns", type=int, default=8, help="Number of list table columns")
+    args = parser.parse_args()
+
+    path = write_page(args.fields, args.tags, args.rows, args.columns)
+    if args.browser == "chrome":
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        selenium = webdriver.Chrome(chrome_options=options)
+    else:
+        selenium = webdriver.Firefox()
+    try:
+        selenium.get("file://{}".format(path))
+        view = BenchmarkView(Browser(selenium))
+        summary, table = view.summary, view.table
+
+        print("Summary table, {} fields and {} tags".format(args.fields, args.tags))
+        expected = measure(
+            "per-element", lambda: {field: summary.get_text_of(field) for field in summary.fields}
+        )
+        result = measure("snapshot", summary.read)
+        assert result == expected, "The snapshot does not match the summary read by elements"
+
+        print("List table, {} rows and {} columns".format(args.rows, args.columns))
+        expected = measure("per-element", lambda: VanillaTable.read(table))
+        result = measure("snapshot", table.read)
+        assert result == expected, "The snapshot does not match the table read by elements"
+    finally:
+        selenium.quit()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,17 +7,23 @@ from celery.result import AsyncResult
 from datetime import datetime
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
+from django.db.models import Q
 from django.http import HttpResponse
 from django.shortcuts import render
 from ipware.ip import get_ip
 
 from appliances.models import (
-    Appliance, AppliancePool, Provider, Group, Template, User, GroupShepherd)
+    Appliance, AppliancePool, Provider, Group, Template, User, GroupShepherd,
+    api_cache_generation)
 from appliances.tasks import (
     appliance_power_on, appliance_power_off, appliance_suspend, appliance_rename,
     connect_direct_lun, disconnect_direct_lun, mark_appliance_ready, wait_appliance_ready)
+from sprout import redis
 from sprout.log import create_logger
 
+#: Seconds the responses of the cached methods are kept for, saving any Sprout object drops them
+API_CACHE_TTL = 10
+
 
 def json_response(data):
     return HttpResponse(json.dumps(data), content_type="application/json")
@@ -50,7 +56,7 @@ def json_success(result):
 
 
 class JSONMethod(object):
-    def __init__(self, method, auth=False):
+    def __init__(self, method, auth=False, cached=()):
         self._method = method
         if self._method.__doc__:
             try:
@@ -62,13 +68,28 @@ class JSONMethod(object):
         else:
             self._doc = ""
         self.auth = auth
+        self.cached = cached
 
     @property
     def __name__(self):
         return self._method.__name__
 
     def __call__(self, *args, **kwargs):
-        return self._method(*args, **kwargs)
+        if not self.cached:
+            return self._method(*args, **kwargs)
+        key_args = list(args)
+        if self.auth:
+            # users get what they are allowed to, so the user is part of the key
+            key_args[0] = key_args[0].id
+        key = 'api-{}-{}-{}'.format(
+            self.__name__, api_cache_generation(self.cached),
+            json.dumps([key_args, kwargs], sort_keys=True))
+        result = redis.client.get(key)
+        if result is not None:
+            return json.loads(result)
+        result = self._method(*args, **kwargs)
+        redis.client.set(key, json.dumps(result), ex=API_CACHE_TTL)
+        return result
 
     @property
     def description(self):
@@ -84,6 +105,7 @@ class JSONMethod(object):
             "defaults": defaults,
             "docstring": self._doc,
             "needs_authentication": self.auth,
+            "cached": bool(self.cached),
         }
 
 
@@ -97,6 +119,26 @@ class JSONApi(object):
     def authenticated_method(self, f):
         self._methods[f.__name__] = JSONMethod(f, auth=True)
 
+    def cached_method(self, *models):
+        """Registers a method whose results are cached for :py:data:`API_CACHE_TTL` seconds
+
+        Args:
+            models: the models the method reads, saving any of them drops the cached results
+        """
+        def register(f):
+            self._methods[f.__name__] = JSONMethod(f, cached=models)
+        return register
+
+    def cached_authenticated_method(self, *models):
+        """Registers an authenticated method whose results are cached per user
+
+        Args:
+            models: the models the method reads, saving any of them drops the cached results
+        """
+        def register(f):
+            self._methods[f.__name__] = JSONMethod(f, auth=True, cached=models)
+        return register
+
     def doc(self, request):
         return render(request, 'appliances/apidoc.html', {})
 
@@ -150,7 +192,7 @@ def jsonapi_doc(*args, **kwargs):
     return jsonapi.doc(*args, **kwargs)
 
 
-@jsonapi.method
+@jsonapi.cached_method(Template)
 def has_template(template_name, preconfigured):
     """Check if Sprout tracks a template with a particular name.
 
@@ -170,14 +212,14 @@ def has_template(template_name, preconfigured):
     return query.count() > 0
 
 
-@jsonapi.method
+@jsonapi.cached_method(Appliance, AppliancePool, Template)
 def list_appliances(used=False):
     """Returns list of appliances.
 
     Args:
         used: Whether to report used or unused appliances
     """
-    query = Appliance.objects
+    query = Appliance.objects.select_related('template')
     if used:
         query = query.exclude(appliance_pool__owner=None)
     else:
@@ -189,7 +231,7 @@ def list_appliances(used=False):
     return result
 
 
-@jsonapi.authenticated_method
+@jsonapi.cached_authenticated_method(Appliance, Group, Provider, Template)
 def num_shepherd_appliances(user, group, version=None, date=None, provider=None):
     """Provides number of currently available shepherd appliances."""
     group = Group.objects.get(id=group)
@@ -242,24 +284,36 @@ def request_appliances(
         ram, cpu, provider_type, template_type).id
 
 
-@jsonapi.authenticated_method
+@jsonapi.cached_authenticated_method(Appliance, AppliancePool, Template)
 def request_check(user, request_id):
     """Return status of the appliance pool"""
     request = AppliancePool.objects.get(id=request_id)
     if user != request.owner and not user.is_staff:
         raise Exception("This pool belongs to a different user!")
-    return {
-        "fulfilled": request.fulfilled,
-        "finished": request.finished,
-        "preconfigured": request.preconfigured,
-        "yum_update": request.yum_update,
-        "progress": int(round(request.percent_finished * 100)),
-        "appliances": [
-            appliance.serialized
-            for appliance
-            in request.appliances
-        ],
-    }
+    return request.check_data()
+
+
+@jsonapi.cached_authenticated_method(Appliance, AppliancePool, Template)
+def request_check_many(user, request_ids):
+    """Return statuses of many appliance pools at once, as a dict keyed by the pool ids
+
+    Pools which don't exist have ``None`` as their status.
+    """
+    request_ids = [int(request_id) for request_id in request_ids]
+    requests = list(AppliancePool.objects.filter(id__in=request_ids).select_related('owner'))
+    for request in requests:
+        if user != request.owner and not user.is_staff:
+            raise Exception("Pool {} belongs to a different user!".format(request.id))
+    appliances = {request.id: [] for request in requests}
+    for appliance in Appliance.objects\
+            .filter(appliance_pool__in=requests)\
+            .select_related('template')\
+            .order_by('id'):
+        appliances[appliance.appliance_pool_id].append(appliance)
+    result = {str(request_id): None for request_id in request_ids}
+    for request in requests:
+        result[str(request.id)] = request.check_data(appliances[request.id])
+    return result
 
 
 @jsonapi.authenticated_method
@@ -324,18 +378,18 @@ def set_number_free_appliances(user, group, n):
         return True
 
 
-@jsonapi.method
+@jsonapi.cached_method(Template)
 def available_cfme_versions(preconfigured=True):
     """Lists all versions that are available"""
     return Template.get_versions(preconfigured=preconfigured)
 
 
-@jsonapi.method
+@jsonapi.cached_method(Group)
 def available_groups():
     return map(lambda group: group.id, Group.objects.all())
 
 
-@jsonapi.method
+@jsonapi.cached_method(Provider)
 def available_providers():
     return map(lambda group: group.id, Provider.objects.all())
 
@@ -365,15 +419,20 @@ def get_appliance(appliance, user=None):
     if user is None:
         return appliance
     else:
-        if appliance.owner is None:
-            if not user.is_staff:
-                raise Exception("Only staff can operate with nonowned appliances")
-        elif appliance.owner != user:
-            raise Exception("This appliance belongs to a different user!")
-        return appliance
+        return check_appliance_owner(appliance, user)
 
 
-@jsonapi.authenticated_method
+def check_appliance_owner(appliance, user):
+    """Returns the appliance if the user can operate with it, raises an exception otherwise"""
+    if appliance.owner is None:
+        if not user.is_staff:
+            raise Exception("Only staff can operate with nonowned appliances")
+    elif appliance.owner != user:
+        raise Exception("This appliance belongs to a different user!")
+    return appliance
+
+
+@jsonapi.cached_authenticated_method(Appliance, AppliancePool, Template)
 def appliance_data(user, appliance):
     """Returns data about the appliance serialized as JSON.
 
@@ -383,6 +442,34 @@ def appliance_data(user, appliance):
     return appliance.serialized
 
 
+@jsonapi.cached_authenticated_method(Appliance, AppliancePool, Template)
+def appliances_data(user, appliances):
+    """Returns data about many appliances serialized as JSON, in the same order.
+
+    You can specify appliances by IP address, id or name.
+    """
+    ids, ip_addresses, names = set(), set(), set()
+    for appliance in appliances:
+        if isinstance(appliance, int):
+            ids.add(appliance)
+        elif re.match(r"^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$", appliance) is not None:
+            ip_addresses.add(appliance)
+        else:
+            names.add(appliance)
+    found = {}
+    for appliance in Appliance.objects\
+            .filter(Q(id__in=ids) | Q(ip_address__in=ip_addresses) | Q(name__in=names))\
+            .select_related('template', 'appliance_pool__owner'):
+        for key in (appliance.id, appliance.ip_address, appliance.name):
+            found.setdefault(key, appliance)
+    result = []
+    for appliance in appliances:
+        if appliance not in found:
+            raise Appliance.DoesNotExist("Appliance {} does not exist".format(appliance))
+        result.append(check_appliance_owner(found[appliance], user).serialized)
+    return result
+
+
 @jsonapi.authenticated_method
 def destroy_appliance(user, appliance):
     """Destroy the appliance. If the kill task was called, id is returned, otherwise None
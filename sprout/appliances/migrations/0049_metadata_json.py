@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+import yaml
+from django.db import migrations, models
+
+METADATA_MODELS = [
+    'appliance', 'appliancepool', 'delayedprovisiontask', 'group', 'groupshepherd', 'provider',
+    'template']
+
+
+def convert_metadata(apps, schema_editor, convert):
+    for model_name in METADATA_MODELS:
+        model = apps.get_model('appliances', model_name)
+        objects = model.objects.using(schema_editor.connection.alias)
+        for pk, data in objects.values_list('pk', 'object_meta_data').iterator():
+            converted = convert(data)
+            if converted != data:
+                objects.filter(pk=pk).update(object_meta_data=converted)
+
+
+def yaml_to_json(data):
+    # JSON can't store some of what YAML can, like dates, store their string representation then
+    return json.dumps(yaml.load(data) or {}, sort_keys=True, default=str)
+
+
+def json_to_yaml(data):
+    return yaml.safe_dump(json.loads(data))
+
+
+def metadata_to_json(apps, schema_editor):
+    convert_metadata(apps, schema_editor, yaml_to_json)
+
+
+def metadata_to_yaml(apps, schema_editor):
+    convert_metadata(apps, schema_editor, json_to_yaml)
+
+
+def alter_default(model_name):
+    return migrations.AlterField(
+        model_name=model_name,
+        name='object_meta_data',
+        field=models.TextField(default='{}'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliances', '0048_openshift_project_made_bigger'),
+    ]
+
+    operations = [alter_default(model_name) for model_name in METADATA_MODELS] + [
+        migrations.RunPython(metadata_to_json, metadata_to_yaml),
+    ]
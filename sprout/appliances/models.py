@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import base64
+import json
 import re
 import yaml
 import six
@@ -20,8 +21,8 @@ from datetime import timedelta, date
 from django.contrib.auth.models import User, Group as DjangoGroup
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
-from django.db.models import Q
-from django.db.models.signals import pre_save
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from json_field import JSONField
@@ -63,10 +64,63 @@ def apply_if_not_none(o, meth, *args, **kwargs):
     return getattr(o, meth)(*args, **kwargs)
 
 
+# How many objects bulk_update_fields updates with a single query
+BULK_UPDATE_BATCH_SIZE = 500
+
+
+def bulk_update_fields(model, changes, batch_size=BULK_UPDATE_BATCH_SIZE):
+    """Writes new values of some fields of many objects with a single query per batch.
+
+    Each field is set with a ``CASE`` over the primary keys, the objects which don't change it
+    keep their value.
+
+    Args:
+        model: model class of the objects
+        changes: dict of primary key: dict of field name: new value
+        batch_size: maximum number of objects updated by one query
+    """
+    pks = sorted(changes)
+    for i in range(0, len(pks), batch_size):
+        batch = pks[i:i + batch_size]
+        update = {}
+        for name in sorted({name for pk in batch for name in changes[pk]}):
+            field = model._meta.get_field(name)
+            update[name] = Case(
+                *[When(pk=pk, then=Value(changes[pk][name], output_field=field))
+                  for pk in batch if name in changes[pk]],
+                default=F(name), output_field=field)
+        model.objects.filter(pk__in=batch).update(**update)
+    if changes:
+        # updates don't send the post_save signal
+        transaction.on_commit(lambda: invalidate_api_cache(model))
+
+
+# Decoded metadata by their JSON, shared by all instances and kept for the process lifetime
+_decoded_metadata = {}
+_DECODED_METADATA_LIMIT = 1024
+
+
+def encode_metadata(metadata):
+    return json.dumps(metadata, sort_keys=True)
+
+
+def decode_metadata(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        # Stored by Sprout before the metadata were JSON
+        return yaml.load(data)
+
+
 class MetadataMixin(models.Model):
+    """Adds metadata, a JSON encoded dict stored in ``object_meta_data``.
+
+    The decoded metadata are cached, so they must not be modified in place. Use
+    :py:meth:`update_metadata` or :py:attr:`edit_metadata` to change them.
+    """
     class Meta:
         abstract = True
-    object_meta_data = models.TextField(default=yaml.dump({}))
+    object_meta_data = models.TextField(default=encode_metadata({}))
     created_on = models.DateTimeField(default=timezone.now, editable=False)
     modified_on = models.DateTimeField(default=timezone.now)
 
@@ -85,33 +139,44 @@ class MetadataMixin(models.Model):
         new_self = type(self).objects.get(pk=self.pk)
         self.__dict__.update(new_self.__dict__)
 
-    @property
-    @contextmanager
-    def metadata_lock(self):
-        with critical_section("metadata-({})[{}]".format(type(self).__name__, str(self.pk))):
-            yield
-
     @property
     def metadata(self):
-        return yaml.load(self.object_meta_data)
+        data = self.object_meta_data
+        metadata = _decoded_metadata.get(data)
+        if metadata is None:
+            if len(_decoded_metadata) >= _DECODED_METADATA_LIMIT:
+                _decoded_metadata.clear()
+            metadata = _decoded_metadata[data] = decode_metadata(data)
+        return metadata
 
     @metadata.setter
     def metadata(self, value):
         if not isinstance(value, dict):
             raise TypeError("You can store only dict in metadata!")
-        self.object_meta_data = yaml.dump(value)
+        self.object_meta_data = encode_metadata(value)
 
     @property
     @contextmanager
     def edit_metadata(self):
+        """Yields a copy of the current metadata to modify, stores it when the block ends.
+
+        Only the row of this object is locked and only the metadata are written, the other fields
+        of this object are not reloaded.
+        """
         with transaction.atomic():
-            with self.metadata_lock:
-                o = type(self).objects.get(pk=self.pk)
-                metadata = o.metadata
-                yield metadata
-                o.metadata = metadata
-                o.save()
-        self.reload()
+            o = type(self).objects.select_for_update().only(
+                'object_meta_data', 'modified_on').get(pk=self.pk)
+            metadata = decode_metadata(o.object_meta_data)
+            yield metadata
+            o.metadata = metadata
+            o.save(update_fields=['object_meta_data', 'modified_on'])
+        self.object_meta_data = o.object_meta_data
+        self.modified_on = o.modified_on
+
+    def update_metadata(self, **values):
+        """Sets the values of the metadata keys, keeping the other keys as they are stored now"""
+        with self.edit_metadata as metadata:
+            metadata.update(values)
 
     @property
     def logger(self):
@@ -202,35 +267,37 @@ class Provider(MetadataMixin):
         else:
             return get_mgmt(self.id)
 
+    @property
+    def capacity(self):
+        """:py:class:`ProviderCapacity` of this provider.
+
+        It comes from the snapshot attached by :py:meth:`ProviderCapacity.attach` if any, otherwise
+        it is counted now.
+        """
+        capacity = getattr(self, '_capacity', None)
+        if capacity is None:
+            capacity = ProviderCapacity.snapshot([self])[self.id]
+        return capacity
+
     @property
     def num_currently_provisioning(self):
-        return len(
-            Appliance.objects.filter(
-                ready=False, marked_for_deletion=False, template__provider=self, ip_address=None))
+        return self.capacity.num_currently_provisioning
 
     @property
     def num_templates_preparing(self):
-        return len(Template.objects.filter(provider=self, ready=False))
+        return self.capacity.num_templates_preparing
 
     @property
     def remaining_configuring_slots(self):
-        result = self.num_simultaneous_configuring - self.num_templates_preparing
-        if result < 0:
-            return 0
-        return result
+        return self.capacity.remaining_configuring_slots
 
     @property
     def remaining_appliance_slots(self):
-        if self.appliance_limit is None:
-            return 1
-        result = self.appliance_limit - self.num_currently_managing
-        if result < 0:
-            return 0
-        return result
+        return self.capacity.remaining_appliance_slots
 
     @property
     def num_currently_managing(self):
-        return len(Appliance.objects.filter(template__provider=self))
+        return self.capacity.num_currently_managing
 
     @property
     def currently_managed_appliances(self):
@@ -238,41 +305,24 @@ class Provider(MetadataMixin):
 
     @property
     def remaining_provisioning_slots(self):
-        result = self.num_simultaneous_provisioning - self.num_currently_provisioning
-        if result < 0:
-            return 0
-        # Take the appliance limit into account
-        if self.appliance_limit is None:
-            return result
-        else:
-            free_appl_slots = self.appliance_limit - self.num_currently_managing
-            if free_appl_slots < 0:
-                free_appl_slots = 0
-            return min(free_appl_slots, result)
+        return self.capacity.remaining_provisioning_slots
 
     @property
     def free(self):
-        return self.remaining_provisioning_slots > 0
+        return self.capacity.free
 
     @property
     def provisioning_load(self):
-        if self.num_simultaneous_provisioning == 0:
-            return 1.0  # prevent division by zero
-        return float(self.num_currently_provisioning) / float(self.num_simultaneous_provisioning)
+        return self.capacity.provisioning_load
 
     @property
     def appliance_load(self):
-        if self.appliance_limit is None or self.appliance_limit == 0:
-            return 0.0
-        return float(self.num_currently_managing) / float(self.appliance_limit)
+        return self.capacity.appliance_load
 
     @property
     def load(self):
         """Load for sorting"""
-        if self.appliance_limit is None:
-            return self.provisioning_load
-        else:
-            return self.appliance_load
+        return self.capacity.load
 
     @classmethod
     def get_available_provider_keys(cls):
@@ -314,8 +364,7 @@ class Provider(MetadataMixin):
 
     @templates.setter
     def templates(self, value):
-        with self.edit_metadata as metadata:
-            metadata["templates"] = value
+        self.update_metadata(templates=value)
 
     @property
     def template_name_length(self):
@@ -323,8 +372,7 @@ class Provider(MetadataMixin):
 
     @template_name_length.setter
     def template_name_length(self, value):
-        with self.edit_metadata as metadata:
-            metadata["template_name_length"] = value
+        self.update_metadata(template_name_length=value)
 
     @property
     def appliances_manage_this_provider(self):
@@ -332,8 +380,7 @@ class Provider(MetadataMixin):
 
     @appliances_manage_this_provider.setter
     def appliances_manage_this_provider(self, value):
-        with self.edit_metadata as metadata:
-            metadata["appliances_manage_this_provider"] = value
+        self.update_metadata(appliances_manage_this_provider=value)
 
     @property
     def g_appliances_manage_this_provider(self):
@@ -420,6 +467,156 @@ def disable_if_hidden(sender, instance, **kwargs):
         instance.disabled = True
 
 
+API_CACHE_GENERATION_KEY = 'api-cache-generation-{}'
+
+
+def api_cache_generation(models):
+    """Returns the current generations of the API response cache of the models, part of the keys
+
+    Every model has its own generation, so the responses cached for the methods reading only
+    rarely changing models (e.g. templates) survive the frequent changes of the appliances.
+    """
+    return tuple(
+        int(generation or 0) for generation in redis.client.mget(
+            [API_CACHE_GENERATION_KEY.format(model.__name__) for model in models]))
+
+
+def invalidate_api_cache(model):
+    """Makes the API stop using the responses cached until now which read the model"""
+    try:
+        redis.client.incr(API_CACHE_GENERATION_KEY.format(model.__name__))
+    except Exception as e:
+        # the cached responses expire soon anyway
+        create_logger(__name__).warning('Could not invalidate the API cache: {}'.format(e))
+
+
+@receiver([post_save, post_delete])
+def invalidate_api_cache_on_change(sender, instance, **kwargs):
+    if isinstance(instance, MetadataMixin):
+        # a response cached before the commit would still have the old data
+        transaction.on_commit(lambda: invalidate_api_cache(sender))
+
+
+class ProviderCapacity(object):
+    """Numbers of appliances and templates of a provider and the free slots they leave.
+
+    Use :py:meth:`snapshot` to count them for many providers with a single query, e.g. once per
+    shepherd run, instead of counting them for every provider and every template again.
+    """
+    def __init__(self, provider, num_currently_managing=0, num_currently_provisioning=0,
+                 num_templates_preparing=0):
+        self.provider = provider
+        self.num_currently_managing = num_currently_managing
+        self.num_currently_provisioning = num_currently_provisioning
+        self.num_templates_preparing = num_templates_preparing
+
+    @classmethod
+    def snapshot(cls, providers=None):
+        """Counts the appliances and templates of the providers with a single aggregated query.
+
+        Args:
+            providers: providers or their ids, all providers if not specified
+
+        Returns:
+            :py:class:`dict` of provider id: :py:class:`ProviderCapacity`, the providers loaded by
+            the query have their capacity attached already
+        """
+        queryset = Provider.objects.all()
+        if providers is not None:
+            queryset = queryset.filter(
+                id__in=[getattr(provider, 'id', provider) for provider in providers])
+        appliance = 'provider_templates__appliance'
+        queryset = queryset.annotate(
+            capacity_managing=Count(appliance, distinct=True),
+            capacity_provisioning=Count(
+                Case(When(then='{}__id'.format(appliance), **{
+                    '{}__ready'.format(appliance): False,
+                    '{}__marked_for_deletion'.format(appliance): False,
+                    '{}__ip_address__isnull'.format(appliance): True})),
+                distinct=True),
+            capacity_preparing=Count(
+                Case(When(provider_templates__ready=False, then='provider_templates__id')),
+                distinct=True))
+        result = {}
+        for provider in queryset:
+            provider._capacity = result[provider.id] = cls(
+                provider, provider.capacity_managing, provider.capacity_provisioning,
+                provider.capacity_preparing)
+        return result
+
+    @staticmethod
+    def attach(snapshot, providers):
+        """Makes the providers use the capacities of the snapshot instead of counting again.
+
+        The same :py:class:`ProviderCapacity` is shared by all the instances of a provider, so
+        :py:meth:`appliance_added` updates all of them.
+        """
+        for provider in providers:
+            capacity = snapshot.get(provider.id)
+            if capacity is not None:
+                provider._capacity = capacity
+
+    def appliance_added(self):
+        """Accounts for a new appliance being provisioned on the provider"""
+        self.num_currently_managing += 1
+        self.num_currently_provisioning += 1
+
+    @property
+    def remaining_configuring_slots(self):
+        result = self.provider.num_simultaneous_configuring - self.num_templates_preparing
+        if result < 0:
+            return 0
+        return result
+
+    @property
+    def remaining_appliance_slots(self):
+        if self.provider.appliance_limit is None:
+            return 1
+        result = self.provider.appliance_limit - self.num_currently_managing
+        if result < 0:
+            return 0
+        return result
+
+    @property
+    def remaining_provisioning_slots(self):
+        result = self.provider.num_simultaneous_provisioning - self.num_currently_provisioning
+        if result < 0:
+            return 0
+        # Take the appliance limit into account
+        if self.provider.appliance_limit is None:
+            return result
+        else:
+            free_appl_slots = self.provider.appliance_limit - self.num_currently_managing
+            if free_appl_slots < 0:
+                free_appl_slots = 0
+            return min(free_appl_slots, result)
+
+    @property
+    def free(self):
+        return self.remaining_provisioning_slots > 0
+
+    @property
+    def provisioning_load(self):
+        if self.provider.num_simultaneous_provisioning == 0:
+            return 1.0  # prevent division by zero
+        return (float(self.num_currently_provisioning) /
+                float(self.provider.num_simultaneous_provisioning))
+
+    @property
+    def appliance_load(self):
+        if self.provider.appliance_limit is None or self.provider.appliance_limit == 0:
+            return 0.0
+        return float(self.num_currently_managing) / float(self.provider.appliance_limit)
+
+    @property
+    def load(self):
+        """Load for sorting"""
+        if self.provider.appliance_limit is None:
+            return self.provisioning_load
+        else:
+            return self.appliance_load
+
+
 class Group(MetadataMixin):
     id = models.CharField(max_length=32, primary_key=True,
         help_text="Group name as trackerbot says. (eg. upstream, downstream-53z, ...)")
@@ -685,8 +882,7 @@ class Template(MetadataMixin):
 
     @temporary_name.setter
     def temporary_name(self, name):
-        with self.edit_metadata as metadata:
-            metadata["temporary_name"] = name
+        self.update_metadata(temporary_name=name)
 
     @temporary_name.deleter
     def temporary_name(self):
@@ -906,13 +1102,10 @@ class Appliance(MetadataMixin):
 
     @property
     def serialized(self):
-        try:
-            pool_id = self.appliance_pool.id
-        except AttributeError:
-            pool_id = None
+        """The appliance as a dict, only the template is needed from the related objects"""
         return dict(
             id=self.id,
-            pool_id=pool_id,
+            pool_id=self.appliance_pool_id,
             ready=self.ready,
             name=self.name,
             ip_address=self.ip_address,
@@ -924,12 +1117,12 @@ class Appliance(MetadataMixin):
             leased_until=apply_if_not_none(self.leased_until, "isoformat"),
             template_name=self.template.original_name,
             template_id=self.template.id,
-            provider=self.template.provider.id,
+            provider=self.template.provider_id,
             marked_for_deletion=self.marked_for_deletion,
             uuid=self.uuid,
             template_version=self.template.version,
             template_build_date=self.template.date.isoformat(),
-            template_group=self.template.template_group.id,
+            template_group=self.template.template_group_id,
             template_sprout_name=self.template.name,
             preconfigured=self.preconfigured,
             lun_disk_connected=self.lun_disk_connected,
@@ -1038,15 +1231,22 @@ class Appliance(MetadataMixin):
                 appliance.save()
                 self.logger.info("Status changed: {}".format(status))
 
+    def power_state_changes(self, power_state, now=None):
+        """Returns dict of the fields :py:meth:`set_power_state` changes and their new values"""
+        if power_state == self.power_state:
+            return {}
+        changes = {'power_state': power_state, 'power_state_changed': now or timezone.now()}
+        if power_state in self.RESET_SWAP_STATES:
+            # Reset some values
+            changes.update(swap=0, ssh_failed=False)
+        return changes
+
     def set_power_state(self, power_state):
-        if power_state != self.power_state:
+        changes = self.power_state_changes(power_state)
+        if changes:
             self.logger.info("Changed power state to {}".format(power_state))
-            self.power_state = power_state
-            self.power_state_changed = timezone.now()
-            if power_state in self.RESET_SWAP_STATES:
-                # Reset some values
-                self.swap = 0
-                self.ssh_failed = False
+            for name, value in changes.items():
+                setattr(self, name, value)
 
     def __unicode__(self):
         return "{} {} @ {}".format(type(self).__name__, self.name, self.template.provider.id)
@@ -1190,8 +1390,7 @@ class Appliance(MetadataMixin):
 
     @managed_providers.setter
     def managed_providers(self, value):
-        with self.edit_metadata as metadata:
-            metadata["managed_providers"] = value
+        self.update_metadata(managed_providers=value)
 
     @property
     def vnc_link(self):
@@ -1407,10 +1606,18 @@ class AppliancePool(MetadataMixin):
         else:
             return [t for t in q if t.provider.provider_type == self.provider_type]
 
+    @property
+    def possible_templates_with_capacity(self):
+        """:py:attr:`possible_templates` with the capacities of their providers counted at once"""
+        templates = self.possible_templates
+        providers = [tpl.provider for tpl in templates]
+        ProviderCapacity.attach(ProviderCapacity.snapshot(providers), providers)
+        return templates
+
     @property
     def possible_provisioning_templates(self):
         return sorted(
-            filter(lambda tpl: tpl.provider.free, self.possible_templates),
+            filter(lambda tpl: tpl.provider.free, self.possible_templates_with_capacity),
             # Sort by date and load to pick the best match (least loaded provider)
             key=lambda tpl: (tpl.date, 1.0 - tpl.provider.appliance_load), reverse=True)
 
@@ -1436,13 +1643,16 @@ class AppliancePool(MetadataMixin):
 
     @property
     def percent_finished(self):
+        return self._percent_finished(self.appliances)
+
+    def _percent_finished(self, appliances):
         if self.total_count is None:
             return 0.0
         total = 4 * self.total_count
         if total == 0:
             return 1.0
         finished = 0
-        for appliance in self.appliances:
+        for appliance in appliances:
             if appliance.power_state not in {Appliance.Power.UNKNOWN, Appliance.Power.ORPHANED}:
                 finished += 1
             if appliance.power_state == Appliance.Power.ON:
@@ -1460,11 +1670,32 @@ class AppliancePool(MetadataMixin):
     @property
     def fulfilled(self):
         try:
-            return (len(self.appliance_ips) == self.total_count and
-                    all(a.ready for a in self.appliances))
+            return self._fulfilled(self.appliances)
         except ObjectDoesNotExist:
             return False
 
+    def _fulfilled(self, appliances):
+        appliances = list(appliances)
+        return (len([a for a in appliances if a.ip_address is not None]) == self.total_count and
+                all(a.ready for a in appliances))
+
+    def check_data(self, appliances=None):
+        """Returns the state of the pool and its serialized appliances.
+
+        Args:
+            appliances: the appliances of the pool if they were fetched already, ordered by id
+        """
+        if appliances is None:
+            appliances = list(self.appliances)
+        return {
+            "fulfilled": self._fulfilled(appliances),
+            "finished": self.finished,
+            "preconfigured": self.preconfigured,
+            "yum_update": self.yum_update,
+            "progress": int(round(self._percent_finished(appliances) * 100)),
+            "appliances": [appliance.serialized for appliance in appliances],
+        }
+
     @property
     def broken_with_no_appliances(self):
         return (not self.finished) and self.age >= timedelta(days=1) and self.current_count == 0
@@ -1567,7 +1798,7 @@ class AppliancePool(MetadataMixin):
     @property
     def num_possible_appliance_slots(self):
         providers = set([])
-        for template in self.possible_templates:
+        for template in self.possible_templates_with_capacity:
             providers.add(template.provider)
         slots = 0
         for provider in providers:
@@ -28,8 +28,8 @@ from urllib2 import urlopen, HTTPError
 import socket
 
 from appliances.models import (
-    Provider, Group, Template, Appliance, AppliancePool, DelayedProvisionTask,
-    MismatchVersionMailer, User, GroupShepherd)
+    Provider, ProviderCapacity, Group, Template, Appliance, AppliancePool, DelayedProvisionTask,
+    MismatchVersionMailer, User, GroupShepherd, bulk_update_fields)
 from sprout import settings, redis
 from sprout.irc_bot import send_message
 from sprout.log import create_logger
@@ -465,7 +465,8 @@ def prepare_template_deploy(self, template_id):
         if template.vm_mgmt is None or not template.vm_mgmt.exists:
             template.set_status("Deploying the template.")
             provider_data = template.provider.provider_data
-            kwargs = provider_data["sprout"]
+            # a copy, the provider metadata are shared
+            kwargs = dict(provider_data["sprout"])
             kwargs["power_on"] = True
             if "datastore" not in kwargs and "allowed_datastore" in provider_data:
                 kwargs["datastore"] = provider_data["allowed_datastore"]
@@ -1278,29 +1279,49 @@ def refresh_appliances_provider(self, provider_id):
         dict_vms[vm.name] = vm
         if vm.uuid:
             uuid_vms[vm.uuid] = vm
-    for appliance in Appliance.objects.filter(template__provider=provider):
+    now = timezone.now()
+    changes = {}
+    unchanged = orphaned = 0
+    appliances = Appliance.objects.filter(template__provider=provider).only(
+        'id', 'name', 'uuid', 'ip_address', 'power_state', 'swap', 'ssh_failed')
+    for appliance in appliances:
         if appliance.uuid is not None and appliance.uuid in uuid_vms:
             vm = uuid_vms[appliance.uuid]
             # Using the UUID and change the name if it changed
-            appliance.name = vm.name
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.state, Appliance.Power.UNKNOWN))
-            appliance.save()
+            wanted = {'name': vm.name, 'ip_address': vm.ip}
         elif appliance.name in dict_vms:
             vm = dict_vms[appliance.name]
             # Using the name, and then retrieve uuid
-            appliance.uuid = vm.uuid
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.state, Appliance.Power.UNKNOWN))
-            appliance.save()
-            self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
-                appliance.id, appliance.name, appliance.uuid))
+            wanted = {'uuid': vm.uuid, 'ip_address': vm.ip}
+            if vm.uuid != appliance.uuid:
+                self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
+                    appliance.id, appliance.name, vm.uuid))
         else:
             # Orphaned :(
-            appliance.set_power_state(Appliance.Power.ORPHANED)
-            appliance.save()
+            vm = None
+            wanted = {}
+            orphaned += 1
+        appliance_changes = {
+            name: value for name, value in wanted.items() if getattr(appliance, name) != value}
+        power_state = (
+            Appliance.POWER_STATES_MAPPING.get(vm.state, Appliance.Power.UNKNOWN)
+            if vm is not None else Appliance.Power.ORPHANED)
+        power_state_changes = appliance.power_state_changes(power_state, now)
+        if power_state_changes:
+            Appliance.class_logger(appliance.id).info(
+                "Changed power state to {}".format(power_state))
+            appliance_changes.update(power_state_changes)
+        if appliance_changes:
+            appliance_changes['modified_on'] = now
+            changes[appliance.id] = appliance_changes
+        elif vm is not None:
+            unchanged += 1
+    # Only what changed is written, in batches
+    with transaction.atomic():
+        bulk_update_fields(Appliance, changes)
+    self.logger.info(
+        "Refreshed appliances in {}: {} changed, {} unchanged, {} orphaned".format(
+            provider_id, len(changes), unchanged, orphaned))
 
 
 @singleton_task()
@@ -1395,6 +1416,8 @@ def generic_shepherd(self, preconfigured):
     appliances. For each template group, it keeps the last template's appliances spinned up in
     required quantity. If new template comes out of the door, it automatically kills the older
     running template's appliances and spins up new ones. Sorts the groups by the fulfillment."""
+    # Count the appliances of all providers at once, updated with what gets provisioned below
+    capacities = ProviderCapacity.snapshot()
     for gs in sorted(
             GroupShepherd.objects.all(), key=lambda g: g.get_fulfillment_percentage(preconfigured)):
         prov_filter = {'provider__user_groups': gs.user_group}
@@ -1437,14 +1460,13 @@ def generic_shepherd(self, preconfigured):
         possible_templates = list(
             Template.objects.filter(
                 usable=True, ready=True, template_group=gs.template_group,
-                preconfigured=preconfigured, **filter_keep).all())
+                preconfigured=preconfigured, **filter_keep).select_related('provider'))
+        ProviderCapacity.attach(capacities, (tpl.provider for tpl in possible_templates))
         # If it can be deployed, it must exist
         possible_templates_for_provision = filter(lambda tpl: tpl.exists, possible_templates)
-        appliances = []
-        for template in possible_templates:
-            appliances.extend(
-                Appliance.objects.filter(
-                    template=template, appliance_pool=None, marked_for_deletion=False))
+        appliances = list(
+            Appliance.objects.filter(
+                template__in=possible_templates, appliance_pool=None, marked_for_deletion=False))
         # If we then want to delete some templates, better kill the eldest. status_changed
         # says which one was provisioned when, because nothing else then touches that field.
         appliances.sort(key=lambda appliance: appliance.status_changed)
@@ -1465,6 +1487,7 @@ def generic_shepherd(self, preconfigured):
                         template=chosen_template,
                         name=new_appliance_name)
                     appliance.save()
+                    chosen_template.provider.capacity.appliance_added()
                     self.logger.info(
                         "Adding an appliance to shepherd: {}/{}".format(appliance.id,
                                                                         appliance.name))
@@ -17,8 +17,8 @@ from django.shortcuts import render, redirect
 
 from appliances.api import json_response
 from appliances.models import (
-    Provider, AppliancePool, Appliance, Group, Template, MismatchVersionMailer, User, BugQuery,
-    GroupShepherd)
+    Provider, ProviderCapacity, AppliancePool, Appliance, Group, Template, MismatchVersionMailer,
+    User, BugQuery, GroupShepherd)
 from appliances.tasks import (appliance_power_on, appliance_power_off, appliance_suspend,
     anyvm_power_on, anyvm_power_off, anyvm_suspend, anyvm_delete, delete_template_from_provider,
     appliance_rename, wait_appliance_ready, mark_appliance_ready, appliance_reboot,
@@ -101,6 +101,8 @@ def providers(request, provider_id=None):
             messages.warning(request, "Provider '{}' does not exist.".format(provider_id))
             return redirect("providers")
     providers = Provider.objects.filter(hidden=False, **user_filter).order_by("id").distinct()
+    # the numbers of the provider are shown several times, count them once
+    ProviderCapacity.attach(ProviderCapacity.snapshot([provider]), [provider])
     return render(request, 'appliances/providers.html', locals())
 
 
@@ -322,6 +324,7 @@ def providers_for_date_group_and_version(request):
             providers = Template.objects.filter(**filters).values("provider").distinct()
             providers = sorted([p.values()[0] for p in providers])
             providers = list(Provider.objects.filter(id__in=providers))
+            ProviderCapacity.attach(ProviderCapacity.snapshot(providers), providers)
             if provider_type is None:
                 providers = list(providers)
             else:
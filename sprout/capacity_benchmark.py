@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Benchmark of counting the provider capacities the way the shepherd does
+
+Creates a temporary SQLite database with the Sprout schema, seeds it with providers, templates
+and appliances, then evaluates ``free`` and ``appliance_load`` of the provider of every template,
+like :py:func:`appliances.tasks.generic_shepherd` and pool fulfillment do:
+
+- ``per-template``: counting the appliances of the provider again for every template, with
+  ``len()`` of the querysets as it used to be done
+- ``snapshot``: a single :py:meth:`appliances.models.ProviderCapacity.snapshot` query
+
+Example usage, from the sprout directory:
+
+    ./capacity_benchmark.py --providers 40 --templates 25 --appliances 800
+
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sprout.settings")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_database(path):
+    from django.conf import settings
+    settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def seed(num_providers, num_templates, num_appliances):
+    from appliances.models import Appliance, Group, Provider, Template
+    group = Group.objects.create(id='benchmark')
+    providers = [
+        Provider.objects.create(id='provider{:03d}'.format(i), working=True,
+                                appliance_limit=random.choice([None, 20, 50]))
+        for i in range(num_providers)]
+    Template.objects.bulk_create([
+        Template(provider=provider, template_group=group, date=date.today(),
+                 original_name='template{}'.format(i), name='template{}'.format(i),
+                 ready=random.random() > 0.1, usable=True)
+        for provider in providers for i in range(num_templates)])
+    templates = list(Template.objects.all())
+    Appliance.objects.bulk_create([
+        Appliance(template=random.choice(templates), name='appliance{}'.format(i),
+                  ready=random.random() > 0.2, marked_for_deletion=random.random() < 0.05,
+                  ip_address=None if random.random() < 0.3 else '10.0.0.1')
+        for i in range(num_appliances)])
+    return templates
+
+
+def per_template(templates):
+    """The counting as it was before the capacity snapshot"""
+    from appliances.models import Appliance
+    result = []
+    for template in templates:
+        provider = template.provider
+        provisioning = len(Appliance.objects.filter(
+            ready=False, marked_for_deletion=False, template__provider=provider, ip_address=None))
+        managing = len(Appliance.objects.filter(template__provider=provider))
+        free = provider.num_simultaneous_provisioning - provisioning > 0 and (
+            provider.appliance_limit is None or provider.appliance_limit - managing > 0)
+        managing = len(Appliance.objects.filter(template__provider=provider))
+        load = float(managing) / provider.appliance_limit if provider.appliance_limit else 0.0
+        result.append((free, load))
+    return result
+
+
+def snapshot(templates):
+    from appliances.models import ProviderCapacity
+    providers = [template.provider for template in templates]
+    ProviderCapacity.attach(ProviderCapacity.snapshot(), providers)
+    return [(provider.free, provider.appliance_load) for provider in providers]
+
+
+def measure(name, func, templates):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    with CaptureQueriesContext(connection) as queries:
+        start = time.time()
+        result = func(templates)
+        elapsed = time.time() - start
+    print('{:>12}: {:8.3f}s {:6d} queries'.format(name, elapsed, len(queries)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--providers', type=int, default=40, help='Number of providers')
+    parser.add_argument('--templates', type=int, default=25,
+                        help='Number of templates per provider')
+    parser.add_argument('--appliances', type=int, default=800, help='Number of appliances')
+    args = parser.parse_args()
+
+    handle, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(handle)
+    try:
+        setup_database(path)
+        from appliances.models import Template
+        seed(args.providers, args.templates, args.appliances)
+        templates = list(Template.objects.select_related('provider'))
+        print('{} providers, {} templates, {} appliances'.format(
+            args.providers, len(templates), args.appliances))
+        expected = measure('per-template', per_template, templates)
+        result = measure('snapshot', snapshot, templates)
+        assert result == expected, 'The snapshot does not match the counting per template'
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ import re
 from collections import namedtuple
 from datetime import date, datetime, timedelta
 from tempfile import NamedTemporaryFile
+from uuid import uuid4
 
 import six
 from cached_property import cached_property
@@ -23,6 +24,7 @@ from widgetastic.utils import (
     attributize_string,
     VersionPick,
     Version,
+    normalize_space,
     partial_match,
 )
 from widgetastic.widget import (
@@ -388,6 +390,83 @@ class BootstrapSwitchSelect(View):
 
 
 # ManageIQ table objects definition
+#: Reads the headers and all the cells of a table at once, arguments: table, HEADERS, ROWS
+TABLE_SNAPSHOT_SCRIPT = jsmin(
+    """
+    function evaluate(xpath, node) {
+        var result = document.evaluate(
+            xpath, node, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        var nodes = [];
+        for (var i = 0; i < result.snapshotLength; i++) {
+            nodes.push(result.snapshotItem(i));
+        }
+        return nodes;
+    }
+
+    function children(node, tags) {
+        var nodes = [];
+        for (var i = 0; i < node.children.length; i++) {
+            if (tags.indexOf(node.children[i].tagName.toLowerCase()) >= 0) {
+                nodes.push(node.children[i]);
+            }
+        }
+        return nodes;
+    }
+
+    function text(node) {
+        return node.innerText || node.textContent || "";
+    }
+
+    return {
+        headers: evaluate(arguments[1], arguments[0]).map(text),
+        rows: evaluate(arguments[2], arguments[0]).map(function(row) {
+            return children(row, ["td"]).map(function(cell) {
+                return {
+                    text: text(cell),
+                    "class": cell.getAttribute("class"),
+                    rowspan: cell.getAttribute("rowspan"),
+                    colspan: cell.getAttribute("colspan"),
+                    images: children(cell, ["i", "img"]).map(function(image) {
+                        return {
+                            "class": image.getAttribute("class"),
+                            alt: image.getAttribute("alt"),
+                            title: image.getAttribute("title"),
+                            src: image.src || image.getAttribute("src")
+                        };
+                    })
+                };
+            });
+        })
+    };
+    """
+)
+
+
+def read_table_snapshot(table):
+    """Reads the headers and the cells of the table with a single script.
+
+    Reading the table element by element takes a browser round trip for every row and cell, the
+    snapshot takes one for the whole table.
+
+    Args:
+        table: The table widget, its ``HEADERS`` and ``ROWS`` locators are used
+
+    Returns:
+        A :py:class:`dict` with ``headers`` (list of texts) and ``rows`` (list of lists of cells,
+        each a dict with ``text``, ``class``, ``rowspan``, ``colspan`` and ``images``, a list of
+        dicts with ``class``, ``alt``, ``title`` and ``src`` of the ``i`` and ``img`` children)
+        or ``None`` if the script failed.
+    """
+    try:
+        return table.browser.execute_script(
+            TABLE_SNAPSHOT_SCRIPT, table.browser.element(table), table.HEADERS, table.ROWS,
+            silent=True
+        )
+    except (WebDriverException, NoSuchElementException) as e:
+        table.logger.warning("Could not read a snapshot of the table, reading by elements: %s", e)
+        return None
+
+
 class TableColumn(VanillaTableColumn):
     @property
     def checkbox(self):
@@ -524,6 +603,32 @@ class Table(VanillaTable):
             self.click_sort(column)
             self.logger.debug("sort_by(%r, %r): order already selected", column, order)
 
+    def read(self):
+        """Reads the table with a single script, see :py:func:`read_table_snapshot`.
+
+        Tables with column widgets, assoc_column or spanning cells are read element by element.
+        """
+        if self.column_widgets or self.assoc_column is not None:
+            return VanillaTable.read(self)
+        snapshot = read_table_snapshot(self)
+        if snapshot is None:
+            return VanillaTable.read(self)
+        headers = [normalize_space(header) or None for header in snapshot["headers"]]
+        rows = snapshot["rows"]
+        if any(
+            len(cells) < len(headers) or any(cell["rowspan"] or cell["colspan"] for cell in cells)
+            for cells in rows
+        ):
+            return VanillaTable.read(self)
+        if self.rows_ignore_top is not None:
+            rows = rows[self.rows_ignore_top:]
+        if self.rows_ignore_bottom is not None and self.rows_ignore_bottom > 0:
+            rows = rows[:-self.rows_ignore_bottom]
+        return [
+            {header or i: normalize_space(cells[i]["text"]) for i, header in enumerate(headers)}
+            for cells in rows
+        ]
+
 
 class SummaryTable(VanillaTable):
     """Table used in Provider, VM, Host, ... summaries.
@@ -577,8 +682,9 @@ class SummaryTable(VanillaTable):
                 rowspan_child_class = rowspan_image_element.get_attribute("alt")
             multiple_fields = self.browser.elements(
                 "./tbody//*[self::i or self::img][contains(@class|@alt, {})]/parent::td".format(
-                    quote(rowspan_child_class), self
-                )
+                    quote(rowspan_child_class)
+                ),
+                parent=self,
             )
             return multiple_fields
 
@@ -625,7 +731,35 @@ class SummaryTable(VanillaTable):
         """
         return self.get_field(field_name)[1].click()
 
+    def _snapshot_text_of(self, rows, field_name):
+        """Same as :py:meth:`get_text_of`, from the rows of a :py:func:`read_table_snapshot`."""
+        for cells in rows:
+            if cells and normalize_space(cells[0]["text"]) == field_name:
+                break
+        else:
+            raise NameError("Could not find field with name {!r}".format(field_name))
+        if not cells[0]["rowspan"]:
+            return normalize_space(cells[1]["text"])
+        image = cells[1]["images"][0]
+        marker = image["class"] or image["alt"]
+        return [
+            cell["text"].strip()
+            for row in rows
+            for cell in row
+            if any(marker in (image["class"] or image["alt"] or "") for image in cell["images"])
+        ]
+
     def read(self):
+        snapshot = read_table_snapshot(self)
+        if snapshot is not None:
+            rows = snapshot["rows"]
+            fields = [
+                normalize_space(cells[0]["text"]) for cells in rows if cells and cells[0]["class"]
+            ]
+            try:
+                return {field: self._snapshot_text_of(rows, field) for field in fields}
+            except (IndexError, NameError):
+                self.logger.warning("Unexpected layout of the table snapshot, reading by elements")
         return {field: self.get_text_of(field) for field in self.fields}
 
 
@@ -1634,10 +1768,12 @@ class PaginationPane(View, ReportDataControllerMixin):
                 self.logger.debug("Resetting paginator to first page")
                 self.first_page()
 
+            # every query is a JS call, ask for the amount of pages only once
+            pages_amount = self.pages_amount
             # Adding 1 to pages_amount to include the last page in loop
-            for page in range(1, self.pages_amount + 1):
-                yield self.cur_page
-                if self.cur_page == self.pages_amount:
+            for page in range(1, pages_amount + 1):
+                yield page
+                if page == pages_amount:
                     # last or only page, stop looping
                     break
                 else:
@@ -2840,6 +2976,11 @@ class EntitiesConditionalView(View, ReportDataControllerMixin):
     search = View.nested(Search)
     paginator = PaginationPane()
 
+    #: Items per page the paginator is switched to when reading the entities of all pages
+    SNAPSHOT_ITEMS_PER_PAGE = 1000
+    #: Global JS variable marking the page the entities snapshot was read on
+    SNAPSHOT_TOKEN = "ManageIQ.qe.entitiesSnapshot"
+
     @property
     def _current_page_elements(self):
         elements = []
@@ -2861,6 +3002,98 @@ class EntitiesConditionalView(View, ReportDataControllerMixin):
                 elements.append({"name": name, "entity_id": entity["item"]["id"]})
         return elements
 
+    def _entities_snapshot(self, refresh=False):
+        """Reads the elements of all pages at once with the JS API.
+
+        The paginator is switched to :py:attr:`SNAPSHOT_ITEMS_PER_PAGE` items per page, so mostly
+        a single page is read, and back afterwards, as ManageIQ keeps the setting for the user.
+        The ``page`` of the elements is the one they are on with the user's setting.
+
+        The elements are cached until the page is loaded again, which is detected by a token
+        stored in the window, or the total number of items changes. An AJAX reload of just the
+        entities keeps the token, so the cached elements are only good for finding an entity
+        whose presence is checked afterwards.
+
+        Args:
+            refresh: Read the elements again even if the cached ones are still valid
+
+        Returns:
+            A tuple of the list of elements, each with the ``page`` it is on, and whether they were
+            cached, or ``None`` if the JS API is not available.
+        """
+        if self.browser.product_version < "5.9":
+            return None
+        snapshot = getattr(self, "_snapshot", None)
+        try:
+            if not self.paginator.exists:
+                return None
+            if snapshot is not None and not refresh:
+                token = self.browser.execute_script(
+                    "return window.ManageIQ && ManageIQ.qe && {};".format(self.SNAPSHOT_TOKEN)
+                )
+                if (
+                    token == snapshot["token"]
+                    and self.paginator.items_amount == snapshot["items_amount"]
+                ):
+                    return snapshot["elements"], True
+            items_per_page = int(self.paginator.items_per_page or 0)
+            restore = 0 < items_per_page < self.SNAPSHOT_ITEMS_PER_PAGE
+            if items_per_page < self.SNAPSHOT_ITEMS_PER_PAGE:
+                self.paginator.set_items_per_page(self.SNAPSHOT_ITEMS_PER_PAGE)
+            elements = []
+            try:
+                for page in self.paginator.pages():
+                    for element in self._current_page_elements:
+                        element["page"] = page
+                        elements.append(element)
+            finally:
+                if restore:
+                    self.paginator.set_items_per_page(items_per_page)
+            if restore:
+                for index, element in enumerate(elements):
+                    element["page"] = index // items_per_page + 1
+            items_amount = self.paginator.items_amount
+            token = str(uuid4())
+            self.browser.execute_script("{} = arguments[0];".format(self.SNAPSHOT_TOKEN), token)
+        except (WebDriverException, TimedOutError) as e:
+            # pages_amount times out when the JS API doesn't answer
+            self.logger.warning("Could not read the entities of all pages at once: %s", e)
+            return None
+        self._snapshot = {"token": token, "items_amount": items_amount, "elements": elements}
+        return elements, False
+
+    def _find_in_snapshot(self, name):
+        """Looks up the entity by name in :py:meth:`_entities_snapshot` and shows its page.
+
+        Cached elements might be outdated, so they are read again if the entity is not found in
+        them or is not displayed.
+
+        Returns:
+            The entity or ``None`` if the JS API is not available.
+
+        Raises:
+            ItemNotFound: If there is no such entity
+        """
+        refresh = False
+        while True:
+            snapshot = self._entities_snapshot(refresh=refresh)
+            if snapshot is None:
+                return None
+            elements, cached = snapshot
+            for element in elements:
+                if element["name"] == name:
+                    if self.paginator.cur_page != element["page"]:
+                        self.paginator.go_to_page(element["page"])
+                    entity = self.parent.entity_class(
+                        parent=self, entity_id=element["entity_id"], name=name
+                    )
+                    if not cached or entity.is_displayed:
+                        return entity
+                    break
+            if not cached:
+                raise ItemNotFound("Entity {name} isn't found on any page".format(name=name))
+            refresh = True
+
     @property
     def entity_ids(self):
         return [el["entity_id"] for el in self._current_page_elements]
@@ -2951,6 +3184,13 @@ class EntitiesConditionalView(View, ReportDataControllerMixin):
                 self.parent.entity_class(parent=self, entity_id=el["entity_id"], name=el["name"])
                 for el in self._current_page_elements
             ]
+        # the entities might have been reloaded without reloading the page, read them again
+        snapshot = self._entities_snapshot(refresh=True)
+        if snapshot is not None:
+            return [
+                self.parent.entity_class(parent=self, entity_id=el["entity_id"], name=el["name"])
+                for el in snapshot[0]
+            ]
         else:
             entities = []
             for _ in self.paginator.pages():
@@ -2976,6 +3216,13 @@ class EntitiesConditionalView(View, ReportDataControllerMixin):
         if use_search and "name" in keys:
             self.search.clear_simple_search()
             self.search.simple_search(text=keys["name"])
+            # the search reloads just the entities, not the page
+            self._snapshot = None
+
+        if surf_pages and list(keys) == ["name"]:
+            entity = self._find_in_snapshot(keys["name"])
+            if entity is not None:
+                return entity
 
         for _ in self.paginator.pages():
             if len(keys) == 1 and "name" in keys: